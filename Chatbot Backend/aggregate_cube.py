@@ -0,0 +1,247 @@
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import FECHA_COLUMNS, parse_fechas
+from .gazetteer import ZONA_POR_MUNICIPIO, canonical_municipio, normalize_text
+
+# Ejes densos del cubo, en el orden del array
+AXES = ('municipio', 'anio', 'mes', 'tipo_delito')
+
+# Niveles agregados sobre un eje: zona (provincia) sobre municipio y categoría sobre tipo de delito
+LEVELS = {'zona': 'municipio', 'categoria': 'tipo_delito'}
+
+# Límite de celdas del cubo (int64): 20M son 160 MB
+MAX_CELLS = 20_000_000
+
+SIN_ZONA = 'SIN ZONA'
+
+
+def categoria_delito(tipo: str) -> str:
+    """Categoría por palabra principal: "HURTO A PERSONAS" -> "HURTO" ("DELITOS SEXUALES" se queda igual)"""
+    palabras = str(tipo).split()
+    if not palabras or normalize_text(palabras[0]) in ('delito', 'delitos'):
+        return str(tipo)
+    return palabras[0]
+
+
+class AggregateCube:
+    """
+    Cubo denso de casos municipio × año × mes × tipo de delito en un array de
+    NumPy, con los ejes codificados por diccionario (etiqueta -> posición).
+    Zona y categoría son niveles sobre municipio y tipo: se filtran y agrupan
+    traduciéndolos a posiciones del eje base, sin ampliar el cubo.
+    
+    Las consultas (total, series, top, rollup, query) cortan el array con vistas
+    o np.take y suman: microsegundos, sin volver a recorrer las filas.
+    Los filtros son palabras clave con una etiqueta o una lista:
+        cube.total(municipio='GIRÓN', anio=2023, categoria='HURTO')
+        cube.top('municipio', 5, tipo_delito=['HOMICIDIO'])
+    """
+    
+    def __init__(self, labels: Dict[str, List], values: np.ndarray, levels: Dict[str, Tuple[List, np.ndarray]]):
+        self.labels = labels
+        self.values = values
+        # nivel -> (etiquetas del nivel, código del nivel para cada posición del eje base)
+        self.levels = levels
+        self._index = {axis: {label: i for i, label in enumerate(labels[axis])} for axis in AXES}
+        self._level_index = {level: {label: i for i, label in enumerate(names)}
+                             for level, (names, _) in levels.items()}
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, max_cells: int = MAX_CELLS) -> Optional['AggregateCube']:
+        """
+        Construye el cubo desde los históricos (municipio, tipo_delito, fecha y
+        CANTIDAD opcional). None si faltan columnas o el cubo no cabe en `max_cells`.
+        """
+        columns = {str(col).strip().lower(): col for col in df.columns}
+        municipio_col = columns.get('municipio')
+        delito_col = columns.get('tipo_delito') or columns.get('tipo delito')
+        fecha_col = next((columns[c] for c in FECHA_COLUMNS if c in columns), None)
+        if municipio_col is None or delito_col is None or fecha_col is None:
+            return None
+        
+        fechas = df[fecha_col]
+        if not pd.api.types.is_datetime64_any_dtype(fechas.dtype):
+            fechas = parse_fechas(fechas)
+            if fechas is None:
+                return None
+        cantidad_col = columns.get('cantidad')
+        casos = df[cantidad_col].fillna(1).to_numpy(dtype='int64') if cantidad_col is not None else None
+        return cls._build(df[municipio_col], df[delito_col], fechas.dt.year.to_numpy(dtype='float64', na_value=np.nan),
+                          fechas.dt.month.to_numpy(dtype='float64', na_value=np.nan), casos, max_cells)
+    
+    @classmethod
+    def from_counts(cls, counts: pd.DataFrame, max_cells: int = MAX_CELLS) -> Optional['AggregateCube']:
+        """Construye el cubo desde conteos ya agregados (ver ingest.CountsAccumulator), sin las filas"""
+        return cls._build(counts['municipio'], counts['tipo_delito'],
+                          counts['anio'].to_numpy(dtype='float64', na_value=np.nan),
+                          counts['mes'].to_numpy(dtype='float64', na_value=np.nan),
+                          counts['casos'].to_numpy(dtype='int64'), max_cells)
+    
+    @classmethod
+    def _build(cls, municipio: pd.Series, delito: pd.Series, anios: np.ndarray, meses: np.ndarray,
+               casos: Optional[np.ndarray], max_cells: int) -> Optional['AggregateCube']:
+        """Cubo por bincount sobre las posiciones de cada fila (o conteo) en los ejes"""
+        # Nombres oficiales del catálogo para casar con los municipios de la pregunta
+        nombres = {m: canonical_municipio(m) or m for m in municipio.dropna().unique()}
+        municipio_codes, municipios = pd.factorize(municipio.map(nombres), sort=True)
+        delito_codes, delitos = pd.factorize(delito, sort=True)
+        
+        validos = (municipio_codes >= 0) & (delito_codes >= 0) & ~np.isnan(anios)
+        if not validos.any():
+            return None
+        primer_anio, ultimo_anio = int(np.nanmin(anios[validos])), int(np.nanmax(anios[validos]))
+        labels = {
+            'municipio': [str(m) for m in municipios],
+            'anio': list(range(primer_anio, ultimo_anio + 1)),
+            'mes': list(range(1, 13)),
+            'tipo_delito': [str(d) for d in delitos],
+        }
+        shape = tuple(len(labels[axis]) for axis in AXES)
+        if np.prod(shape, dtype=np.int64) > max_cells:
+            print(f"⚠️ Cubo de agregados demasiado grande {shape}: se omite")
+            return None
+        
+        flat = np.ravel_multi_index((municipio_codes[validos], anios[validos].astype(np.int64) - primer_anio,
+                                     meses[validos].astype(np.int64) - 1, delito_codes[validos]), shape)
+        weights = casos[validos] if casos is not None else None
+        values = np.bincount(flat, weights=weights, minlength=int(np.prod(shape))).astype(np.int64).reshape(shape)
+        
+        zonas = [ZONA_POR_MUNICIPIO.get(m, SIN_ZONA) for m in labels['municipio']]
+        categorias = [categoria_delito(d) for d in labels['tipo_delito']]
+        levels = {}
+        for level, valores in (('zona', zonas), ('categoria', categorias)):
+            codes, names = pd.factorize(pd.Series(valores, dtype=object), sort=True)
+            levels[level] = ([str(n) for n in names], codes.astype(np.intp))
+        return cls(labels, values, levels)
+    
+    @property
+    def dimensions(self) -> Tuple[str, ...]:
+        return AXES + tuple(self.levels)
+    
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+    
+    def labels_of(self, dimension: str) -> List:
+        """Etiquetas de un eje o nivel"""
+        if dimension in self.levels:
+            return list(self.levels[dimension][0])
+        return list(self.labels[dimension])
+    
+    # ---------- Consultas ----------
+    
+    def total(self, **filters) -> int:
+        """Casos que cumplen los filtros"""
+        cube, _ = self._select(filters)
+        return int(cube.sum(dtype=np.int64))
+    
+    def series(self, by: str, **filters) -> Dict[Any, int]:
+        """Casos por cada etiqueta de `by` (incluidas las que suman cero)"""
+        labels, values = self.rollup((by,), **filters)
+        return {label: int(v) for label, v in zip(labels[0], values)}
+    
+    def top(self, by: str, n: int = 5, **filters) -> List[Tuple[Any, int]]:
+        """Las `n` etiquetas de `by` con más casos (sin las que suman cero); empates por orden de etiqueta"""
+        labels, values = self.rollup((by,), **filters)
+        orden = np.argsort(-values, kind='stable')[:n]
+        return [(labels[0][i], int(values[i])) for i in orden if values[i] > 0]
+    
+    def rollup(self, by: Sequence[str] = (), **filters) -> Tuple[List[List], np.ndarray]:
+        """
+        Suma el cubo filtrado sobre todo lo que no esté en `by`.
+        Devuelve las etiquetas de cada dimensión de `by` y un array con un eje por dimensión.
+        """
+        cube, positions = self._select(filters)
+        bases = [LEVELS.get(dim, dim) for dim in by]
+        for dim in by:
+            if dim not in self.dimensions:
+                raise KeyError(f"Dimensión desconocida: {dim}")
+        if len(set(bases)) < len(bases):
+            raise ValueError(f"Dimensiones sobre el mismo eje: {', '.join(by)}")
+        
+        keep = [AXES.index(base) for base in bases]
+        values = cube.sum(axis=tuple(i for i in range(len(AXES)) if i not in keep), dtype=np.int64)
+        values = np.transpose(values, [sorted(keep).index(k) for k in keep])
+        
+        labels = []
+        for i, (dim, base) in enumerate(zip(by, bases)):
+            pos = positions[base]
+            if dim in self.levels:
+                # Agrupa las posiciones del eje base por su código de nivel (matriz 0/1)
+                names, codes = self.levels[dim]
+                presentes, inverse = np.unique(codes[pos], return_inverse=True)
+                onehot = np.zeros((len(pos), len(presentes)), dtype=np.int64)
+                onehot[np.arange(len(pos)), inverse] = 1
+                values = np.moveaxis(np.tensordot(values, onehot, axes=([i], [0])), -1, i)
+                labels.append([names[c] for c in presentes])
+            else:
+                axis_labels = self.labels[base]
+                labels.append([axis_labels[p] for p in pos])
+        return labels, values
+    
+    def query(self, by: Sequence[str] = (), n: Optional[int] = None, **filters) -> Dict[str, Any]:
+        """
+        Consulta al estilo de DataProcessor.query_data: {'total', 'data', 'ms'}.
+        Con una dimensión en `by`, 'data' son los casos por etiqueta (top `n` si se da);
+        con varias, las combinaciones con casos como claves tupla.
+        """
+        start = time.perf_counter()
+        if isinstance(by, str):
+            by = (by,)
+        if len(by) == 1 and n is not None:
+            data = dict(self.top(by[0], n, **filters))
+        elif len(by) == 1:
+            data = self.series(by[0], **filters)
+        elif by:
+            labels, values = self.rollup(by, **filters)
+            data = {tuple(labels[d][i] for d, i in enumerate(idx)): int(values[idx])
+                    for idx in zip(*np.nonzero(values))}
+        else:
+            data = {}
+        return {'total': self.total(**filters), 'data': data, 'ms': (time.perf_counter() - start) * 1000}
+    
+    # ---------- Filtros ----------
+    
+    def _positions(self, filters: Dict[str, Any]) -> Dict[str, Optional[np.ndarray]]:
+        """Posiciones de cada eje que cumplen los filtros (None = todo el eje)"""
+        positions = {axis: None for axis in AXES}
+        for dim, value in filters.items():
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set, np.ndarray, pd.Index)) else [value]
+            if dim in self.levels:
+                base = LEVELS[dim]
+                names = self._level_index[dim]
+                wanted = [names[v] for v in values if v in names]
+                pos = np.flatnonzero(np.isin(self.levels[dim][1], wanted))
+            elif dim in self._index:
+                base = dim
+                index = self._index[dim]
+                pos = np.array([index[v] for v in dict.fromkeys(values) if v in index], dtype=np.intp)
+            else:
+                raise KeyError(f"Dimensión desconocida: {dim}")
+            
+            previous = positions[base]
+            positions[base] = pos if previous is None else previous[np.isin(previous, pos)]
+        return positions
+    
+    def _select(self, filters: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Subcubo filtrado (vistas si cada filtro es un rango contiguo) y sus posiciones por eje"""
+        positions = self._positions(filters)
+        cube = self.values
+        # Primero los filtros más selectivos: cada np.take copia menos
+        filtrados = sorted((len(pos) / len(self.labels[axis]), AXES.index(axis), pos)
+                           for axis, pos in positions.items() if pos is not None)
+        for _, i, pos in filtrados:
+            if len(pos) and np.array_equal(pos, np.arange(pos[0], pos[0] + len(pos))):
+                cube = cube[(slice(None),) * i + (slice(pos[0], pos[0] + len(pos)),)]
+            else:
+                cube = np.take(cube, pos, axis=i)
+        
+        resolved = {axis: (np.arange(len(self.labels[axis])) if pos is None else pos)
+                    for axis, pos in positions.items()}
+        return cube, resolved
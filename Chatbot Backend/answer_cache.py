@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+class AnswerCache:
+    """
+    Caché semántica de respuestas del chatbot.
+    Devuelve la respuesta guardada de una pregunta anterior si el coseno entre sus
+    embeddings llega a `threshold`, ambas tienen el mismo alcance (municipios, tipo,
+    años...) y los datos no han cambiado. LRU con TTL; una huella de datos distinta
+    vacía la caché.
+    """
+    
+    def __init__(self, threshold: float = 0.95, max_size: int = 256, ttl: float = 900.0):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+    
+    def get(self, embedding: np.ndarray, fingerprint: Optional[str], scope: Hashable = None) -> Optional[str]:
+        """Respuesta de la pregunta más parecida con el mismo alcance, o None"""
+        vector = self._unit(embedding)
+        with self._lock:
+            self._sync(fingerprint)
+            self._expire()
+            
+            candidates = [key for key, entry in self._entries.items() if entry['scope'] == scope]
+            if candidates:
+                scores = np.vstack([self._entries[key]['vector'] for key in candidates]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]['answer']
+            
+            self.misses += 1
+            return None
+    
+    def put(self, embedding: np.ndarray, answer: str, fingerprint: Optional[str], scope: Hashable = None):
+        """Guarda una respuesta, expulsando la entrada menos usada"""
+        entry = {'vector': self._unit(embedding), 'answer': answer, 'scope': scope, 'time': time.monotonic()}
+        with self._lock:
+            self._sync(fingerprint)
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Contadores de aciertos/fallos, invalidaciones y tamaño actual"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
+    
+    def _sync(self, fingerprint: Optional[str]):
+        """Vacía la caché si cambió la huella de los datos (con el lock tomado)"""
+        if fingerprint != self.fingerprint:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.fingerprint = fingerprint
+    
+    def _expire(self):
+        """Quita las entradas vencidas (con el lock tomado)"""
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if now - entry['time'] > self.ttl]:
+            del self._entries[key]
+    
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype='float32').ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
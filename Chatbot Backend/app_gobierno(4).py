@@ -1,6 +1,7 @@
 import streamlit as st
 import streamlit.components.v1 as components
-from chatbot.llm_handler import ChatbotHandler
+from chatbot.llm_handler import get_shared_handler
+from chatbot.prompt_builder import ConversationMemory
 
 # Configuración de la página
 st.set_page_config(
@@ -269,12 +270,15 @@ with col_dashboard:
 
 # ========== CHATBOT ==========
 with col_chat:
-    # Inicializar chatbot
-    if 'chatbot' not in st.session_state:
-        st.session_state.chatbot = ChatbotHandler()
+    # Chatbot único del proceso (modelo, índice y datos compartidos entre
+    # sesiones); cada sesión solo guarda su historial
+    chatbot = get_shared_handler()
     
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
+    # Resumen de los turnos antiguos que ya no van completos en el prompt
+    if 'chat_memory' not in st.session_state:
+        st.session_state.chat_memory = ConversationMemory(keep_turns=chatbot.history_turns)
     
     # Header
     st.markdown("""
@@ -284,6 +288,10 @@ with col_chat:
         </div>
     """, unsafe_allow_html=True)
     
+    # El índice RAG se carga en segundo plano (ver ChatbotHandler)
+    if not chatbot.is_ready:
+        st.caption("🔄 Cargando datos del asistente...")
+    
     # Container con altura fija y scroll
     chat_container = st.container(height=500)
     
@@ -307,8 +315,16 @@ with col_chat:
     if user_input := st.chat_input("Escribe tu consulta aquí..."):
         st.session_state.chat_history.append({"role": "user", "content": user_input})
         
-        with st.spinner(""):
-            response = st.session_state.chatbot.get_response(user_input)
-            st.session_state.chat_history.append({"role": "assistant", "content": response})
+        # Mostrar la respuesta a medida que llega del stream de Groq
+        with chat_container:
+            with st.chat_message("user"):
+                st.markdown(user_input)
+            with st.chat_message("assistant"):
+                response = st.write_stream(chatbot.stream_response(
+                    user_input,
+                    history=st.session_state.chat_history[:-1],
+                    memory=st.session_state.chat_memory,
+                ))
+        st.session_state.chat_history.append({"role": "assistant", "content": response})
         
         st.rerun()
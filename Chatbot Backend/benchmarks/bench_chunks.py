@@ -0,0 +1,53 @@
+"""
+Benchmark: construcción de chunks por municipio (máscara por municipio vs. groupby único)
+
+Uso:
+    python benchmarks/bench_chunks.py --rows 10000 100000 1000000
+"""
+import argparse
+
+from common import make_historicos, make_predicciones, print_table, timeit
+from chatbot.rag_processor import RAGProcessor
+
+
+def legacy_chunks(df_hist, df_pred):
+    """Implementación anterior: una máscara booleana completa por municipio"""
+    chunks = []
+    for municipio in df_hist['municipio'].unique():
+        df_mun = df_hist[df_hist['municipio'] == municipio]
+        delitos = df_mun['tipo_delito'].value_counts().head(5)
+        chunks.append((municipio, len(df_mun), dict(delitos), df_mun.to_dict('records')[:100]))
+    for municipio in df_pred['municipio'].unique():
+        df_mun = df_pred[df_pred['municipio'] == municipio]
+        chunks.append((municipio, len(df_mun), len(df_mun[df_mun['riesgo'] == 'alto']), df_mun.to_dict('records')[:100]))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--municipios", type=int, default=87)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.rows:
+        df_hist = make_historicos(n, args.municipios)
+        df_pred = make_predicciones(max(n // 10, args.municipios), args.municipios)
+
+        rag = RAGProcessor()
+
+        def build():
+            rag.df_historicos, rag.df_predicciones = df_hist, df_pred
+            rag._build_row_stores()
+            rag._create_chunks()
+
+        t_legacy = timeit(lambda: legacy_chunks(df_hist, df_pred), args.repeat)
+        t_groupby = timeit(build, args.repeat)
+        rows.append([n, len(rag.chunks), t_legacy, t_groupby, t_legacy / t_groupby])
+
+    print_table(["filas", "chunks", "mascara_s", "groupby_s", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
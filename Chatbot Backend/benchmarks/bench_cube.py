@@ -0,0 +1,114 @@
+"""
+Benchmark: estadísticas con un groupby de pandas sobre las filas en cada consulta
+frente al cubo precalculado de AggregateCube (municipio × año × mes × tipo)
+
+Las consultas son las de la vía rápida y las de un panel: total filtrado,
+top de municipios, serie mensual, top por zona y categoría, y un rollup de
+dos ejes. Comprueba que ambos dan lo mismo e informa p50/p99 por consulta,
+el tiempo de construcción del cubo y su memoria.
+
+Uso:
+    python benchmarks/bench_cube.py --rows 300000 --queries 200
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import TIPOS_DELITO, make_historicos, percentiles, print_table
+from chatbot.aggregate_cube import AggregateCube, categoria_delito
+from chatbot.data_loader import memory_mb
+from chatbot.gazetteer import ZONA_POR_MUNICIPIO
+
+
+def pandas_queries(df: pd.DataFrame, municipio: str, anio: int):
+    """Las consultas recorriendo las filas, como sin cubo"""
+    filas = df[df['anio'] == anio]
+    return {
+        'total': int(filas.loc[(filas['municipio'] == municipio) & filas['tipo_delito'].str.startswith('HURTO'),
+                               'cantidad'].sum()),
+        'top municipios': [(k, int(v)) for k, v in df.groupby('municipio', observed=True)['cantidad'].sum()
+                           .sort_values(ascending=False, kind='stable').head(5).items()],
+        'serie mensual': {int(k): int(v) for k, v in filas[filas['municipio'] == municipio]
+                          .groupby('mes')['cantidad'].sum().reindex(range(1, 13), fill_value=0).items()},
+        'top zonas': [(k, int(v)) for k, v in filas.groupby('zona', observed=True)['cantidad'].sum()
+                      .sort_values(ascending=False, kind='stable').head(3).items()],
+        'categoria × año': {k: int(v) for k, v in df[df['municipio'] == municipio]
+                            .groupby(['categoria', 'anio'], observed=True)['cantidad'].sum().items() if v},
+    }
+
+
+def cube_queries(cube: AggregateCube, municipio: str, anio: int):
+    """Las mismas consultas sobre el cubo"""
+    return {
+        'total': cube.total(municipio=municipio, anio=anio, categoria='HURTO'),
+        'top municipios': cube.top('municipio', 5),
+        'serie mensual': cube.series('mes', municipio=municipio, anio=anio),
+        'top zonas': cube.top('zona', 3, anio=anio),
+        'categoria × año': cube.query(('categoria', 'anio'), municipio=municipio)['data'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    df = make_historicos(args.rows, real_names=True)
+    df['fecha'] = pd.to_datetime(df['fecha'], format='%d/%m/%Y')
+    df['municipio'] = df['municipio'].astype('category')
+    df['tipo_delito'] = df['tipo_delito'].astype('category')
+
+    start = time.perf_counter()
+    cube = AggregateCube.from_frame(df)
+    build_s = time.perf_counter() - start
+
+    # Columnas derivadas para pandas (fuera de la medición: a su favor)
+    df['anio'] = df['fecha'].dt.year
+    df['mes'] = df['fecha'].dt.month
+    df['zona'] = df['municipio'].map(ZONA_POR_MUNICIPIO).astype('category')
+    df['categoria'] = df['tipo_delito'].map({t: categoria_delito(t) for t in TIPOS_DELITO}).astype('category')
+
+    rng = np.random.default_rng(0)
+    municipios = cube.labels['municipio']
+    casos = [(municipios[rng.integers(len(municipios))], int(rng.choice(cube.labels['anio'])))
+             for _ in range(args.queries)]
+
+    tiempos = {'pandas': {}, 'cubo': {}}
+    for municipio, anio in casos:
+        esperado, obtenido = pandas_queries(df, municipio, anio), cube_queries(cube, municipio, anio)
+        assert esperado == obtenido, (municipio, anio)
+        for nombre, fn in (('pandas', lambda: pandas_queries(df, municipio, anio)),
+                           ('cubo', lambda: cube_queries(cube, municipio, anio))):
+            start = time.perf_counter()
+            fn()
+            tiempos[nombre].setdefault('todas', []).append(time.perf_counter() - start)
+
+    # Cada consulta del cubo por separado
+    consultas = {
+        'total': lambda m, a: cube.total(municipio=m, anio=a, categoria='HURTO'),
+        'top municipios': lambda m, a: cube.top('municipio', 5),
+        'serie mensual': lambda m, a: cube.series('mes', municipio=m, anio=a),
+        'top zonas': lambda m, a: cube.top('zona', 3, anio=a),
+        'categoria × año': lambda m, a: cube.query(('categoria', 'anio'), municipio=m),
+    }
+    for nombre, fn in consultas.items():
+        for municipio, anio in casos:
+            start = time.perf_counter()
+            fn(municipio, anio)
+            tiempos['cubo'].setdefault(nombre, []).append(time.perf_counter() - start)
+
+    rows = []
+    for motor, por_consulta in tiempos.items():
+        for nombre, samples in por_consulta.items():
+            p50, p99 = percentiles(samples)
+            rows.append([motor, nombre, p50 * 1000, p99 * 1000])
+    print_table(["motor", "consulta", "p50_us", "p99_us"], rows)
+    print(f"\nCubo {cube.values.shape} construido en {build_s:.2f}s: {cube.nbytes / 2**20:.1f} MB "
+          f"(filas: {memory_mb(df):.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: backends de embeddings en CPU (fp32 vs. int8 dinámico vs. ONNX)
+
+Para cada backend mide el tiempo de carga, el aumento de RSS, el rendimiento de
+encode sobre los textos de los chunks y la concordancia con fp32: similitud
+coseno de los embeddings y solapamiento del top-k de búsqueda.
+
+Usa los chunks de data/historicos.csv y data/predicciones.csv si existen; si no,
+chunks de datos sintéticos.
+
+Uso:
+    python benchmarks/bench_embeddings.py --data-dir data --backends fp32 int8 onnx
+"""
+import argparse
+import gc
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import PREGUNTAS, make_historicos, make_predicciones, print_table, rss_mb
+from chatbot.rag_processor import EMBEDDING_BACKENDS, RAGProcessor, build_index, load_embedding_model
+
+
+def chunk_texts(data_dir: str):
+    """Textos de los chunks reales (o sintéticos si no hay CSV)"""
+    rag = RAGProcessor(data_dir=data_dir)
+    try:
+        rag.df_historicos = pd.read_csv(os.path.join(data_dir, "historicos.csv"))
+        rag.df_predicciones = pd.read_csv(os.path.join(data_dir, "predicciones.csv"))
+    except FileNotFoundError:
+        rag.df_historicos, rag.df_predicciones = make_historicos(100_000), make_predicciones(10_000)
+    rag._build_row_stores()
+    rag._create_chunks()
+    return [chunk['text'] for chunk in rag.chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = chunk_texts(args.data_dir)
+    ids = np.arange(len(texts), dtype='int64')
+    print(f"{len(texts)} textos de chunks, {len(PREGUNTAS)} consultas\n")
+
+    reference = None
+    rows = []
+    for backend in args.backends:
+        gc.collect()
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        try:
+            model = load_embedding_model(RAGProcessor.MODEL_NAME, backend)
+        except (TypeError, ImportError) as e:
+            print(f"⚠️ {backend} no disponible: {e}")
+            continue
+        load_s = time.perf_counter() - start
+        rss_delta = rss_mb() - rss_before
+
+        model.encode(texts[:args.batch_size], batch_size=args.batch_size)  # calentamiento
+        start = time.perf_counter()
+        embeddings = np.asarray(model.encode(texts, batch_size=args.batch_size), dtype='float32')
+        throughput = len(texts) / (time.perf_counter() - start)
+        queries = np.asarray(model.encode(PREGUNTAS), dtype='float32')
+
+        _, found = build_index(embeddings, ids).search(queries, args.k)
+        if reference is None:
+            reference = (embeddings, found)
+        ref_embeddings, ref_found = reference
+
+        cosine = np.sum(embeddings * ref_embeddings, axis=1) / (
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(ref_embeddings, axis=1))
+        agreement = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, ref_found)])
+
+        rows.append([backend, load_s, rss_delta, throughput, float(cosine.mean()), float(agreement)])
+        del model
+
+    print_table(["backend", "carga_s", "rss_MB", "textos/s", "coseno_vs_ref", f"top{args.k}_vs_ref"], rows)
+    if rows:
+        print(f"\nReferencia: {rows[0][0]}")
+
+
+if __name__ == "__main__":
+    main()
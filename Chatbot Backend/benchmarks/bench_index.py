@@ -0,0 +1,112 @@
+"""
+Benchmark: recall@k, latencia por consulta y bytes/vector de los índices
+flat / IVF / HNSW / SQ / PQ (estos dos con y sin re-ordenado exacto)
+
+Usa vectores sintéticos agrupados (mezcla de gaussianas normalizadas, como los
+embeddings de MiniLM) y toma el índice flat como verdad de referencia.
+
+Uso:
+    python benchmarks/bench_index.py --sizes 10000 100000 1000000 --k 3
+    python benchmarks/bench_index.py --pq-m 16 48 96 --sq-bits 4 8 --rerank 1 4 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import percentiles, print_table
+from chatbot.rag_processor import build_index, set_search_params, index_bytes_per_vector, rerank_exact
+
+
+def synthetic_vectors(n: int, dimension: int, n_clusters: int, rng) -> np.ndarray:
+    """Vectores normalizados alrededor de `n_clusters` centros"""
+    centers = rng.standard_normal((n_clusters, dimension)).astype('float32')
+    vectors = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def query_latencies(index, queries: np.ndarray, k: int, vectors: np.ndarray = None, rerank: int = 1):
+    """
+    Busca consulta a consulta (como en producción) y devuelve (ids, tiempos).
+    Con rerank > 1 pide k * rerank candidatos y los re-ordena con `vectors`
+    (los IDs del benchmark son las filas de `vectors`)
+    """
+    ids = np.empty((len(queries), k), dtype='int64')
+    times = []
+    for i in range(len(queries)):
+        query = queries[i:i + 1]
+        start = time.perf_counter()
+        if rerank > 1:
+            _, candidates = index.search(query, k * rerank)
+            candidate_vectors = np.zeros(candidates.shape + (vectors.shape[1],), dtype='float32')
+            valid = candidates >= 0
+            candidate_vectors[valid] = vectors[candidates[valid]]
+            _, ids[i:i + 1] = rerank_exact(query, candidates, candidate_vectors, k)
+        else:
+            _, ids[i:i + 1] = index.search(query, k)
+        times.append(time.perf_counter() - start)
+    return ids, times
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    """Fracción media de los k vecinos exactos recuperados"""
+    k = exact.shape[1]
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=384, help="384 = paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--sq-bits", type=int, nargs="+", default=[8, 4])
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[48, 16], help="bytes por vector (divisor de --dim)")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 4], help="candidatos por resultado (1 = sin re-ordenar)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for n in args.sizes:
+        vectors = synthetic_vectors(n, args.dim, n_clusters=max(10, n // 1000), rng=rng)
+        queries = synthetic_vectors(args.queries, args.dim, n_clusters=max(10, n // 1000), rng=rng)
+        ids = np.arange(n, dtype='int64')
+
+        configs = [('flat', {})]
+        configs += [('ivf', {'nprobe': p}) for p in args.nprobe]
+        configs += [('hnsw', {'ef_search': ef}) for ef in args.ef_search]
+        configs += [('sq', {'sq_bits': bits, 'rerank': r}) for bits in args.sq_bits for r in args.rerank]
+        configs += [('pq', {'pq_m': m, 'rerank': r}) for m in args.pq_m for r in args.rerank]
+
+        exact = None
+        built = {}
+        for index_type, params in configs:
+            # Cada índice se construye una sola vez; nprobe/efSearch/rerank solo afectan a la búsqueda
+            build_params = {k: v for k, v in params.items() if k in ('sq_bits', 'pq_m')}
+            build_key = (index_type, tuple(sorted(build_params.items())))
+            if build_key not in built:
+                start = time.perf_counter()
+                built[build_key] = build_index(vectors, ids, index_type, **build_params)
+                build_s = time.perf_counter() - start
+            else:
+                build_s = 0.0
+            index = built[build_key]
+            set_search_params(index, **params)
+
+            found, times = query_latencies(index, queries, args.k, vectors, params.get('rerank', 1))
+            if exact is None:
+                exact = found
+            p50, p99 = percentiles(times)
+            label = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+            rows.append([n, index_type, label, index_bytes_per_vector(index), build_s,
+                         recall_at_k(found, exact), p50, p99])
+
+    print_table(["vectores", "indice", "params", "bytes/vec", "build_s", f"recall@{args.k}", "p50_ms", "p99_ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
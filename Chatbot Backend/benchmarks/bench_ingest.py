@@ -0,0 +1,114 @@
+"""
+Benchmark: memoria pico al cargar historicos.csv entero (read_typed_csv) frente
+a leerlo por bloques con ingest_csv, para varios tamaños de bloque
+
+Cada carga corre en un proceso nuevo y hace lo mismo que el arranque del
+chatbot salvo los embeddings: conteos, perfil y cubo de DataProcessor y chunks
+del RAG. Informa del pico de RSS del proceso (VmHWM en Linux) por encima de
+la RSS tras los imports, del tiempo y de si todas las cargas dan los mismos
+conteos y chunks. El tamaño de bloque 0 es la tabla completa.
+
+Uso:
+    python benchmarks/bench_ingest.py --rows 700000 --chunksize 0 10000 50000 200000
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import make_historicos, print_table, rss_mb
+
+
+def peak_rss_mb() -> float:
+    """
+    Pico de RSS de este proceso. En Linux VmHWM: ru_maxrss de un proceso lanzado
+    con fork + exec hereda el pico del padre (aquí, el que generó el CSV).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_kb / 2**20 if sys.platform == "darwin" else peak_kb / 2**10
+
+
+def child(data_dir: str, chunksize: int):
+    """Una carga en este proceso; imprime el resultado como JSON"""
+    from chatbot.data_loader import read_typed_csv
+    from chatbot.data_processor import DataProcessor
+    from chatbot.ingest import ingest_csv
+    from chatbot.rag_processor import RAGProcessor
+    base_mb = rss_mb()
+    path = os.path.join(data_dir, "historicos.csv")
+
+    start = time.perf_counter()
+    rag = RAGProcessor(data_dir)
+    data = DataProcessor(data_dir)
+    if chunksize:
+        rag.historicos_summary = ingest_csv(path, chunksize)
+        data.load_data(historicos_summary=rag.historicos_summary)
+    else:
+        rag.df_historicos = read_typed_csv(path)
+        data.load_data(rag.df_historicos)
+    rag._build_row_stores()
+    rag._create_chunks()
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'seconds': seconds,
+        'base_mb': base_mb,
+        'peak_mb': peak_rss_mb(),
+        'rows': data.context_data['historicos']['total_registros'],
+        'casos': data.cube.total(),
+        'chunks': len(rag.chunks),
+        'texts': hash(tuple(sorted(chunk['text'] for chunk in rag.chunks))),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=700_000)
+    parser.add_argument("--chunksize", type=int, nargs="+", default=[0, 10_000, 50_000, 200_000])
+    parser.add_argument("--child", nargs=2, metavar=("DATA_DIR", "CHUNKSIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    data_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        path = os.path.join(data_dir, "historicos.csv")
+        make_historicos(args.rows, real_names=True).to_csv(path, index=False)
+        csv_mb = os.path.getsize(path) / 2**20
+
+        rows, resultados = [], set()
+        for chunksize in args.chunksize:
+            shutil.rmtree(os.path.join(data_dir, ".table_cache"), ignore_errors=True)
+            # PYTHONHASHSEED fijo: el hash de los textos se compara entre procesos
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", data_dir, str(chunksize)],
+                                 capture_output=True, text=True, check=True,
+                                 env={**os.environ, "PYTHONHASHSEED": "0"})
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            resultados.add((result['rows'], result['casos'], result['chunks'], result['texts']))
+            rows.append([chunksize or "completa", result['seconds'], result['peak_mb'] - result['base_mb'],
+                         result['peak_mb'], result['chunks']])
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_table(["bloque", "segundos", "pico_sobre_base_mb", "pico_rss_mb", "chunks"], rows)
+    print(f"\nCSV de {args.rows:,} filas ({csv_mb:.0f} MB)")
+    if len(resultados) != 1:
+        print("❌ Las cargas no dan los mismos conteos y chunks")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: cliente LLM asíncrono (pool, deadlines, reintentos y admisión)
+contra el servidor Groq simulado de fake_groq.py
+
+Lanza `--users` hilos (como sesiones de Streamlit) que hacen peticiones en
+streaming y mide éxito, reintentos, rechazos de admisión, profundidad máxima
+de la cola y latencia (primer fragmento y total).
+
+Uso:
+    python benchmarks/bench_llm_client.py --users 20 --requests 5 --error-rate 0.1 --rate-limit-rate 0.05
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import PREGUNTAS, percentiles, print_table
+from fake_groq import start_fake_groq
+from chatbot.llm_client import LLMClient, AdmissionError, DeadlineExceeded
+
+
+def run_user(client: LLMClient, user: int, n_requests: int, results: list):
+    """Una sesión: peticiones consecutivas en streaming"""
+    for i in range(n_requests):
+        question = PREGUNTAS[(user + i) % len(PREGUNTAS)]
+        start = time.perf_counter()
+        first = None
+        try:
+            for _ in client.stream([{"role": "user", "content": question}], max_tokens=300):
+                if first is None:
+                    first = time.perf_counter() - start
+            results.append(('ok', first, time.perf_counter() - start))
+        except AdmissionError:
+            results.append(('rechazada', None, time.perf_counter() - start))
+        except DeadlineExceeded:
+            results.append(('deadline', None, time.perf_counter() - start))
+        except Exception:
+            results.append(('error', None, time.perf_counter() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5, help="peticiones por usuario")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=20.0, help="peticiones/s admitidas")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-connections", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    server = start_fake_groq(latency=args.latency, error_rate=args.error_rate,
+                             rate_limit_rate=args.rate_limit_rate)
+    client = LLMClient("fake", "llama-3.3-70b-versatile", base_url=server.base_url,
+                       max_connections=args.max_connections, timeout=args.timeout,
+                       rate=args.rate, burst=args.burst, max_queue=args.max_queue)
+
+    # Muestrear la cola de admisión mientras dura la carga
+    max_depth = 0
+    running = True
+
+    def sample():
+        nonlocal max_depth
+        while running:
+            max_depth = max(max_depth, client.queue_depth)
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.users) as pool:
+        for user in range(args.users):
+            pool.submit(run_user, client, user, args.requests, results)
+    elapsed = time.perf_counter() - start
+    running = False
+    sampler.join()
+
+    ok = [r for r in results if r[0] == 'ok']
+    rows = []
+    for status in ('ok', 'rechazada', 'deadline', 'error'):
+        rows.append([status, sum(1 for r in results if r[0] == status)])
+    print_table(["resultado", "peticiones"], rows)
+    print()
+
+    stats = client.stats()
+    ttft = percentiles([r[1] for r in ok if r[1] is not None], (50, 95, 99)) if ok else [0.0] * 3
+    total = percentiles([r[2] for r in ok], (50, 95, 99)) if ok else [0.0] * 3
+    print_table(
+        ["usuarios", "req/s", "reintentos", "cola_max", "ttft_p50", "ttft_p99", "total_p50", "total_p95", "total_p99"],
+        [[args.users, len(results) / elapsed, stats['retries'], max_depth, ttft[0], ttft[2], *total]],
+    )
+    print(f"\nServidor: {server.counts}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
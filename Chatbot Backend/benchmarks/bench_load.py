@@ -0,0 +1,193 @@
+"""
+Prueba de carga de extremo a extremo: N ciudadanos simulados contra un único
+ChatbotHandler (como las sesiones de Streamlit con get_shared_handler), con el
+RAG real sobre datos sintéticos y un servidor Groq simulado (fake_groq.py), sin red.
+
+Por defecto los embeddings los da un modelo simulado (common.StubSentenceTransformer),
+así que no se descarga nada. Con --embedder real se usa el modelo de
+sentence-transformers en modo offline (HF_HUB_OFFLINE=1): tiene que estar ya en
+la caché de Hugging Face (basta con haber arrancado el chatbot una vez con red);
+si no está, la prueba termina antes de empezar.
+
+Cada usuario es un hilo que envía preguntas de question_corpus en streaming, con
+su historial y ConversationMemory, y espera `--think` segundos entre preguntas.
+Informa del rendimiento y de los percentiles p50/p95/p99 por etapa (los spans
+de chatbot.metrics de cada consulta): embedding, búsqueda FAISS, construcción
+del prompt, espera del LLM, limpieza y total, y de cuántas preguntas resolvió
+la vía rápida o la caché. --metrics guarda además la exportación de Prometheus.
+
+Con --min-throughput / --max-p95 termina con código 1 si no se cumplen
+(para detectar regresiones en CI); --json guarda el informe.
+
+Uso:
+    python benchmarks/bench_load.py --users 50 --requests 10 --latency 0.5
+    python benchmarks/bench_load.py --users 20 --requests 5 --min-throughput 15 --max-p95 3000 --json load.json
+    python benchmarks/bench_load.py --embedder real --users 20 --requests 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import percentiles, print_table, question_corpus, synthetic_workdir, use_stub_embedder
+from fake_groq import start_fake_groq
+
+STAGES = [
+    ('embedding', 'embedding'),
+    ('faiss', 'búsqueda FAISS'),
+    ('context', 'prompt'),
+    ('llm_first_token', 'LLM primer fragmento'),
+    ('llm', 'espera LLM'),
+    ('clean', 'limpieza'),
+    ('request', 'total'),
+]
+
+
+def classify(stages: dict) -> str:
+    """Vía por la que se respondió, según los spans de la consulta"""
+    if 'llm' in stages:
+        return 'llm'
+    if 'answer_cache' in stages:
+        return 'cache'
+    return 'rapida'
+
+
+def run_user(handler, user: int, questions: list, args, results: list, stop_at: float):
+    """Una sesión de chat: preguntas consecutivas con su historial"""
+    from chatbot.metrics import metrics
+    from chatbot.prompt_builder import ConversationMemory
+    rng = random.Random(user)
+    history = []
+    memory = ConversationMemory(keep_turns=handler.history_turns)
+    for i in range(args.requests):
+        if time.monotonic() >= stop_at:
+            break
+        question = questions[(user * args.requests + i) % len(questions)]
+        with metrics.collect() as stages:
+            try:
+                answer = "".join(handler.stream_response(question, history=history, memory=memory))
+                status = classify(stages)
+            except Exception as e:
+                answer, status = "", f"error: {type(e).__name__}"
+        results.append((status, stages))
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=10, help="preguntas por usuario")
+    parser.add_argument("--duration", type=float, default=0, help="límite en segundos (0 = sin límite)")
+    parser.add_argument("--think", type=float, default=0.5, help="pausa media entre preguntas (s)")
+    parser.add_argument("--rows", type=int, default=50_000, help="filas de historicos.csv")
+    parser.add_argument("--latency", type=float, default=0.5, help="latencia del Groq simulado (s)")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--no-answer-cache", action="store_true", help="desactiva la caché de respuestas")
+    parser.add_argument("--embedder", choices=["stub", "real"], default="stub",
+                        help="modelo de embeddings: simulado o el real desde la caché local")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-throughput", type=float, help="falla si las preguntas/s quedan por debajo")
+    parser.add_argument("--max-p95", type=float, help="falla si el p95 total (ms) lo supera")
+    parser.add_argument("--json", help="guarda el informe en este fichero")
+    parser.add_argument("--metrics", help="guarda las métricas en formato Prometheus en este fichero")
+    parser.add_argument("--verbose", action="store_true", help="muestra los logs del handler durante la carga")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+    metrics_path = os.path.abspath(args.metrics) if args.metrics else None
+
+    if args.embedder == "stub":
+        use_stub_embedder()
+    else:
+        # Sin red: el modelo debe estar descargado; mejor fallar ya que a mitad de la carga
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        from chatbot.rag_processor import RAGProcessor, load_embedding_model
+        try:
+            load_embedding_model(RAGProcessor.MODEL_NAME)
+        except ImportError as e:
+            print(f"❌ sentence-transformers no está instalado ({e}): instálalo o usa --embedder stub")
+            sys.exit(1)
+        except Exception as e:
+            print(f"❌ El modelo {RAGProcessor.MODEL_NAME} no está en la caché de Hugging Face ({e}).\n"
+                  f"   Descárgalo antes con red o usa --embedder stub")
+            sys.exit(1)
+
+    server = start_fake_groq(latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+                             error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    os.environ["GROQ_API_KEY"] = "fake"
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    # Sin límite de admisión propio: se mide el stack, no el token bucket
+    os.environ.setdefault("GROQ_RATE_LIMIT", "1000")
+    os.environ.setdefault("GROQ_BURST", str(args.users))
+    os.environ.setdefault("GROQ_MAX_CONNECTIONS", str(args.users))
+    if args.no_answer_cache:
+        os.environ["ANSWER_CACHE_THRESHOLD"] = "2"
+
+    from chatbot.llm_handler import ChatbotHandler
+    from chatbot.metrics import metrics
+    questions = question_corpus(args.users * args.requests, seed=args.seed)
+    results = []
+    with synthetic_workdir(args.rows, prefix="bench_load_", quiet=not args.verbose):
+        handler = ChatbotHandler(background_warmup=False)
+        if handler.data_loaded:
+            # Solo la carga: fuera el arranque del índice
+            metrics.reset()
+            stop_at = time.monotonic() + args.duration if args.duration else float("inf")
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.users) as pool:
+                for user in range(args.users):
+                    pool.submit(run_user, handler, user, questions, args, results, stop_at)
+            elapsed = time.perf_counter() - start
+    server.shutdown()
+    if not handler.data_loaded:
+        print("❌ El RAG no cargó los datos sintéticos")
+        sys.exit(1)
+
+    by_status = {}
+    for status, _ in results:
+        by_status[status] = by_status.get(status, 0) + 1
+    print_table(["resultado", "preguntas"], sorted(by_status.items()))
+    print()
+
+    rows = []
+    report = {'users': args.users, 'requests': len(results), 'seconds': elapsed,
+              'throughput': len(results) / elapsed, 'status': by_status, 'stages': {}}
+    for stage, label in STAGES:
+        samples = [stages[stage] for _, stages in results if stage in stages]
+        if not samples:
+            continue
+        p50, p95, p99 = percentiles(samples, (50, 95, 99))
+        rows.append([label, len(samples), p50, p95, p99])
+        report['stages'][stage] = {'n': len(samples), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+    print_table(["etapa", "n", "p50_ms", "p95_ms", "p99_ms"], rows)
+    print(f"\n{len(results)} preguntas de {args.users} usuarios en {elapsed:.1f}s: "
+          f"{report['throughput']:.1f} preguntas/s")
+    print(f"Servidor: {server.counts} | Cliente: {handler.client.stats()}")
+
+    if metrics_path:
+        metrics.write(metrics_path)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    failed = []
+    if args.min_throughput is not None and report['throughput'] < args.min_throughput:
+        failed.append(f"rendimiento {report['throughput']:.1f} < {args.min_throughput} preguntas/s")
+    total_p95 = report['stages'].get('request', {}).get('p95_ms', 0.0)
+    if args.max_p95 is not None and total_p95 > args.max_p95:
+        failed.append(f"p95 total {total_p95:.0f} ms > {args.max_p95:.0f} ms")
+    if failed:
+        print("\n❌ Regresión: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: carga de CSV con pd.read_csv sin tipos frente a data_loader
+(categóricas, fechas parseadas, enteros compactos) y frente a la caché
+Feather/pickle de TableCache ya caliente
+
+El CSV imita un extracto de la Policía Nacional (DEPARTAMENTO, MUNICIPIO,
+CODIGO DANE, ARMAS MEDIOS, FECHA HECHO, GENERO, GRUPO ETARIO, DELITO, CANTIDAD).
+Informa tiempo de carga, memoria del DataFrame (deep) y tamaño en disco.
+
+Uso:
+    python benchmarks/bench_loader.py --rows 100000 300000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import TIPOS_DELITO, municipio_names, print_table
+from chatbot.data_loader import TableCache, memory_mb, read_typed_csv
+
+ARMAS = ["ARMA BLANCA / CORTOPUNZANTE", "ARMA DE FUEGO", "CONTUNDENTES", "SIN EMPLEO DE ARMAS",
+         "NO REPORTADO", "ESCOPOLAMINA", "LLAVE MAESTRA"]
+GENEROS = ["MASCULINO", "FEMENINO", "NO REPORTA"]
+GRUPOS = ["ADULTOS", "ADOLESCENTES", "MENORES"]
+
+
+def make_extracto(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """DataFrame con las columnas y formatos de un extracto de la Policía Nacional"""
+    rng = np.random.default_rng(seed)
+    municipios = municipio_names(87, real=True)
+    idx = rng.integers(0, len(municipios), n_rows)
+    fechas = pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 15 * 365, n_rows), unit="D")
+    return pd.DataFrame({
+        "DEPARTAMENTO": "SANTANDER",
+        "MUNICIPIO": municipios[idx] + " (CT)",
+        "CODIGO DANE": 68001000 + idx * 1000,
+        "ARMAS MEDIOS": np.array(ARMAS)[rng.integers(0, len(ARMAS), n_rows)],
+        "FECHA HECHO": fechas.strftime("%d/%m/%Y"),
+        "GENERO": np.array(GENEROS)[rng.integers(0, len(GENEROS), n_rows)],
+        "GRUPO ETARIO": np.array(GRUPOS)[rng.integers(0, len(GRUPOS), n_rows)],
+        "DELITO": np.array(TIPOS_DELITO)[rng.integers(0, len(TIPOS_DELITO), n_rows)],
+        "CANTIDAD": rng.integers(1, 4, n_rows),
+    })
+
+
+def measure(fn):
+    start = time.perf_counter()
+    df = fn()
+    return df, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 300_000])
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.rows:
+        workdir = tempfile.mkdtemp(prefix="bench_loader_")
+        try:
+            path = os.path.join(workdir, "historicos.csv")
+            make_extracto(n).to_csv(path, index=False)
+            csv_mb = os.path.getsize(path) / 2**20
+
+            raw, raw_s = measure(lambda: pd.read_csv(path))
+            # Lo que hacía el código antes con la fecha: parsearla en cada proceso
+            _, parse_s = measure(lambda: pd.to_datetime(raw["FECHA HECHO"], format='mixed', dayfirst=True))
+            rows.append([n, "read_csv + fecha", raw_s + parse_s, memory_mb(raw), csv_mb])
+
+            typed, typed_s = measure(lambda: read_typed_csv(path))
+            rows.append([n, "tipado (CSV)", typed_s, memory_mb(typed), csv_mb])
+
+            cache = TableCache(os.path.join(workdir, ".table_cache"))
+            cache.load(path)
+            cached, cached_s = measure(lambda: cache.load(path))
+            cache_mb = os.path.getsize(cache._cache_path(path)) / 2**20
+            rows.append([n, f"caché {cache.format}", cached_s, memory_mb(cached), cache_mb])
+
+            assert len(cached) == len(raw)
+            assert (cached["MUNICIPIO"].astype(str).to_numpy() == raw["MUNICIPIO"].to_numpy()).all()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_table(["filas", "carga", "segundos", "memoria_mb", "disco_mb"], rows)
+
+
+if __name__ == "__main__":
+    main()
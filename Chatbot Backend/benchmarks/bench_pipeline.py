@@ -0,0 +1,53 @@
+"""
+Benchmark: codificación de chunks con uno o varios procesos
+
+Genera textos de chunks con la forma de los reales (municipio x año x tipo de
+delito) y mide chunks/s con distintos tamaños de pool y de batch, para
+dimensionar las máquinas que construyen el índice.
+
+Uso:
+    python benchmarks/bench_pipeline.py --chunks 20000 --processes 1 2 4 --batch-sizes 32 64 128
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import TIPOS_DELITO, print_table
+from chatbot.rag_processor import RAGProcessor, encode_texts, load_embedding_model
+
+
+def synthetic_texts(n: int, seed: int = 0):
+    """Textos tipo 'Municipio: X. Año: Y. TIPO: N registros.'"""
+    rng = np.random.default_rng(seed)
+    return [
+        f"Municipio: MUNICIPIO {rng.integers(87):02d}. Año: {2018 + rng.integers(7)}. "
+        f"{TIPOS_DELITO[rng.integers(len(TIPOS_DELITO))]}: {rng.integers(1, 500)} registros."
+        for _ in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--backend", default="fp32")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.chunks)
+    model = load_embedding_model(RAGProcessor.MODEL_NAME, args.backend)
+
+    rows = []
+    for processes in args.processes:
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            with encode_texts(model, texts, RAGProcessor.MODEL_NAME, args.backend, processes, batch_size):
+                elapsed = time.perf_counter() - start
+            rows.append([processes, batch_size, elapsed, args.chunks / elapsed])
+
+    print_table(["procesos", "batch", "segundos", "chunks/s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: tokens de entrada por petición a lo largo de una conversación larga,
+enviando todo el historial frente a PromptBuilder (presupuesto fijo con
+resumen y últimos turnos)
+
+Simula `--turns` turnos con preguntas de PREGUNTAS, respuestas del tamaño de
+las de Groq (2-3 párrafos) y 5 datos del RAG con el formato de los chunks.
+
+Uso:
+    python benchmarks/bench_prompt.py --turns 40 --budget 1500
+"""
+import argparse
+import time
+
+from common import PREGUNTAS, TIPOS_DELITO, print_table
+from chatbot.llm_handler import ChatbotHandler
+from chatbot.prompt_builder import ConversationMemory, PromptBuilder, count_tokens, message_tokens
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
+         "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+def make_facts(turn: int):
+    """Textos como los chunks por ventana del RAG"""
+    facts = []
+    for i in range(5):
+        delito = TIPOS_DELITO[(turn + i) % len(TIPOS_DELITO)]
+        mensual = ", ".join(f"{mes} 2023: {(turn * 7 + i * 3 + m) % 40}" for m, mes in enumerate(MESES))
+        facts.append(f"Municipio: BUCARAMANGA (provincia METROPOLITANA). Delito: {delito}. "
+                     f"Periodo: 2023. Registros: {100 + turn + i}. Evolución mensual: {mensual}.")
+    return facts
+
+
+def make_answer(turn: int) -> str:
+    return (f"En el periodo consultado se registraron {120 + turn} casos, un {turn % 9 + 3}% más que el año "
+            "anterior. La mayor parte se concentra en los meses de mitad de año y en las zonas urbanas. " * 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--history-turns", type=int, default=4)
+    args = parser.parse_args()
+
+    system_prompt = ChatbotHandler._build_system_prompt(None)
+    builder = PromptBuilder(budget=args.budget)
+    memory = ConversationMemory(keep_turns=args.history_turns)
+    history = []
+    rows = []
+    build_ms = []
+    for turn in range(args.turns):
+        question = PREGUNTAS[turn % len(PREGUNTAS)]
+        facts = make_facts(turn)
+
+        # Sin presupuesto: todo el historial y los 5 datos completos
+        naive = [{"role": "system", "content": system_prompt},
+                 {"role": "system", "content": "CONTEXTO DE DATOS:\n" + "\n".join(facts)}]
+        naive += history + [{"role": "user", "content": question}]
+        naive_tokens = sum(message_tokens(m) for m in naive)
+
+        start = time.perf_counter()
+        messages, stats = builder.build(system_prompt, question, facts, history, memory)
+        build_ms.append((time.perf_counter() - start) * 1000)
+        assert sum(message_tokens(m) for m in messages) == stats['tokens'] <= args.budget
+
+        if turn in (0, 1, 4, 9, 19) or turn == args.turns - 1 or (turn + 1) % 20 == 0:
+            rows.append([turn + 1, naive_tokens, stats['tokens'], stats['facts'], stats['turns'],
+                         count_tokens(memory.summary)])
+
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": make_answer(turn)}]
+
+    print_table(["turno", "tokens_todo", "tokens_presupuesto", "datos", "mensajes", "tokens_resumen"], rows)
+    print(f"\nConstrucción del prompt: {sum(build_ms) / len(build_ms):.2f} ms de media, "
+          f"{max(build_ms):.2f} ms máximo")
+
+
+if __name__ == "__main__":
+    main()
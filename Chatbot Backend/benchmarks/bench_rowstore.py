@@ -0,0 +1,91 @@
+"""
+Benchmark: memoria de los payloads de los chunks
+(to_dict('records')[:100] por chunk vs. rangos sobre el almacén columnar)
+
+Mide la memoria Python retenida (tracemalloc) y la RSS del proceso antes y
+después de crear los chunks, y el coste de materializar los registros de los
+resultados devueltos. Como en la versión con to_dict, solo cuentan los chunks
+por municipio: los de provincia y ventana temporal no tienen equivalente.
+
+Uso:
+    python benchmarks/bench_rowstore.py --rows 500000 --municipios 87
+"""
+import argparse
+import gc
+import tracemalloc
+
+import pandas as pd
+
+from common import make_historicos, make_predicciones, print_table, rss_mb, timeit
+from chatbot.ingest import CountsAccumulator
+from chatbot.rag_processor import RAGProcessor
+
+
+def legacy_payloads(df_hist, df_pred):
+    """Payload anterior: hasta 100 dicts por chunk"""
+    payloads = []
+    for df in (df_hist, df_pred):
+        for _, df_mun in df.groupby('municipio', sort=False):
+            payloads.append(df_mun.to_dict('records')[:100])
+    return payloads
+
+
+def measure(build):
+    """(objeto, MB retenidos según tracemalloc, RSS antes, RSS después)"""
+    gc.collect()
+    rss_before = rss_mb()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained / 2**20, rss_before, rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--municipios", type=int, default=87)
+    args = parser.parse_args()
+
+    # Ya ordenadas como quedan en RAGProcessor tras la carga (históricos por
+    # municipio, delito y fecha), para medir solo el coste de los payloads
+    df_hist = make_historicos(args.rows, args.municipios)
+    fechas = pd.to_datetime(df_hist['fecha'], format='%d/%m/%Y')
+    df_hist = df_hist.take(df_hist.assign(fecha=fechas).sort_values(
+        ['municipio', 'tipo_delito', 'fecha'], kind='stable').index).reset_index(drop=True)
+    df_pred = make_predicciones(max(args.rows // 10, args.municipios), args.municipios).sort_values(
+        'municipio', kind='stable', ignore_index=True)
+
+    payloads, legacy_mb, legacy_rss0, legacy_rss1 = measure(lambda: legacy_payloads(df_hist, df_pred))
+    del payloads
+
+    rag = RAGProcessor()
+
+    def build_store():
+        rag.df_historicos, rag.df_predicciones = df_hist, df_pred
+        rag._build_row_stores()
+        # Solo los chunks por municipio, los que sustituyen a los payloads
+        counts = CountsAccumulator().update(rag.df_historicos, rag.fechas_historicos).result()
+        rag.chunks = (rag._historico_chunks(counts, rag.row_stores['historico']) +
+                      rag._prediccion_chunks(rag.df_predicciones, rag.row_stores['prediccion']))
+        return rag
+
+    _, store_mb, store_rss0, store_rss1 = measure(build_store)
+
+    # Materializar solo los 3 resultados que se devuelven por consulta
+    top3 = rag.chunks[:3]
+    t_records = timeit(lambda: [rag.get_records(chunk) for chunk in top3], repeat=20)
+
+    print_table(
+        ["payload", "retenido_MB", "rss_antes_MB", "rss_despues_MB"],
+        [
+            ["to_dict records", legacy_mb, legacy_rss0, legacy_rss1],
+            ["RowStore (rangos)", store_mb, store_rss0, store_rss1],
+        ],
+    )
+    print(f"\nMaterializar 3 resultados x 100 registros: {t_records * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
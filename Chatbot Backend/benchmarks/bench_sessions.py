@@ -0,0 +1,72 @@
+"""
+Benchmark: N sesiones de Streamlit con un ChatbotHandler por sesión frente al
+ChatbotHandler compartido del proceso (get_shared_handler)
+
+Cada sesión es un hilo, como en Streamlit. Comprueba que con el handler
+compartido todas las sesiones usan el mismo índice FAISS y el mismo modelo,
+y compara tiempo de arranque y memoria residente de ambos modos.
+
+Uso:
+    python benchmarks/bench_sessions.py --sessions 1 4 16 --rows 50000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import PREGUNTAS, print_table, rss_mb, synthetic_workdir
+import chatbot.llm_handler as llm_handler
+from chatbot.llm_handler import ChatbotHandler, get_shared_handler
+
+
+def open_session(factory, question: str):
+    """Lo que hace una sesión nueva: obtener el handler, esperar el índice y buscar"""
+    handler = factory()
+    handler.wait_until_ready()
+    handler.rag.search(question)
+    return handler
+
+
+def run(factory, n_sessions: int):
+    """Abre n sesiones concurrentes; devuelve (handlers, segundos, MB de RSS añadidos)"""
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(n_sessions) as pool:
+        handlers = list(pool.map(lambda i: open_session(factory, PREGUNTAS[i % len(PREGUNTAS)]), range(n_sessions)))
+    return handlers, time.perf_counter() - start, rss_mb() - rss_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rows", type=int, default=50_000, help="filas de historicos.csv")
+    args = parser.parse_args()
+
+    # Sin GROQ_API_KEY: solo se mide la parte RAG (modelo, CSV e índice)
+    os.environ.pop("GROQ_API_KEY", None)
+    rows = []
+    ok = True
+    with synthetic_workdir(args.rows, real_names=False, prefix="bench_sessions_"):
+        for n in args.sessions:
+            for mode, factory in (("por sesión", lambda: ChatbotHandler(background_warmup=False)),
+                                  ("compartido", get_shared_handler)):
+                llm_handler._shared_handler = None
+                handlers, elapsed, rss = run(factory, n)
+                indexes = len({id(h.rag.index) for h in handlers})
+                models = len({id(h.rag.embedding_model) for h in handlers})
+                if mode == "compartido" and (indexes != 1 or models != 1):
+                    ok = False
+                rows.append([n, mode, indexes, models, elapsed, rss])
+                del handlers
+                gc.collect()
+
+    print_table(["sesiones", "modo", "indices", "modelos", "arranque_s", "rss_mb"], rows)
+    print("\n✅ Las sesiones comparten un único índice y modelo" if ok
+          else "\n❌ El handler compartido creó más de un índice o modelo")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
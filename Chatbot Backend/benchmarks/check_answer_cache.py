@@ -0,0 +1,68 @@
+"""
+Comprobación: dos preguntas que solo cambian de delito, de mes, de periodo
+("desde 2020" / "antes de 2020") o de provincia no comparten entrada en la caché de respuestas
+(AnswerCache), aunque sus embeddings pasen el umbral de coseno
+
+El handler es compartido por todo el proceso, así que una respuesta reutilizada
+por error ("hurtos en enero" para "homicidios en febrero") la vería cualquier
+usuario. Usa datos sintéticos y el modelo simulado de common, sin red ni Groq.
+
+Uso:
+    python benchmarks/check_answer_cache.py
+"""
+import os
+import sys
+
+from common import synthetic_workdir, use_stub_embedder
+
+BASE = "¿Cuántos hurtos hubo en Girón en enero de 2023?"
+
+# (pregunta, ¿debe reutilizar la respuesta de BASE?)
+CASOS = [
+    ("¿Cuántos hurtos hubo en Girón en enero de 2023?", True),
+    ("¿Cuántos homicidios hubo en Girón en enero de 2023?", False),
+    ("¿Cuántos hurtos hubo en Girón en febrero de 2023?", False),
+    ("¿Cuántos homicidios hubo en Girón en febrero de 2023?", False),
+    ("¿Cuántos hurtos hubo en Girón en 2023?", False),
+]
+
+# Pares con el mismo texto salvo el periodo: no deben compartir alcance
+PARES = [
+    ("¿Cuántos hurtos hubo en Girón desde 2020?", "¿Cuántos hurtos hubo en Girón antes de 2020?"),
+    ("¿Cuántos hurtos hubo en Girón el año pasado?", "¿Cuántos hurtos hubo en Girón este año?"),
+    ("¿Cuántos hurtos hubo en Girón en 2023?", "¿Cuántos hurtos hubo en Girón en 2023 comparado con 2022?"),
+    ("¿Cuántos hurtos hubo en la provincia de Vélez?", "¿Cuántos hurtos hubo en la provincia de Guanentá?"),
+]
+
+
+def main():
+    use_stub_embedder()
+    os.environ.pop("GROQ_API_KEY", None)
+    lineas, fallos = [], 0
+    with synthetic_workdir(5_000, prefix="check_answer_cache_"):
+        from chatbot.llm_handler import ChatbotHandler
+        handler = ChatbotHandler(background_warmup=False)
+        embedding, fingerprint, scope = handler._answer_cache_args(BASE, 300)
+        handler.answer_cache.put(embedding, "respuesta de BASE", fingerprint, scope)
+
+        for pregunta, reutiliza in CASOS:
+            _, _, alcance = handler._answer_cache_args(pregunta, 300)
+            # Con el embedding de BASE: como si el coseno pasara el umbral
+            ok = (handler.answer_cache.get(embedding, fingerprint, alcance) is not None) == reutiliza
+            fallos += not ok
+            lineas.append(f"{'✅' if ok else '❌'} {pregunta} -> {'reutiliza' if reutiliza else 'no reutiliza'}")
+        for una, otra in PARES:
+            ok = handler._answer_cache_args(una, 300)[2] != handler._answer_cache_args(otra, 300)[2]
+            fallos += not ok
+            lineas.append(f"{'✅' if ok else '❌'} {una} / {otra} -> alcances distintos")
+
+    print("\n".join(lineas))
+
+    if fallos:
+        print(f"\n❌ {fallos} de {len(CASOS) + len(PARES)} preguntas con el alcance equivocado en la caché")
+        sys.exit(1)
+    print(f"\n✅ Las {len(CASOS) + len(PARES)} preguntas respetan el alcance de la caché")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Comprobación: qué preguntas responde la vía rápida (cubo de agregados) y
+cuáles deja al RAG + LLM, sobre datos sintéticos con municipios reales
+
+Casos de regresión: preguntas que no son de casos ("¿Cuántas personas viven
+en Bucaramanga?") o de lugares fuera de Santander ("¿Cuántos hurtos hay en
+Bogotá?") no deben contestarse con los totales de Santander, un conteo de un
+periodo sin datos ("¿Cuántos hurtos hubo en Girón en 2030?") no es "0 casos",
+y los rangos, cotas y semestres ("desde 2020", "primer semestre de 2023") se
+filtran como periodos, no como el año suelto; los periodos relativos y las
+comparaciones van al LLM. Un top-N ordena lo que nombra la pregunta ("el
+delito más común", "el mes con más hurtos"), y sin sustantivo va al LLM.
+Calificadores que el cubo no tiene (víctimas, hora, barrio, tasas, promedios,
+varias preguntas) y subcategorías de delito ("violencia contra la mujer") van
+al LLM; las provincias y el área metropolitana se filtran como zona.
+
+Uso:
+    python benchmarks/check_fast_path.py
+"""
+import sys
+
+from common import print_table, synthetic_workdir
+from chatbot.data_processor import DataProcessor
+
+# (pregunta, intención esperada; None = al LLM)
+CASOS = [
+    ("¿Cuántas personas viven en Bucaramanga?", None),
+    ("¿Cuántos hurtos hay en Bogotá?", None),
+    ("¿Cuántos homicidios hubo en Medellín en 2023?", None),
+    ("¿Cómo ha evolucionado la población de Girón?", None),
+    ("¿Cuántos hurtos de bicicletas hubo en Girón?", None),
+    ("¿Por qué aumentaron los homicidios en Girón?", None),
+    ("¿Cuántos hurtos hay en Bucaramanga?", 'conteo'),
+    ("¿Cuántos casos hubo en Girón en 2023?", 'conteo'),
+    ("¿Cuántos homicidios hubo en Santander en marzo de 2022?", 'conteo'),
+    ("¿Cuáles son los 5 municipios con más homicidio?", 'top'),
+    ("¿Qué delitos son más comunes en San Vicente de Chucurí?", 'top'),
+    ("Tendencia de delitos en San Gil", 'tendencia'),
+    ("¿Cómo ha evolucionado el hurto a personas en Barrancabermeja?", 'tendencia'),
+    ("¿Cuántos hurtos hubo en Girón el año pasado?", None),
+    ("¿Cuántos hurtos hubo en Girón en los últimos 3 meses?", None),
+    ("¿Cuántos hurtos hubo en Girón en 2023 comparado con 2022?", None),
+    ("¿Cuántos hurtos hubo en Girón de noviembre de 2022 a febrero de 2023?", None),
+    ("¿Dónde hay más hurtos?", None),
+    ("¿Cuántas mujeres fueron víctimas de homicidio en Girón?", None),
+    ("¿A qué hora ocurren más hurtos en Bucaramanga?", None),
+    ("¿Cuántos hurtos hubo el fin de semana en Girón?", None),
+    ("¿Cuántos hurtos hubo en el barrio Cabecera de Bucaramanga?", None),
+    ("¿Cuántos homicidios hay por cada 100 mil habitantes en Girón?", None),
+    ("¿Cuál es el promedio de hurtos por mes en Girón?", None),
+    ("¿Cuántos hurtos hubo en Girón y cuántos en Bucaramanga?", None),
+    ("¿Cuántos hurtos hubo en Girón vs. Bucaramanga?", None),
+    ("¿Cuántos casos de violencia contra la mujer hubo en Girón?", None),
+    ("¿Cuántos casos de violencia intrafamiliar hubo en Girón?", 'conteo'),
+]
+
+# Lugares: (pregunta, municipios, provincias)
+LUGARES = [
+    ("¿Cuántos hurtos hubo en la provincia de Vélez?", [], ['VÉLEZ']),
+    ("¿Cuántos homicidios hubo en el área metropolitana de Bucaramanga?", [], ['METROPOLITANA']),
+    ("¿Cuántos hurtos hubo en Vélez?", ['VÉLEZ'], []),
+    ("¿Qué delitos son más comunes en la provincia de García Rovira?", [], ['GARCÍA-ROVIRA']),
+]
+
+# Top-N: (pregunta, dimensión que se ordena)
+TOPS = [
+    ("¿Cuál es el delito más común en Santander?", 'tipo_delito'),
+    ("¿Qué delitos son más comunes?", 'tipo_delito'),
+    ("¿Cuáles son los delitos más frecuentes en 2023?", 'tipo_delito'),
+    ("En el municipio de Girón, ¿cuál es el delito más común?", 'tipo_delito'),
+    ("¿Cuál es el mes con más hurtos en Girón?", 'mes'),
+    ("¿Cuál fue el año con más homicidios en Girón?", 'anio'),
+    ("¿Cuál es el municipio con más delitos?", 'municipio'),
+]
+
+# Periodos que se filtran: (pregunta, años, meses)
+PERIODOS = [
+    ("¿Cuántos hurtos hubo en Girón entre 2019 y 2022?", [2019, 2020, 2021, 2022], []),
+    ("¿Cuántos hurtos hubo en Girón desde 2020?", [2020, 2021, 2022, 2023, 2024], []),
+    ("¿Cuántos hurtos hubo en Girón antes de 2020?", [2018, 2019], []),
+    ("¿Cuántos hurtos hubo en Girón en el primer semestre de 2023?", [2023], [1, 2, 3, 4, 5, 6]),
+    ("¿Cuántos casos hubo en Bucaramanga de enero a marzo de 2022?", [2022], [1, 2, 3]),
+]
+
+# Conteos de periodos fuera de los datos sintéticos (2018-2024): "No hay registros"
+SIN_DATOS = [
+    "¿Cuántos hurtos hubo en Girón en 2030?",
+    "¿Cuántos casos hubo en Bucaramanga en 2023 y 2030?",
+    "¿Cuántos homicidios hubo en Santander en marzo de 2030?",
+]
+
+
+def main():
+    with synthetic_workdir(20_000, predicciones=1_000, prefix="check_fast_path_") as data_dir:
+        data = DataProcessor(data_dir)
+        data.load_data()
+        rows, fallos = [], 0
+        for pregunta, esperada in CASOS:
+            obtenida = data.query_data(pregunta).get('intent')
+            ok = obtenida == esperada
+            fallos += not ok
+            rows.append(["✅" if ok else "❌", pregunta, esperada or "LLM", obtenida or "LLM"])
+        for pregunta, esperada in TOPS:
+            obtenida = data.query_data(pregunta).get('slots', {}).get('dimension')
+            ok = obtenida == esperada
+            fallos += not ok
+            rows.append(["✅" if ok else "❌", pregunta, f"top por {esperada}", f"top por {obtenida}"])
+        for pregunta, municipios, zonas in LUGARES:
+            slots = data.query_data(pregunta).get('slots', {})
+            obtenido = (slots.get('municipios'), slots.get('zonas'))
+            ok = obtenido == (municipios, zonas)
+            fallos += not ok
+            rows.append(["✅" if ok else "❌", pregunta, f"{municipios} {zonas}", f"{obtenido[0]} {obtenido[1]}"])
+        for pregunta, anios, meses in PERIODOS:
+            slots = data.query_data(pregunta).get('slots', {})
+            obtenido = (slots.get('anios'), slots.get('meses'))
+            ok = obtenido == (anios, meses)
+            fallos += not ok
+            rows.append(["✅" if ok else "❌", pregunta, f"{anios} {meses}", f"{obtenido[0]} {obtenido[1]}"])
+        for pregunta in SIN_DATOS:
+            answer = data.query_data(pregunta).get('answer', '')
+            ok = answer.startswith("No hay registros")
+            fallos += not ok
+            rows.append(["✅" if ok else "❌", pregunta, "sin datos", "sin datos" if ok else answer[:40]])
+
+    print()
+    print_table(["", "pregunta", "esperada", "obtenida"], rows)
+    if fallos:
+        print(f"\n❌ {fallos} de {len(CASOS) + len(TOPS) + len(LUGARES) + len(PERIODOS) + len(SIN_DATOS)} preguntas por la vía equivocada")
+        sys.exit(1)
+    print(f"\n✅ Las {len(CASOS) + len(TOPS) + len(LUGARES) + len(PERIODOS) + len(SIN_DATOS)} preguntas van por la vía esperada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Comprobación: ChatbotHandler.reload_data() (nuevos CSV, p. ej. la actualización
+semanal) reconstruye el cubo de la vía rápida junto con el índice del RAG, y
+una recarga fallida conserva los dos
+
+Mientras se recarga, varios hilos consultan la vía rápida y el RAG; ninguno
+debe fallar. Usa datos sintéticos y el modelo simulado de common, sin red ni Groq.
+
+Uso:
+    python benchmarks/check_reload.py
+"""
+import os
+import sys
+import threading
+
+from common import PREGUNTAS, make_historicos, synthetic_workdir, use_stub_embedder
+
+
+def consultar(handler, stop: threading.Event, errores: list):
+    """Una sesión que pregunta sin parar mientras dura la recarga"""
+    i = 0
+    while not stop.is_set():
+        pregunta = PREGUNTAS[i % len(PREGUNTAS)]
+        try:
+            handler.data.query_data(pregunta)
+            handler.rag.search(pregunta)
+        except Exception as e:
+            errores.append(e)
+        i += 1
+
+
+def main():
+    use_stub_embedder()
+    os.environ.pop("GROQ_API_KEY", None)
+    nuevos = make_historicos(8_000, seed=1, real_names=True)
+    errores = []
+    with synthetic_workdir(5_000, prefix="check_reload_") as data_dir:
+        from chatbot.llm_handler import ChatbotHandler
+        handler = ChatbotHandler(background_warmup=False)
+        cargado = handler.data_loaded
+        huella_antes = handler.rag.fingerprint
+
+        nuevos.to_csv(os.path.join(data_dir, "historicos.csv"), index=False)
+        stop = threading.Event()
+        hilos = [threading.Thread(target=consultar, args=(handler, stop, errores)) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        recargado = handler.reload_data()
+        stop.set()
+        for hilo in hilos:
+            hilo.join()
+
+        huella, total = handler.rag.fingerprint, handler.data.cube.total()
+        registros = handler.data.context_data["historicos"]["total_registros"]
+        giron = handler.data.query_data("¿Cuántos casos hubo en Girón?").get('data', {}).get('total')
+
+        # Un historicos.csv ilegible (aquí, un directorio) hace fallar la recarga:
+        # se conservan el índice y el cubo cargados
+        os.remove(os.path.join(data_dir, "historicos.csv"))
+        os.makedirs(os.path.join(data_dir, "historicos.csv"))
+        fallida = handler.reload_data()
+        conservado = handler.rag.fingerprint == huella and handler.data.cube.total() == total
+
+    checks = [
+        ("carga inicial", cargado),
+        ("recarga con datos nuevos", recargado and huella != huella_antes),
+        ("cubo reconstruido", total == int(nuevos["cantidad"].sum()) and registros == len(nuevos)),
+        ("respuesta con los datos nuevos",
+         giron == int(nuevos.loc[nuevos["municipio"] == "GIRÓN", "cantidad"].sum())),
+        (f"consultas durante la recarga sin errores ({len(errores)})", not errores),
+        ("recarga fallida conserva índice y cubo", not fallida and conservado),
+    ]
+    for nombre, ok in checks:
+        print(f"{'✅' if ok else '❌'} {nombre}")
+    if not all(ok for _, ok in checks):
+        if errores:
+            print(f"   {errores[0]!r}")
+        print("\n❌ La recarga no instala el cubo y el índice juntos")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
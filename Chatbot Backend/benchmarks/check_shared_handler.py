@@ -0,0 +1,66 @@
+"""
+Comprobación: N sesiones concurrentes (hilos, como en Streamlit) que piden el
+handler con get_shared_handler() reciben todas el mismo ChatbotHandler, el
+mismo índice FAISS y el mismo modelo de embeddings
+
+Usa datos sintéticos pequeños y el modelo simulado de common
+(StubSentenceTransformer), así que no necesita red ni torch y tarda segundos.
+Además cada sesión hace preguntas por la vía rápida y al final se comprueba
+que el contador de DataProcessor no perdió ninguna.
+
+Uso:
+    python benchmarks/check_shared_handler.py --threads 16
+"""
+import argparse
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common import PREGUNTAS, synthetic_workdir, use_stub_embedder
+
+
+def open_session(barrier: threading.Barrier, preguntas: int):
+    """Una sesión nueva: todas piden el handler a la vez y luego preguntan"""
+    from chatbot.llm_handler import get_shared_handler
+    barrier.wait()
+    handler = get_shared_handler()
+    handler.wait_until_ready()
+    for i in range(preguntas):
+        handler.data.query_data(PREGUNTAS[i % len(PREGUNTAS)])
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--questions", type=int, default=50, help="preguntas por sesión")
+    args = parser.parse_args()
+
+    use_stub_embedder()
+    # Sin GROQ_API_KEY: solo el RAG y los datos
+    os.environ.pop("GROQ_API_KEY", None)
+    with synthetic_workdir(5_000, prefix="check_shared_handler_"), ThreadPoolExecutor(args.threads) as pool:
+        barrier = threading.Barrier(args.threads)
+        futures = [pool.submit(open_session, barrier, args.questions) for _ in range(args.threads)]
+        handlers = [future.result() for future in futures]
+
+    handler = handlers[0]
+    consultas = handler.data.fast_path_stats()['total']
+    checks = [
+        ("un único ChatbotHandler", len({id(h) for h in handlers}) == 1),
+        ("un único índice FAISS", len({id(h.rag.index) for h in handlers}) == 1 and handler.rag.index is not None),
+        ("un único modelo de embeddings", len({id(h.rag.embedding_model) for h in handlers}) == 1
+         and handler.rag.embedding_model is not None),
+        (f"{args.threads * args.questions} consultas contadas", consultas == args.threads * args.questions),
+    ]
+    for nombre, ok in checks:
+        print(f"{'✅' if ok else '❌'} {nombre}")
+    if not all(ok for _, ok in checks):
+        print(f"\n❌ {args.threads} hilos con get_shared_handler(): estado no compartido "
+              f"({consultas} consultas contadas)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
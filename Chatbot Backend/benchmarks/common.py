@@ -0,0 +1,229 @@
+"""
+Utilidades compartidas por los benchmarks del backend del chatbot
+"""
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+import zlib
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# "Chatbot Backend/" se despliega como el paquete `chatbot` (ver app_gobierno);
+# se registra con ese nombre para que funcionen sus imports relativos
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "chatbot" not in sys.modules:
+    _package = types.ModuleType("chatbot")
+    _package.__path__ = [BACKEND_DIR]
+    sys.modules["chatbot"] = _package
+
+    # En el repositorio el handler se llama "llm_handler(1).py" (llm_handler.py al desplegar)
+    _handler_path = os.path.join(BACKEND_DIR, "llm_handler(1).py")
+    if not os.path.exists(os.path.join(BACKEND_DIR, "llm_handler.py")) and os.path.exists(_handler_path):
+        _spec = importlib.util.spec_from_file_location("chatbot.llm_handler", _handler_path)
+        _module = importlib.util.module_from_spec(_spec)
+        sys.modules["chatbot.llm_handler"] = _module
+        _spec.loader.exec_module(_module)
+
+TIPOS_DELITO = [
+    "HURTO A PERSONAS", "HURTO A RESIDENCIAS", "HURTO A COMERCIO", "HURTO DE MOTOCICLETAS",
+    "VIOLENCIA INTRAFAMILIAR", "LESIONES PERSONALES", "DELITOS SEXUALES", "HOMICIDIO",
+    "AMENAZAS", "EXTORSIÓN",
+]
+
+# Preguntas típicas de los ciudadanos (para benchmarks de búsqueda y carga)
+PREGUNTAS = [
+    "¿Cuántos hurtos hay en Bucaramanga?",
+    "¿Cuál es el municipio más peligroso de Santander?",
+    "¿Cómo evolucionaron los hurtos en Barrancabermeja en 2023?",
+    "¿Qué zonas de alto riesgo hay en Floridablanca?",
+    "¿Cuántos delitos sexuales hubo en Floridablanca en 2024?",
+    "Predicciones de riesgo para Girón",
+    "¿Qué delitos son más comunes en Piedecuesta?",
+    "Violencia intrafamiliar en San Gil",
+    "¿Es seguro Socorro?",
+    "¿Cuáles son los principales delitos en Lebrija?",
+    "Homicidios en Barrancabermeja el año pasado",
+    "¿Qué tendencia tiene el hurto de motocicletas en Bucaramanga?",
+    "hola",
+    "¿Qué armas se usan más en los hurtos a personas?",
+    "¿Cuántas lesiones personales se registraron en Vélez?",
+    "¿Dónde hay más riesgo de hurto a residencias?",
+]
+
+
+def municipio_names(n_municipios: int, real: bool = False) -> np.ndarray:
+    """Nombres sintéticos ("MUNICIPIO 00") o los primeros del catálogo de Santander"""
+    if real:
+        from chatbot.gazetteer import MUNICIPIOS_SANTANDER
+        return np.array(MUNICIPIOS_SANTANDER[:n_municipios])
+    return np.array([f"MUNICIPIO {i:02d}" for i in range(n_municipios)])
+
+
+def make_historicos(n_rows: int, n_municipios: int = 87, seed: int = 0, real_names: bool = False) -> pd.DataFrame:
+    """Genera un DataFrame sintético con la forma de historicos.csv"""
+    rng = np.random.default_rng(seed)
+    municipios = municipio_names(n_municipios, real_names)
+    fechas = pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 7 * 365, n_rows), unit="D")
+    return pd.DataFrame({
+        "municipio": municipios[rng.integers(0, n_municipios, n_rows)],
+        "tipo_delito": np.array(TIPOS_DELITO)[rng.integers(0, len(TIPOS_DELITO), n_rows)],
+        "fecha": fechas.strftime("%d/%m/%Y"),
+        "cantidad": rng.integers(1, 4, n_rows),
+    })
+
+
+def make_predicciones(n_rows: int, n_municipios: int = 87, seed: int = 1, real_names: bool = False) -> pd.DataFrame:
+    """Genera un DataFrame sintético con la forma de predicciones.csv"""
+    rng = np.random.default_rng(seed)
+    municipios = municipio_names(n_municipios, real_names)
+    return pd.DataFrame({
+        "municipio": municipios[rng.integers(0, n_municipios, n_rows)],
+        "riesgo": np.array(["alto", "medio", "bajo"])[rng.integers(0, 3, n_rows)],
+        "prediccion": rng.random(n_rows),
+    })
+
+
+# Plantillas de preguntas de ciudadanos: conteos, rankings y tendencias (vía
+# rápida) y preguntas abiertas que van al LLM
+_PLANTILLAS = [
+    "¿Cuántos casos de {delito} hubo en {municipio} en {anio}?",
+    "¿Cuántos {delito} se registraron en {municipio}?",
+    "Número de casos de {delito} en {municipio} en {mes} de {anio}",
+    "¿Cuáles son los 5 municipios con más {delito}?",
+    "¿Qué delitos son más comunes en {municipio}?",
+    "¿Cómo ha evolucionado {delito} en {municipio}?",
+    "Tendencia de {delito} en {municipio} en {anio}",
+    "¿Es seguro vivir en {municipio}?",
+    "¿Qué recomendaciones hay para prevenir {delito} en {municipio}?",
+    "¿Por qué aumentaron los casos de {delito} en {municipio}?",
+    "¿Qué zonas de alto riesgo hay en {municipio}?",
+    "Predicciones de riesgo para {municipio} el próximo año",
+    "Explícame la situación de seguridad de {municipio} comparada con el resto de Santander",
+    "¿Qué debo hacer si fui víctima de {delito} en {municipio}?",
+]
+
+
+def question_corpus(n: int, seed: int = 0, n_municipios: int = 87) -> List[str]:
+    """
+    `n` preguntas variadas en español: las plantillas combinadas con municipios
+    reales, delitos, años y meses, más las PREGUNTAS fijas (algunas se repiten,
+    como en producción)
+    """
+    from chatbot.gazetteer import MESES, MUNICIPIOS_SANTANDER
+    rng = np.random.default_rng(seed)
+    municipios = [m.title() for m in MUNICIPIOS_SANTANDER[:n_municipios]]
+    preguntas = []
+    for _ in range(n):
+        if rng.random() < 0.2:
+            preguntas.append(PREGUNTAS[rng.integers(len(PREGUNTAS))])
+            continue
+        plantilla = _PLANTILLAS[rng.integers(len(_PLANTILLAS))]
+        preguntas.append(plantilla.format(
+            delito=TIPOS_DELITO[rng.integers(len(TIPOS_DELITO))].lower(),
+            municipio=municipios[rng.integers(len(municipios))],
+            anio=int(rng.integers(2018, 2025)),
+            mes=MESES[rng.integers(12)],
+        ))
+    return preguntas
+
+
+class StubSentenceTransformer:
+    """
+    Modelo de embeddings sin red ni torch para las pruebas que no miden el
+    modelo: bolsa de palabras con hash en DIMENSION posiciones, normalizada.
+    El mismo texto da el mismo vector en cualquier proceso.
+    """
+
+    DIMENSION = 384
+
+    def __init__(self, model_name: str = "", device: str = "cpu", **kwargs):
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.DIMENSION
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        out = np.zeros((len(texts), self.DIMENSION), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i, zlib.crc32(word.encode("utf-8")) % self.DIMENSION] += 1
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+
+def use_stub_embedder():
+    """Registra StubSentenceTransformer como `sentence_transformers` (antes de inicializar el RAG)"""
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = StubSentenceTransformer
+    sys.modules["sentence_transformers"] = module
+
+
+@contextlib.contextmanager
+def synthetic_workdir(rows: int, predicciones: Optional[int] = None, real_names: bool = True,
+                      prefix: str = "chatbot_", quiet: bool = True) -> Iterator[str]:
+    """
+    Directorio temporal con data/historicos.csv (`rows` filas) y data/predicciones.csv
+    (`predicciones`, por defecto rows // 10) sintéticos, como directorio de trabajo:
+    RAGProcessor y ChatbotHandler leen "data" relativo al cwd. Devuelve la ruta de data.
+    Con quiet se silencian los logs del backend dentro del bloque. Al salir se
+    restaura el cwd y se borra el directorio.
+    """
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    try:
+        data_dir = os.path.join(workdir, "data")
+        os.makedirs(data_dir)
+        make_historicos(rows, real_names=real_names).to_csv(os.path.join(data_dir, "historicos.csv"), index=False)
+        make_predicciones(predicciones or max(rows // 10, 1), real_names=real_names).to_csv(
+            os.path.join(data_dir, "predicciones.csv"), index=False)
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            yield data_dir
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def timeit(fn: Callable, repeat: int = 3) -> float:
+    """Mejor tiempo (segundos) de `repeat` ejecuciones"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def percentiles(samples: List[float], qs: Tuple[float, ...] = (50, 99)) -> List[float]:
+    """Percentiles en milisegundos de una lista de tiempos en segundos"""
+    return [float(np.percentile(np.asarray(samples) * 1000, q)) for q in qs]
+
+
+def rss_mb() -> float:
+    """Memoria residente actual del proceso en MB (Linux: /proc; resto: pico de getrusage)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def print_table(headers: List[str], rows: List[List]):
+    """Imprime una tabla de texto alineada"""
+    cells = [[str(h) for h in headers]] + [[f"{c:.3f}" if isinstance(c, float) else str(c) for c in r] for r in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(headers))]
+    for j, r in enumerate(cells):
+        print("  ".join(c.rjust(w) for c, w in zip(r, widths)))
+        if j == 0:
+            print("  ".join("-" * w for w in widths))
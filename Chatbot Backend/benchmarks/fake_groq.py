@@ -0,0 +1,157 @@
+"""
+Servidor HTTP local que imita la API de chat completions de Groq
+(/openai/v1/chat/completions, con y sin stream SSE) para probar el cliente
+sin red ni API key. Latencia, tasa de errores 5xx y de 429 configurables.
+
+Uso:
+    python benchmarks/fake_groq.py --port 8765 --latency 0.3 --error-rate 0.1 --rate-limit-rate 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=fake streamlit run "app_gobierno(4).py"
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    """Servidor de pruebas; los parámetros se pueden cambiar en caliente"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency: float = 0.2, jitter: float = 0.05,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, token_delay: float = 0.01,
+                 answer_words: int = 60):
+        super().__init__(address, FakeGroqHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.counts = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0}
+        self._lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self._send_json(404, {'error': {'message': 'not found'}})
+
+        server.count('requests')
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+        roll = random.random()
+        if roll < server.rate_limit_rate:
+            server.count('rate_limited')
+            return self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'tokens'}},
+                                   {'retry-after': '0.2'})
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count('errors')
+            return self._send_json(503, {'error': {'message': 'Service unavailable'}})
+
+        question = body.get('messages', [{}])[-1].get('content', '')
+        words = [f"Respuesta simulada sobre «{question[:40]}»."]
+        words += [f"dato{i}" + ("." if i % 12 == 11 else "") for i in range(server.answer_words)]
+        text = " ".join(words).rstrip(".") + "."
+        server.count('ok')
+
+        if body.get('stream'):
+            return self._send_stream(body.get('model', 'fake'), text.split(" "))
+        return self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                         'finish_reason': 'stop', 'logprobs': None}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': len(words), 'total_tokens': 100 + len(words)},
+        })
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, tokens):
+        """Eventos SSE como los de Groq, con transferencia chunked para mantener la conexión"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(data: str):
+            event = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for i, token in enumerate(tokens):
+                time.sleep(self.server.token_delay)
+                send(json.dumps({
+                    'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': token if i == 0 else " " + token},
+                                 'finish_reason': None}],
+                }))
+            send(json.dumps({
+                'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            }))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó el stream (deadline); no es un error del servidor
+            self.close_connection = True
+
+
+def start_fake_groq(host: str = "127.0.0.1", port: int = 0, **config) -> FakeGroqServer:
+    """Arranca el servidor en un hilo de fondo (port=0 elige un puerto libre)"""
+    server = FakeGroqServer((host, port), **config)
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="segundos antes de responder")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fracción de respuestas 429")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="segundos entre fragmentos del stream")
+    args = parser.parse_args()
+
+    server = FakeGroqServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                            token_delay=args.token_delay)
+    print(f"Groq simulado en {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
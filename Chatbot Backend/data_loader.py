@@ -0,0 +1,213 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+# Versión del esquema: cambiarla invalida las cachés de tablas existentes
+SCHEMA_VERSION = 1
+
+# Columnas de fecha de los extractos de la Policía Nacional y de los CSV del notebook
+FECHA_COLUMNS = ('fecha', 'fecha_hecho', 'fecha hecho')
+
+# Columnas de texto con pocos valores distintos (nombres en minúsculas)
+CATEGORY_COLUMNS = (
+    'departamento', 'municipio', 'zona', 'comuna', 'nombre comuna', 'barrio',
+    'tipo_delito', 'tipo delito', 'delito', 'delito detallado', 'categoria delito', 'tipo hurto',
+    'armas medios', 'armas_medios', 'arma_medio', 'genero', 'grupo etario', 'grupo_etario',
+    'dia nombre', 'bloque_horario', 'clase de sitio', 'zona hecho',
+    'riesgo', 'nivel_riesgo',
+)
+
+# Otras columnas de texto se vuelven categóricas si repiten mucho sus valores
+AUTO_CATEGORY_RATIO = 0.05
+
+# dd/mm/aaaa, aaaa-mm-dd..., con hora opcional (formatos de FECHA HECHO)
+_PATRON_FECHA = re.compile(r'^\s*\d{1,4}[/-]\d{1,2}[/-]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?')
+
+
+def _cache_format() -> str:
+    """Feather (Arrow) si pyarrow está instalado; si no, pickle de pandas"""
+    try:
+        import pyarrow  # noqa: F401
+        return 'feather'
+    except ImportError:
+        return 'pickle'
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[str]:
+    """
+    Temporal único junto a `path` (varios procesos pueden escribir la misma caché
+    a la vez) que se renombra a `path` si el bloque termina sin error
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                    suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def source_key(path: str) -> str:
+    """Clave del CSV sin leerlo: ruta, tamaño, fecha de modificación y versión del esquema"""
+    stat = os.stat(path)
+    return f"v{SCHEMA_VERSION}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def parse_fechas(series: pd.Series) -> Optional[pd.Series]:
+    """Columna convertida a datetime64, o None si la mayoría de valores no son fechas"""
+    fechas = pd.to_datetime(series, format='mixed', dayfirst=True, errors='coerce')
+    if fechas.notna().sum() >= 0.5 * series.notna().sum():
+        return fechas
+    return None
+
+
+def looks_like_fecha(series: pd.Series, sample: int = 200) -> bool:
+    """Texto con forma de fecha (FECHA HECHO y similares), mirando una muestra de valores"""
+    values = series.dropna().head(sample).astype(str)
+    if values.empty:
+        return False
+    return values.map(lambda v: _PATRON_FECHA.match(v) is not None).mean() >= 0.9
+
+
+def read_typed_csv(path: str) -> pd.DataFrame:
+    """
+    Lee un CSV con tipos compactos: categóricas para municipio, delito, arma,
+    género..., la columna de fecha ya convertida a datetime64 y enteros
+    reducidos al tipo más pequeño que los contiene.
+    """
+    columns, dtypes = _csv_dtypes(path)
+    return _apply_types(pd.read_csv(path, dtype=dtypes), columns)
+
+
+def iter_typed_csv(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Bloques de `chunksize` filas con los tipos de read_typed_csv, para leer CSV
+    que no caben en memoria. Cada bloque tiene sus propias categorías y no se
+    crean categóricas automáticas (dependen de la columna completa).
+    """
+    columns, dtypes = _csv_dtypes(path)
+    with pd.read_csv(path, dtype=dtypes, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield _apply_types(chunk, columns, auto_category=False)
+
+
+def _csv_dtypes(path: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Columnas del CSV (nombre en minúsculas -> nombre) y las que se leen como categóricas"""
+    header = pd.read_csv(path, nrows=0)
+    columns = {str(col).strip().lower(): col for col in header.columns}
+    dtypes = {col: 'category' for name, col in columns.items() if name in CATEGORY_COLUMNS}
+    return columns, dtypes
+
+
+def _apply_types(df: pd.DataFrame, columns: Dict[str, str], auto_category: bool = True) -> pd.DataFrame:
+    """Fechas a datetime64, enteros con signo compactos y (opcional) texto repetitivo a categórica"""
+    for name, col in columns.items():
+        series = df[col]
+        if name in FECHA_COLUMNS:
+            # Si casi nada se reconoce como fecha, la columna se deja como estaba
+            fechas = parse_fechas(series)
+            if fechas is not None:
+                df[col] = fechas
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            # Con signo: restar conteos sin signo daría vueltas (2 - 5 = 253)
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif auto_category and (pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)) \
+                and not isinstance(series.dtype, pd.CategoricalDtype) and len(series):
+            if series.nunique(dropna=True) <= AUTO_CATEGORY_RATIO * len(series):
+                df[col] = series.astype('category')
+    
+    return df
+
+
+class TableCache:
+    """
+    Caché en disco de CSV ya tipados (Feather con pyarrow; pickle si no está).
+    La clave es el nombre, tamaño y fecha de modificación del CSV y la versión del
+    esquema, así que un CSV modificado se vuelve a leer sin tener que hashearlo.
+    Varios procesos (Streamlit, benchmarks) reutilizan la misma lectura.
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.format = _cache_format()
+    
+    def load(self, path: str) -> Optional[pd.DataFrame]:
+        """DataFrame tipado del CSV (de la caché si está al día), o None si el CSV no existe"""
+        if not os.path.exists(path):
+            return None
+        
+        start = time.perf_counter()
+        cache_path = self._cache_path(path)
+        if os.path.exists(cache_path):
+            try:
+                df = self._read(cache_path)
+                print(f"✅ {os.path.basename(path)}: {len(df):,} registros desde caché {self.format} "
+                      f"({time.perf_counter() - start:.2f}s, {memory_mb(df):.1f} MB)")
+                return df
+            except Exception as e:
+                print(f"⚠️ Caché de {os.path.basename(path)} inválida, se relee el CSV: {e}")
+        
+        df = read_typed_csv(path)
+        elapsed = time.perf_counter() - start
+        try:
+            self._write(df, cache_path)
+            self._remove_stale(path, cache_path)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la caché de {os.path.basename(path)}: {e}")
+        print(f"✅ {os.path.basename(path)}: {len(df):,} registros desde CSV "
+              f"({elapsed:.2f}s, {memory_mb(df):.1f} MB tipado)")
+        return df
+    
+    def _cache_path(self, path: str) -> str:
+        digest = hashlib.sha1(source_key(path).encode("utf-8")).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, f"{name}.{digest}.{self.format}")
+    
+    def _read(self, cache_path: str) -> pd.DataFrame:
+        if self.format == 'feather':
+            return pd.read_feather(cache_path)
+        return pd.read_pickle(cache_path)
+    
+    def _write(self, df: pd.DataFrame, cache_path: str):
+        """Escribe a un temporal y renombra: una escritura a medias nunca se lee"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with atomic_write(cache_path) as tmp_path:
+            if self.format == 'feather':
+                df.reset_index(drop=True).to_feather(tmp_path)
+            else:
+                df.to_pickle(tmp_path)
+    
+    def _remove_stale(self, path: str, cache_path: str):
+        """Borra las cachés de versiones anteriores del mismo CSV"""
+        prefix = os.path.splitext(os.path.basename(path))[0] + "."
+        for name in os.listdir(self.cache_dir):
+            stale = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and stale != cache_path and not name.endswith(".tmp"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    # Otro proceso ya la borró
+                    pass
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Memoria del DataFrame en MB (deep: cuenta también las cadenas)"""
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def load_tables(data_dir: str, cache_dir: Optional[str] = None) -> Dict[str, Optional[pd.DataFrame]]:
+    """historicos.csv y predicciones.csv tipados, con la caché en `cache_dir` (data/.table_cache)"""
+    cache = TableCache(cache_dir or os.path.join(data_dir, ".table_cache"))
+    return {
+        'historicos': cache.load(os.path.join(data_dir, "historicos.csv")),
+        'predicciones': cache.load(os.path.join(data_dir, "predicciones.csv")),
+    }
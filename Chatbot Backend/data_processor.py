@@ -1,35 +1,343 @@
 import pandas as pd
+import copy
 import os
-from typing import List, Dict, Any
+import re
+import threading
+import time
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
 import json
+from .gazetteer import (normalize_text, find_municipios, find_provincias, find_lugares_desconocidos, find_years,
+                        find_months, detect_tipo, MESES)
+from .aggregate_cube import AggregateCube
+from .data_loader import FECHA_COLUMNS, TableCache, atomic_write, source_key
+from .ingest import ProfileAccumulator, StreamSummary, ingest_csv
+
+# Versión del formato del perfil de columnas (invalida los perfiles guardados)
+PROFILE_VERSION = 1
+
+# Palabras clave de intención (sobre texto normalizado), en orden de prioridad
+_INTENCIONES = (
+    ('tendencia', ('evolucion', 'tendencia', 'por mes', 'mensual', 'por ano', 'anual', 'comportamiento')),
+    ('top', ('mas peligros', 'mas comun', 'mas frecuent', 'principales', 'ranking', 'top ', 'con mas', 'mas casos')),
+    ('conteo', ('cuant', 'numero de', 'total de', 'cantidad de')),
+)
+
+# Conteos y tendencias sin delito en la pregunta: solo si se habla de casos
+# ("¿cuántos casos hubo en Girón?"), no de otra cosa ("¿cuántas personas viven en Girón?")
+_PALABRAS_CASOS = ('caso', 'delito', 'delict', 'denuncia', 'crimen', 'crimin', 'insegur', 'registro')
+
+# Preguntas abiertas o sobre predicciones: siempre al LLM
+_ABIERTAS = ('por que', 'prevenir', 'recomend', 'explica', 'que hacer', 'arma')
+
+# Sinónimos frecuentes -> palabra del catálogo de delitos
+_SINONIMOS_DELITO = {'robo': 'hurto', 'asesinato': 'homicidio', 'violencia domestica': 'violencia intrafamiliar'}
+
+# Lo que puede seguir a un delito sin convertirlo en una subcategoría ("hurtos en Girón",
+# "homicidios hubo", "hurtos del 2023"); cualquier otra palabra sí ("violencia contra la mujer")
+_TRAS_DELITO = (
+    'en', 'hubo', 'hay', 'ha', 'han', 'habido', 'se', 'son', 'es', 'fue', 'fueron', r'ocurri\w*', r'registr\w*',
+    r'report\w*', r'denunci\w*', r'comet\w*', r'tien\w*', 'tuvo', 'mas', 'menos', 'por', 'durante', 'entre',
+    'desde', 'hasta', 'antes', 'despues', 'a partir', 'y', 'e', 'o', 'u', 'ni', 'que', 'con', 'el', 'la', 'los',
+    'las', 'este', 'esta', r'\d+',
+)
+_PATRON_TRAS_DELITO = re.compile(r'\s*(?:[^\w\s]|$)|\s+(?:' + '|'.join(_TRAS_DELITO) + r')(?![\w])'
+                                 r'|\s+(?:de|del) (?:el )?(?:\d|ano|mes|' + '|'.join(MESES + ('setiembre',)) + r')')
+
+_PATRON_TOP_N = re.compile(r'(?<![\w])(?:top|los|las|primeros|primeras)\s+(\d{1,2})(?!\d)')
+
+# Sustantivo de lo que se ordena en un top-N ("el delito más común", "el mes con más hurtos"):
+# el primero que aparece en la pregunta, salvo si solo nombra un lugar o fecha ("en el municipio de Girón")
+_DIMENSIONES_TOP = {
+    'municipio': 'municipio', 'ciudad': 'municipio', 'delito': 'tipo_delito', 'tipo': 'tipo_delito',
+    'crimen': 'tipo_delito', 'modalidad': 'tipo_delito', 'mes': 'mes', 'ano': 'anio', 'provincia': 'zona',
+}
+_PATRON_DIMENSION = re.compile(r'(?<![\w])(?:(?:municipio|ciudad|provincia|mes|ano) (?:de|del|\d)|('
+                               + '|'.join(_DIMENSIONES_TOP) + r')(?:es|s)?(?![\w]))')
+
+# Calificadores que el cubo no puede filtrar (sobre texto normalizado): la pregunta va al LLM
+_CALIFICADORES = (
+    # Periodos relativos: dependen de la fecha de hoy y cruzan años ("últimos 3 meses")
+    r'(?:el |este |del )?ano (?:pasado|anterior|actual)', r'este ano', r'(?:el |este |del )?mes (?:pasado|anterior)',
+    r'este mes', r'(?:esta|la) semana', r'semana pasada', r'ultim[oa]s?', r'hoy', r'ayer', r'reciente(?:s|mente)?',
+    r'actualmente',
+    r'ahora',
+    # Comparaciones: el cubo daría la suma de los dos periodos
+    r'compar\w*', r'vs\.?', r'versus', r'frente a', r'respecto (?:a|al|de)', r'diferencia',
+    # Víctimas, hora, día y lugar dentro del municipio: el cubo no tiene esas columnas
+    r'generos?', r'sexo', r'mujer(?:es)?', r'hombres?', r'femenin\w*', r'masculin\w*', r'ninos?', r'ninas?',
+    r'menores', r'edad(?:es)?', r'horas?', r'horarios?', r'noches?', r'nocturn\w*', r'madrugadas?', r'tardes?',
+    r'dias?', r'diari\w*', r'semanas?', r'festivos?', r'lunes', r'martes', r'miercoles', r'jueves', r'viernes',
+    r'sabados?', r'domingos?', r'\d{1,2} de (?:' + '|'.join(MESES + ('setiembre',)) + ')',
+    r'comunas?', r'barrios?', r'veredas?', r'corregimientos?', r'sectores?', r'calles?', r'zonas?', r'rural(?:es)?',
+    r'urban[oa]s?',
+    # Tasas y medias: el cubo solo da totales
+    r'por cada', r'habitantes?', r'per capita', r'tasas?', r'poblacion', r'porcentajes?', r'por ciento',
+    r'proporcion(?:es)?', r'promedios?', r'media', r'mediana',
+    # Varias preguntas en una ("¿... en Girón y cuántos en Bucaramanga?")
+    r'(?:y|e|o) (?:cuant|cual|que|como|donde|en que)\w*',
+)
+_PATRON_CALIFICADORES = re.compile(r'(?<![\w])(?:' + '|'.join(_CALIFICADORES) + r')(?![\w])')
+
+# Periodos que sí se filtran: rangos y cotas de años, rangos de meses y semestres/trimestres
+_ANIO = r'((?:19|20)\d{2})'
+_MES = '(' + '|'.join(MESES + ('setiembre',)) + ')'
+_PATRON_RANGO_ANIOS = re.compile(r'(?<![\w])(?:entre|de|del|desde)(?: el)?(?: ano)? ' + _ANIO
+                                 + r' (?:y|a|al|hasta)(?: el)? ' + _ANIO + r'(?!\d)')
+_PATRON_COTA_ANIO = re.compile(r'(?<![\w])(desde|a partir de|despues de|antes de|hasta)(?: el)?(?: ano)? '
+                               + _ANIO + r'(?!\d)')
+_PATRON_RANGO_MESES = re.compile(r'(?<![\w])(?:entre|de|desde)(?: el mes de)? ' + _MES + r' (?:y|a|al|hasta) ' + _MES
+                                 + r'(?![\w])')
+# Periodos con mes que no son un producto años × meses ("de marzo de 2022 a junio de 2023", "desde marzo")
+_PATRON_PERIODO_CRUZADO = re.compile(_MES + r' (?:de |del )?' + _ANIO + r' (?:y|a|al|hasta) (?:el )?' + _MES
+                                     + r'|(?<![\w])(?:desde|a partir de|despues de|antes de|hasta) (?:el mes de )?' + _MES)
+_ORDINALES = {'primer': 1, 'primero': 1, 'segundo': 2, 'tercer': 3, 'tercero': 3, 'cuarto': 4}
+_PATRON_PARTES_ANIO = re.compile(r'(?<![\w])((?:' + '|'.join(_ORDINALES) + r')(?:(?:, | y | e )(?:'
+                                 + '|'.join(_ORDINALES) + r'))*) (semestre|trimestre)s?(?![\w])')
+_PATRON_PARTE_SUELTA = re.compile(r'(?<![\w])(?:semestr|trimestr|bimestr)')
+
+
+class QueryParser:
+    """
+    Parser de intención y slots para preguntas numéricas:
+    intención (conteo / top / tendencia), municipios, delitos, años, meses y N.
+    Los delitos se reconocen sobre las categorías presentes en los datos, con
+    plurales ("hurtos") y por palabra principal ("hurtos" -> todos los HURTO ...),
+    siempre que la mención sea completa (ver find_delitos).
+    Los años del cubo (`anios`) acotan los periodos abiertos ("desde 2020").
+    """
+    
+    def __init__(self, categorias: List[str], anios: List[int]):
+        self.categorias = sorted(categorias)
+        self.anios = sorted(anios)
+        self._frases = []
+        cabezas = {}
+        for categoria in self.categorias:
+            palabras = normalize_text(categoria).split()
+            if not palabras:
+                continue
+            self._frases.append((self._patron(palabras), categoria))
+            if palabras[0] not in ('delito', 'delitos') and len(palabras[0]) >= 4:
+                cabezas.setdefault(palabras[0], []).append(categoria)
+        self._cabezas = [(self._patron([cabeza]), categorias) for cabeza, categorias in cabezas.items()]
+    
+    @staticmethod
+    def _patron(palabras: List[str]):
+        """Expresión para una frase normalizada admitiendo plural en cada palabra"""
+        cuerpo = r'\s+'.join(re.escape(p) + r'(?:es|s)?' for p in palabras)
+        return re.compile(r'(?<![\w])' + cuerpo + r'(?![\w])')
+    
+    def find_delitos(self, normalized: str) -> Optional[List[str]]:
+        """
+        Categorías de delito mencionadas (frase completa o palabra principal).
+        None si se pide una subcategoría que no está en los datos ("hurto de
+        bicicletas", "violencia contra la mujer"): tras la mención solo puede
+        venir lo que admite _TRAS_DELITO, porque responder con todos los hurtos
+        o con la violencia intrafamiliar sería engañoso.
+        """
+        for sinonimo, palabra in _SINONIMOS_DELITO.items():
+            normalized = re.sub(r'(?<![\w])' + sinonimo + r'(?:es|s)?(?![\w])', palabra, normalized)
+        
+        menciones = [(m.start(), m.end(), [categoria])
+                     for patron, categoria in self._frases for m in patron.finditer(normalized)]
+        if not menciones:
+            menciones = [(m.start(), m.end(), categorias)
+                         for patron, categorias in self._cabezas for m in patron.finditer(normalized)]
+        
+        found = []
+        for start, end, categorias in menciones:
+            if any(s <= start and end <= e and e - s > end - start for s, e, _ in menciones):
+                # Parte de una mención más larga ("homicidio" en "homicidio culposo" si ambos existen)
+                continue
+            if not _PATRON_TRAS_DELITO.match(normalized, end):
+                return None
+            found.extend(c for c in categorias if c not in found)
+        return found
+    
+    def find_periodo(self, normalized: str) -> Optional[Tuple[List[int], List[int]]]:
+        """
+        (años, meses) pedidos. Rangos ("entre 2019 y 2022", "de enero a marzo"),
+        cotas ("desde 2020", "antes de 2020") y semestres/trimestres ("primer
+        semestre de 2023") se convierten en listas; sin ellos, los años y meses
+        mencionados. None si el periodo no es un producto años × meses
+        ("de noviembre de 2022 a febrero de 2023") o mezcla un rango con otras fechas.
+        """
+        anios, meses = find_years(normalized), find_months(normalized)
+        if _PATRON_PERIODO_CRUZADO.search(normalized):
+            return None
+        
+        rango = _PATRON_RANGO_ANIOS.search(normalized) or _PATRON_COTA_ANIO.search(normalized)
+        if rango is not None:
+            if find_years(normalized[:rango.start()] + ' ' + normalized[rango.end():]):
+                return None
+            if rango.re is _PATRON_RANGO_ANIOS:
+                desde, hasta = sorted(int(g) for g in rango.groups())
+            else:
+                cota, anio = rango.group(1), int(rango.group(2))
+                primero, ultimo = self.anios[0], self.anios[-1]
+                desde, hasta = {'desde': (anio, ultimo), 'a partir de': (anio, ultimo), 'despues de': (anio + 1, ultimo),
+                                'antes de': (primero, anio - 1), 'hasta': (primero, anio)}[cota]
+            # Una cota fuera de los datos ("desde 2030") se queda como ese año, que no tiene registros
+            anios = list(range(desde, hasta + 1)) or [desde if desde > self.anios[-1] else hasta]
+        
+        rango = _PATRON_RANGO_MESES.search(normalized)
+        if rango is not None:
+            if find_months(normalized[:rango.start()] + ' ' + normalized[rango.end():]):
+                return None
+            desde, hasta = (find_months(g)[0] for g in rango.groups())
+            if desde > hasta and anios:
+                # "de noviembre a febrero de 2023" cruza el cambio de año
+                return None
+            meses = list(range(desde, hasta + 1)) if desde <= hasta else list(range(desde, 13)) + list(range(1, hasta + 1))
+        
+        partes = _PATRON_PARTES_ANIO.findall(normalized)
+        if len(partes) != len(_PATRON_PARTE_SUELTA.findall(normalized)) or (partes and meses):
+            # "por trimestre", "último semestre" o meses sueltos junto a un semestre
+            return None
+        for ordinales, parte in partes:
+            largo = 6 if parte == 'semestre' else 3
+            for ordinal in re.findall(r'\w+', ordinales):
+                numero = _ORDINALES.get(ordinal)
+                if numero is None:
+                    continue
+                if numero * largo > 12:
+                    return None
+                meses.extend(range((numero - 1) * largo + 1, numero * largo + 1))
+        return anios, meses
+    
+    def parse(self, text: str) -> Dict[str, Any]:
+        """
+        Intención y slots; intent None si la pregunta no es numérica, es abierta,
+        es de fuera de Santander o lleva calificadores que el cubo no filtra
+        (periodos relativos, comparaciones, víctimas, hora, barrio, tasas, promedios
+        o varias preguntas: ver _CALIFICADORES)
+        """
+        normalized = normalize_text(text)
+        intent = None
+        if detect_tipo(text) != 'prediccion' and not any(p in normalized for p in _ABIERTAS):
+            intent = next((name for name, claves in _INTENCIONES if any(c in normalized for c in claves)), None)
+        
+        calificadores = [m.group(0) for m in _PATRON_CALIFICADORES.finditer(normalized)]
+        periodo = self.find_periodo(normalized)
+        if calificadores or periodo is None:
+            intent = None
+        dimension = next((_DIMENSIONES_TOP[m.group(1)] for m in _PATRON_DIMENSION.finditer(normalized) if m.group(1)),
+                         None)
+        if intent == 'top' and dimension is None:
+            # "¿Dónde hay más hurtos?": sin saber qué se ordena, mejor el LLM
+            intent = None
+        
+        delitos = self.find_delitos(normalized)
+        if delitos is None:
+            intent, delitos = None, []
+        elif intent in ('conteo', 'tendencia') and not delitos and not any(p in normalized for p in _PALABRAS_CASOS):
+            intent = None
+        if intent is not None and find_lugares_desconocidos(text):
+            # Lugar fuera del catálogo ("en Bogotá"): los totales de Santander serían engañosos
+            intent = None
+        
+        top_n = _PATRON_TOP_N.search(normalized)
+        anios, meses = periodo or (find_years(normalized), find_months(normalized))
+        return {
+            'intent': intent,
+            'municipios': find_municipios(text),
+            'zonas': find_provincias(text),
+            'delitos': delitos,
+            'anios': anios,
+            'meses': meses,
+            'n': min(int(top_n.group(1)), 20) if top_n else 5,
+            'dimension': dimension,
+            'calificadores': calificadores,
+        }
+
 
 class DataProcessor:
     """
     Procesa los datos históricos y de predicciones para alimentar el chatbot
     """
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", stream_chunksize: Optional[int] = None):
         self.data_dir = data_dir
+        # Filas por bloque para leer historicos.csv en streaming (0/None = tabla completa)
+        self.stream_chunksize = stream_chunksize or int(os.getenv("DATA_STREAM_CHUNKSIZE", "0")) or None
         self.historicos_df = None
+        # Conteos y perfil de los históricos cuando se leen por bloques (ver ingest.StreamSummary)
+        self.historicos_summary = None
         self.predicciones_df = None
         self.context_data = None
+        # Cubo de casos (municipio, año, mes, tipo_delito) para query_data y futuros paneles
+        self.cube = None
+        self.parser = None
+        # Preguntas respondidas sin LLM frente al total (ver fast_path_stats)
+        self.consultas = {'rapida': 0, 'llm': 0}
+        # El procesador se comparte entre sesiones (hilos de Streamlit)
+        self._consultas_lock = threading.Lock()
+        # Una consulta no ve el cubo de una recarga a medio instalar (ver swap_state)
+        self._state_lock = threading.Lock()
+        # Último perfil de columnas de cada CSV, con la huella de sus datos (ver _get_basic_stats)
+        self.cache_dir = os.path.join(data_dir, ".table_cache")
+        self._profiles = {}
         
-    def load_data(self) -> bool:
-        """Carga los archivos CSV de datos"""
+    def load_data(self, historicos_df: Optional[pd.DataFrame] = None,
+                  predicciones_df: Optional[pd.DataFrame] = None,
+                  historicos_summary: Optional[StreamSummary] = None) -> bool:
+        """
+        Carga los archivos CSV de datos (o usa DataFrames ya leídos, p. ej. los del RAG).
+        Los CSV se leen tipados y con caché en disco (ver data_loader.TableCache).
+        Con stream_chunksize (o un `historicos_summary` del RAG) los históricos se
+        leen por bloques y solo se guardan sus conteos y su perfil.
+        La carga se hace sobre una copia que se instala de una vez (ver stage_data).
+        """
+        staged, ok = self.stage_data(historicos_df, predicciones_df, historicos_summary)
+        self.swap_state(staged)
+        return ok
+    
+    def stage_data(self, historicos_df: Optional[pd.DataFrame] = None,
+                   predicciones_df: Optional[pd.DataFrame] = None,
+                   historicos_summary: Optional[StreamSummary] = None) -> Tuple['DataProcessor', bool]:
+        """
+        Copia del procesador con los datos cargados (contexto, cubo y parser nuevos)
+        y si la carga fue bien. Si falla, la copia queda sin datos y todo va al LLM,
+        en lugar de responder con el cubo anterior. Los contadores se comparten.
+        """
+        staged = copy.copy(self)
+        ok = staged._load_data(historicos_df, predicciones_df, historicos_summary)
+        if not ok:
+            staged.historicos_df = staged.historicos_summary = staged.predicciones_df = None
+            staged.context_data = staged.cube = staged.parser = None
+        return staged, ok
+    
+    def swap_state(self, staged: 'DataProcessor'):
+        """Instala el estado de `staged`; las consultas en curso terminan con el anterior"""
+        with self._state_lock:
+            vars(self).update(vars(staged))
+    
+    def _load_data(self, historicos_df: Optional[pd.DataFrame], predicciones_df: Optional[pd.DataFrame],
+                   historicos_summary: Optional[StreamSummary]) -> bool:
         try:
-            historicos_path = os.path.join(self.data_dir, "historicos.csv")
-            predicciones_path = os.path.join(self.data_dir, "predicciones.csv")
+            cache = TableCache(self.cache_dir)
             
-            if os.path.exists(historicos_path):
-                self.historicos_df = pd.read_csv(historicos_path)
-                print(f"✅ Datos históricos cargados: {len(self.historicos_df)} registros")
+            self.historicos_df, self.historicos_summary = None, None
+            if historicos_summary is not None:
+                self.historicos_summary = historicos_summary
+            elif historicos_df is not None:
+                self.historicos_df = historicos_df
+            elif self.stream_chunksize:
+                self.historicos_summary = ingest_csv(os.path.join(self.data_dir, "historicos.csv"),
+                                                     self.stream_chunksize, self.cache_dir)
+            else:
+                self.historicos_df = cache.load(os.path.join(self.data_dir, "historicos.csv"))
             
-            if os.path.exists(predicciones_path):
-                self.predicciones_df = pd.read_csv(predicciones_path)
-                print(f"✅ Predicciones cargadas: {len(self.predicciones_df)} registros")
+            if predicciones_df is not None:
+                self.predicciones_df = predicciones_df
+            else:
+                self.predicciones_df = cache.load(os.path.join(self.data_dir, "predicciones.csv"))
             
             # Generar contexto para el LLM
             self._generate_context()
+            
+            # Agregados para responder preguntas numéricas sin LLM
+            self._build_aggregates()
             return True
             
         except Exception as e:
@@ -46,61 +354,87 @@ class DataProcessor:
         
         # Información de datos históricos
         if self.historicos_df is not None:
+            stats = self._get_basic_stats(self.historicos_df, "historicos.csv")
             context["historicos"] = {
                 "total_registros": len(self.historicos_df),
                 "columnas": list(self.historicos_df.columns),
-                "periodo": self._get_date_range(self.historicos_df),
-                "estadisticas_basicas": self._get_basic_stats(self.historicos_df)
+                "periodo": self._get_date_range(stats),
+                "estadisticas_basicas": stats
+            }
+        elif self.historicos_summary is not None:
+            stats = self.historicos_summary.profile
+            context["historicos"] = {
+                "total_registros": self.historicos_summary.rows,
+                "columnas": list(self.historicos_summary.columns),
+                "periodo": self._get_date_range(stats),
+                "estadisticas_basicas": stats
             }
         
         # Información de predicciones
         if self.predicciones_df is not None:
+            stats = self._get_basic_stats(self.predicciones_df, "predicciones.csv")
             context["predicciones"] = {
                 "total_registros": len(self.predicciones_df),
                 "columnas": list(self.predicciones_df.columns),
-                "estadisticas_basicas": self._get_basic_stats(self.predicciones_df)
+                "periodo": self._get_date_range(stats),
+                "estadisticas_basicas": stats
             }
         
         self.context_data = context
     
-    def _get_date_range(self, df: pd.DataFrame) -> Dict[str, str]:
-        """Obtiene el rango de fechas del dataframe"""
-        date_columns = df.select_dtypes(include=['datetime64']).columns
-        if len(date_columns) > 0:
-            date_col = date_columns[0]
-            return {
-                "inicio": str(df[date_col].min()),
-                "fin": str(df[date_col].max())
-            }
-        return {}
-    
-    def _get_basic_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Obtiene estadísticas básicas del dataframe"""
-        stats = {}
-        
-        # Columnas numéricas
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        if len(numeric_cols) > 0:
-            stats["numericas"] = {
-                col: {
-                    "min": float(df[col].min()),
-                    "max": float(df[col].max()),
-                    "promedio": float(df[col].mean()),
-                    "total": float(df[col].sum())
-                }
-                for col in numeric_cols[:5]  # Solo las primeras 5 columnas
-            }
+    def _get_date_range(self, stats: Dict[str, Any]) -> Dict[str, str]:
+        """Rango de fechas del perfil: FECHA HECHO (o similar) o la primera columna de fechas"""
+        fechas = stats.get("fechas", {})
+        if not fechas:
+            return {}
+        col = next((c for c in fechas if str(c).strip().lower() in FECHA_COLUMNS), next(iter(fechas)))
+        return {"inicio": fechas[col]["inicio"], "fin": fechas[col]["fin"]}
+    
+    def _get_basic_stats(self, df: pd.DataFrame, filename: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Perfil de todas las columnas del dataframe, cacheado por la huella de los datos
+        (en memoria y en .table_cache, así que otros procesos no lo recalculan).
+        `filename` es el CSV de origen en data_dir; sin él no se cachea.
+        """
+        path = os.path.join(self.data_dir, filename) if filename else None
+        if path is None or not os.path.exists(path):
+            return self._profile(df)
         
-        # Columnas categóricas
-        categorical_cols = df.select_dtypes(include=['object']).columns
-        if len(categorical_cols) > 0:
-            stats["categoricas"] = {
-                col: df[col].value_counts().head(5).to_dict()
-                for col in categorical_cols[:3]  # Solo las primeras 3 columnas
-            }
+        key = f"p{PROFILE_VERSION}|{source_key(path)}|{len(df)}|{','.join(map(str, df.columns))}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        name = os.path.splitext(filename)[0]
+        cached = self._profiles.get(name)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
         
+        profile_path = os.path.join(self.cache_dir, f"perfil_{name}.{digest}.json")
+        stats = None
+        if os.path.exists(profile_path):
+            try:
+                with open(profile_path, "r", encoding="utf-8") as f:
+                    stats = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Perfil de {filename} inválido, se recalcula: {e}")
+        
+        if stats is None:
+            stats = self._profile(df)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                for old in os.listdir(self.cache_dir):
+                    if old.startswith(f"perfil_{name}.") and old.endswith(".json"):
+                        os.remove(os.path.join(self.cache_dir, old))
+                with atomic_write(profile_path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(stats, f, ensure_ascii=False)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar el perfil de {filename}: {e}")
+        
+        self._profiles[name] = (digest, stats)
         return stats
     
+    def _profile(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Estadísticas de todas las columnas en una pasada (ver ingest.ProfileAccumulator)"""
+        return ProfileAccumulator().update(df).result()
+    
     def get_context_string(self) -> str:
         """Retorna el contexto como string formateado para el LLM"""
         if self.context_data is None:
@@ -124,6 +458,7 @@ DATOS HISTÓRICOS:
 """
             if hist.get('periodo'):
                 context_str += f"- Período: {hist['periodo'].get('inicio', 'N/A')} a {hist['periodo'].get('fin', 'N/A')}\n"
+            context_str += self._format_stats(hist['estadisticas_basicas'])
         
         if "predicciones" in self.context_data:
             pred = self.context_data["predicciones"]
@@ -132,21 +467,183 @@ PREDICCIONES GENERADAS:
 - Total de predicciones: {pred['total_registros']:,}
 - Variables predictivas: {', '.join(pred['columnas'])}
 """
+            context_str += self._format_stats(pred['estadisticas_basicas'])
         
         return context_str
     
+    @staticmethod
+    def _format_stats(stats: Dict[str, Any]) -> str:
+        """Una línea por columna del perfil"""
+        lines = []
+        for col, s in stats.get("categoricas", {}).items():
+            top = ', '.join(f"{k}: {v:,}" for k, v in list(s['top'].items())[:3])
+            lines.append(f"- {col}: {s['distintos']:,} valores distintos" + (f" (más frecuentes: {top})" if top else ""))
+        for col, s in stats.get("numericas", {}).items():
+            if s['promedio'] is None:
+                continue
+            lines.append(f"- {col}: mínimo {s['min']:g}, máximo {s['max']:g}, "
+                         f"promedio {s['promedio']:.2f}, total {s['total']:,.0f}")
+        for col, s in stats.get("fechas", {}).items():
+            lines.append(f"- {col}: del {s['inicio']} al {s['fin']}")
+        return "\n".join(lines) + "\n" if lines else ""
+    
+    def _build_aggregates(self):
+        """
+        Cubo de casos municipio × año × mes × tipo de delito de los históricos
+        (ver aggregate_cube.AggregateCube), o de sus conteos si se leyeron por bloques.
+        Se suma CANTIDAD si existe; si no, cada fila es un caso.
+        """
+        self.cube = None
+        self.parser = None
+        start = time.perf_counter()
+        if self.historicos_df is not None:
+            self.cube = AggregateCube.from_frame(self.historicos_df)
+        elif self.historicos_summary is not None:
+            self.cube = AggregateCube.from_counts(self.historicos_summary.counts)
+        if self.cube is None:
+            return
+        self.parser = QueryParser(self.cube.labels['tipo_delito'], self.cube.labels['anio'])
+        print(f"✅ Cubo de agregados {self.cube.values.shape}: {self.cube.nbytes / 2**20:.1f} MB "
+              f"({time.perf_counter() - start:.2f}s)")
+    
     def query_data(self, query: str) -> Dict[str, Any]:
         """
         Realiza consultas específicas sobre los datos
         Útil para responder preguntas puntuales del usuario
+        
+        Responde preguntas de conteo, top-N y tendencia con el cubo de agregados.
+        Devuelve {'intent', 'slots', 'answer', 'data', 'ms'}, o {}
+        si la pregunta es abierta y debe ir al LLM.
         """
         results = {}
+        start = time.perf_counter()
         
-        # Aquí puedes agregar lógica específica para consultas comunes
-        # Por ejemplo: "cuántos delitos en 2024", "municipio más peligroso", etc.
+        with self._state_lock:
+            if self.cube is not None:
+                slots = self.parser.parse(query)
+                handler = {
+                    'conteo': self._answer_count,
+                    'top': self._answer_top,
+                    'tendencia': self._answer_trend,
+                }.get(slots['intent'])
+                if handler is not None:
+                    answer, data = handler(self._cube_filters(slots), slots)
+                    results = {'intent': slots['intent'], 'slots': slots, 'answer': answer, 'data': data,
+                               'ms': (time.perf_counter() - start) * 1000}
         
+        with self._consultas_lock:
+            self.consultas['rapida' if results else 'llm'] += 1
         return results
     
+    def fast_path_stats(self) -> Dict[str, Any]:
+        """Preguntas respondidas con agregados y con LLM, y fracción de la vía rápida"""
+        with self._consultas_lock:
+            consultas = dict(self.consultas)
+        total = consultas['rapida'] + consultas['llm']
+        return {**consultas, 'total': total, 'fraccion_rapida': consultas['rapida'] / total if total else 0.0}
+    
+    @staticmethod
+    def _cube_filters(slots: Dict[str, Any]) -> Dict[str, Any]:
+        """Filtros del cubo a partir de los slots de la pregunta (lista vacía = sin filtro)"""
+        return {
+            'municipio': slots['municipios'] or None,
+            'zona': slots['zonas'] or None,
+            'tipo_delito': slots['delitos'] or None,
+            'anio': slots['anios'] or None,
+            'mes': slots['meses'] or None,
+        }
+    
+    @staticmethod
+    def _describe(slots: Dict[str, Any], lugar: bool = True) -> str:
+        """Texto del filtro: 'de hurto a personas en Girón en marzo de 2023'"""
+        parts = []
+        delitos = [d.lower() for d in slots['delitos']]
+        parts.append(f"de {', '.join(delitos)}" if delitos else "de delitos")
+        if lugar:
+            lugares = slots['municipios'] + ["el área metropolitana" if zona == 'METROPOLITANA' else f"la provincia de {zona}"
+                                             for zona in slots['zonas']]
+            parts.append(f"en {', '.join(lugares)}" if lugares else "en Santander")
+        meses = DataProcessor._enumerate(slots['meses'], lambda m: MESES[m - 1])
+        anios = DataProcessor._enumerate(slots['anios'], str)
+        if meses and anios:
+            parts.append(f"{'de' if ' a ' in meses else 'en'} {meses} de {anios}")
+        elif meses or anios:
+            parts.append(f"{'de' if ' a ' in (meses or anios) else 'en'} {meses or anios}")
+        return ' '.join(parts)
+    
+    @staticmethod
+    def _enumerate(values: List[int], name) -> str:
+        """'2019 a 2022' para un rango de más de dos valores; si no, la lista ('marzo, abril')"""
+        if len(values) > 2 and list(values) == list(range(values[0], values[0] + len(values))):
+            return f"{name(values[0])} a {name(values[-1])}"
+        return ', '.join(name(v) for v in values)
+    
+    def _fuera_del_cubo(self, filters: Dict[str, Any]) -> Dict[str, List]:
+        """Etiquetas pedidas que no están en los ejes del cubo (p. ej. un año sin datos)"""
+        faltan = {}
+        for dim, values in filters.items():
+            if values:
+                labels = set(self.cube.labels_of(dim))
+                ausentes = [v for v in values if v not in labels]
+                if ausentes:
+                    faltan[dim] = ausentes
+        return faltan
+    
+    def _answer_count(self, filters: Dict[str, Any], slots: Dict[str, Any]):
+        # El cubo ignora las etiquetas que no tiene: "hurtos en 2026" sumaría 0 casos
+        faltan = self._fuera_del_cubo(filters)
+        if faltan:
+            nombres = [MESES[v - 1] if dim == 'mes' else str(v).lower() if dim == 'tipo_delito' else str(v)
+                       for dim, values in faltan.items() for v in values]
+            answer = (f"No hay registros de {', '.join(nombres)} en los datos disponibles, "
+                      f"así que no se pueden contar los casos {self._describe(slots)}.")
+            if 'anio' in faltan or 'mes' in faltan:
+                anios = self.cube.labels['anio']
+                answer += f" Los históricos cubren de {anios[0]} a {anios[-1]}."
+            return answer, {}
+        total = self.cube.total(**filters)
+        return f"📊 Se registraron {total:,} casos {self._describe(slots)}.", {'total': total}
+    
+    def _answer_top(self, filters: Dict[str, Any], slots: Dict[str, Any]):
+        # Se ordena lo que nombra la pregunta: delitos, municipios, meses o años
+        by = slots['dimension']
+        top = self.cube.top(by, slots['n'], **filters)
+        if not top:
+            return f"No hay registros {self._describe(slots)}.", {}
+        
+        nombres = {'mes': lambda m: MESES[m - 1], 'anio': str}.get(by, str)
+        top = [(nombres(etiqueta), casos) for etiqueta, casos in top]
+        titulo = {'tipo_delito': "Delitos más frecuentes", 'municipio': "Municipios con más casos",
+                  'zona': "Provincias con más casos", 'mes': "Meses con más casos", 'anio': "Años con más casos"}[by]
+        lineas = [f"{i}. {nombre}: {casos:,}" for i, (nombre, casos) in enumerate(top, 1)]
+        detalle = self._describe(slots, lugar=by not in ('municipio', 'zona') or bool(slots['zonas']))
+        if by == 'tipo_delito':
+            detalle = detalle.replace("de delitos ", "", 1)
+        return f"📊 {titulo} {detalle}:\n" + "\n".join(lineas), dict(top)
+    
+    def _answer_trend(self, filters: Dict[str, Any], slots: Dict[str, Any]):
+        # Un año: serie mensual; varios o ninguno: serie anual (solo años con casos)
+        if len(slots['anios']) == 1:
+            serie = self.cube.series('mes', **filters)
+            etiquetas = [MESES[m - 1] for m in serie]
+            titulo = "Evolución mensual"
+        else:
+            serie = {anio: casos for anio, casos in self.cube.series('anio', **filters).items() if casos}
+            etiquetas = [str(a) for a in serie]
+            titulo = "Evolución anual"
+        
+        valores = list(serie.values())
+        if sum(valores) == 0:
+            return f"No hay registros {self._describe(slots)}.", {}
+        
+        lineas = [f"- {etiqueta}: {casos:,}" for etiqueta, casos in zip(etiquetas, valores)]
+        answer = f"📈 {titulo} de casos {self._describe(slots)}:\n" + "\n".join(lineas)
+        
+        primero, ultimo = valores[0], valores[-1]
+        if len(valores) > 1 and primero > 0:
+            answer += f"\n\nVariación entre {etiquetas[0]} y {etiquetas[-1]}: {(ultimo - primero) / primero:+.0%}"
+        return answer, dict(zip(etiquetas, valores))
+    
     def get_summary(self) -> str:
         """Retorna un resumen general de los datos"""
         if self.context_data is None:
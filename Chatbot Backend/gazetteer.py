@@ -0,0 +1,200 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+# Catálogo de provincias (ZONA) y los 87 municipios de Santander,
+# el mismo que usa el notebook de modelado (Notebook_ML)
+PROVINCIAS_MUNICIPIOS = {
+    'COMUNERA': [
+        'CHIMA', 'CONFINES', 'CONTRATACIÓN', 'EL GUACAMAYO', 'GALÁN', 'GÁMBITA',
+        'GUADALUPE', 'GUAPOTÁ', 'HATO', 'OIBA', 'PALMAR', 'PALMAS DEL SOCORRO',
+        'SANTA HELENA DEL OPÓN', 'SIMACOTA', 'SOCORRO', 'SUAITA',
+    ],
+    'GARCÍA-ROVIRA': [
+        'CAPITANEJO', 'CARCASÍ', 'CEPITÁ', 'CERRITO', 'CONCEPCIÓN', 'ENCISO', 'GUACA',
+        'MACARAVITA', 'MÁLAGA', 'MOLAGAVITA', 'SAN ANDRÉS', 'SAN JOSÉ DE MIRANDA', 'SAN MIGUEL',
+    ],
+    'GUANENTÁ': [
+        'ARATOCA', 'BARICHARA', 'CABRERA', 'COROMORO', 'CURITÍ', 'CHARALÁ', 'ENCINO',
+        'JORDÁN', 'MOGOTES', 'OCAMONTE', 'ONZAGA', 'PÁRAMO', 'PINCHOTE', 'SAN JOAQUÍN',
+        'SAN GIL', 'VALLE DE SAN JOSÉ', 'VILLANUEVA',
+    ],
+    'SOTO NORTE': [
+        'CALIFORNIA', 'CHARTA', 'MATANZA', 'SURATÁ', 'TONA', 'VETAS',
+    ],
+    'VÉLEZ': [
+        'AGUADA', 'ALBANIA', 'BARBOSA', 'BOLÍVAR', 'CIMITARRA', 'EL PEÑÓN', 'CHIPATÁ',
+        'FLORIÁN', 'GUAVATÁ', 'GÜEPSA', 'JESÚS MARÍA', 'LA BELLEZA', 'LA PAZ', 'LANDÁZURI',
+        'PUENTE NACIONAL', 'PUERTO PARRA', 'SAN BENITO', 'SUCRE', 'VÉLEZ',
+    ],
+    'YARIGUÍES': [
+        'BARRANCABERMEJA', 'BETULIA', 'EL CARMEN DE CHUCURÍ', 'PUERTO WILCHES',
+        'SABANA DE TORRES', 'SAN VICENTE DE CHUCURÍ',
+    ],
+    'METROPOLITANA': [
+        'BUCARAMANGA', 'EL PLAYÓN', 'FLORIDABLANCA', 'GIRÓN', 'LEBRIJA', 'LOS SANTOS',
+        'PIEDECUESTA', 'RIONEGRO', 'SANTA BÁRBARA', 'ZAPATOCA',
+    ],
+}
+
+MUNICIPIOS_SANTANDER = [m for municipios in PROVINCIAS_MUNICIPIOS.values() for m in municipios]
+
+ZONA_POR_MUNICIPIO = {
+    municipio: zona for zona, municipios in PROVINCIAS_MUNICIPIOS.items() for municipio in municipios
+}
+
+# Nombres alternativos usados por la Policía Nacional y por los ciudadanos
+ALIAS_MUNICIPIOS = {
+    'barranca': 'BARRANCABERMEJA',
+    'bga': 'BUCARAMANGA',
+    'san juan de giron': 'GIRÓN',
+    'carmen de chucuri': 'EL CARMEN DE CHUCURÍ',
+    'santa helena': 'SANTA HELENA DEL OPÓN',
+    'valle de san jose': 'VALLE DE SAN JOSÉ',
+}
+
+# Nombres que también son palabras comunes: solo cuentan tras "en", "de" o "municipio"
+NOMBRES_AMBIGUOS = {'la paz', 'hato', 'palmar', 'cerrito', 'concepcion', 'matanza', 'encino', 'sucre', 'bolivar'}
+
+# Palabras clave de intención (sobre texto ya normalizado)
+_PALABRAS_PREDICCION = ('predic', 'pronostic', 'riesgo', 'futur', 'proxim', 'esperar', 'estimad')
+_PALABRAS_HISTORICO = ('historic', 'hubo', 'ocurri', 'registrad', 'pasad', 'evolucion', 'tendencia')
+
+# Nombres propios tras "en", "municipio de", ... (con mayúscula en el texto original):
+# "en Bogotá", "en San Vicente de Chucurí"
+_PATRON_LUGARES = re.compile(
+    r'(?<![\w])(?i:en|municipio de|ciudad de|provincia de|departamento de)\s+'
+    r'([A-ZÁÉÍÓÚÑÜ][\w-]*(?:\s+(?:(?:de|del|la|las|los|el)\s+)?[A-ZÁÉÍÓÚÑÜ][\w-]*)*)'
+)
+
+# Lugares que no son municipios pero abarcan todos los datos
+_LUGARES_CONOCIDOS = {'santander'}
+
+_PATRON_ANIOS = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+
+MESES = ('enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+         'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre')
+
+_PATRON_MESES = re.compile(r'(?<![\w])(' + '|'.join(MESES + ('setiembre',)) + r')(?![\w])')
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes y espacios colapsados"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.split())
+
+
+def _build_variants() -> Dict[str, str]:
+    """Variante normalizada -> nombre oficial (con y sin tildes, y alias)"""
+    variants = {normalize_text(m): m for m in MUNICIPIOS_SANTANDER}
+    variants.update(ALIAS_MUNICIPIOS)
+    return variants
+
+
+_VARIANTES = _build_variants()
+
+# Una sola expresión con las variantes más largas primero ("san gil" antes que "gil")
+_PATRON_MUNICIPIOS = re.compile(
+    r'(?<![\w])(' + '|'.join(re.escape(v) for v in sorted(_VARIANTES, key=len, reverse=True)) + r')(?![\w])'
+)
+
+
+# Provincias (ZONA): Vélez es también municipio y "metropolitana" un adjetivo, así que
+# solo cuentan tras "provincia (de)" o como "área metropolitana"; el resto, también sueltas
+_VARIANTES_PROVINCIAS = {normalize_text(z).replace('-', ' '): z for z in PROVINCIAS_MUNICIPIOS}
+_PROVINCIAS_AMBIGUAS = {'velez', 'metropolitana'}
+
+
+def _patron_provincias(variantes) -> str:
+    return '|'.join(re.escape(v).replace(r'\ ', '[- ]') for v in sorted(variantes, key=len, reverse=True))
+
+
+_PATRON_PROVINCIAS = re.compile(
+    r'(?<![\w])(?:provincias? (?:de |del )?(?:la )?(' + _patron_provincias(_VARIANTES_PROVINCIAS) + r')'
+    r'|(area metropolitana)(?: de (?:bucaramanga|bga))?'
+    r'|(' + _patron_provincias(set(_VARIANTES_PROVINCIAS) - _PROVINCIAS_AMBIGUAS) + r'))(?![\w])'
+)
+
+
+def canonical_municipio(name: str) -> Optional[str]:
+    """Nombre oficial para un municipio tal como viene en los datos (p. ej. 'BUCARAMANGA (CT)')"""
+    key = normalize_text(str(name).replace('(CT)', '').replace('(ct)', ''))
+    return _VARIANTES.get(key)
+
+
+def find_municipios(text: str) -> List[str]:
+    """
+    Municipios de Santander mencionados en el texto, sin repetir y en orden de aparición
+    (sin contar los nombres de provincia: "provincia de Vélez", "área metropolitana de Bucaramanga")
+    """
+    normalized = _PATRON_PROVINCIAS.sub(lambda m: ' ' * len(m.group(0)), normalize_text(text))
+    found = []
+    for match in _PATRON_MUNICIPIOS.finditer(normalized):
+        variant = match.group(1)
+        if variant in NOMBRES_AMBIGUOS:
+            before = normalized[:match.start()].split()
+            if not before or before[-1] not in ('en', 'de', 'municipio'):
+                continue
+        municipio = _VARIANTES[variant]
+        if municipio not in found:
+            found.append(municipio)
+    return found
+
+
+def find_provincias(text: str) -> List[str]:
+    """Provincias (ZONA de PROVINCIAS_MUNICIPIOS) mencionadas en el texto, sin repetir y en orden de aparición"""
+    found = []
+    for match in _PATRON_PROVINCIAS.finditer(normalize_text(text)):
+        nombre = match.group(1) or match.group(3)
+        provincia = 'METROPOLITANA' if match.group(2) else _VARIANTES_PROVINCIAS[nombre.replace('-', ' ')]
+        if provincia not in found:
+            found.append(provincia)
+    return found
+
+
+def find_lugares_desconocidos(text: str) -> List[str]:
+    """
+    Nombres de lugar de la pregunta ("en Bogotá") que no son municipios ni
+    provincias de Santander, ni el departamento, ni un mes. Solo se miran nombres con mayúscula.
+    """
+    found = []
+    for match in _PATRON_LUGARES.finditer(text):
+        lugar = match.group(1)
+        if (find_municipios(f"en {lugar}") or find_provincias(f"provincia de {lugar}") or find_provincias(lugar)
+                or find_months(lugar) or normalize_text(lugar) in _LUGARES_CONOCIDOS):
+            continue
+        if lugar not in found:
+            found.append(lugar)
+    return found
+
+
+def detect_tipo(text: str) -> Optional[str]:
+    """'prediccion' o 'historico' según las palabras clave; None si no es claro"""
+    normalized = normalize_text(text)
+    prediccion = any(p in normalized for p in _PALABRAS_PREDICCION)
+    historico = any(p in normalized for p in _PALABRAS_HISTORICO)
+    if prediccion == historico:
+        return None
+    return 'prediccion' if prediccion else 'historico'
+
+
+def find_years(text: str) -> List[int]:
+    """Años (19xx/20xx) mencionados en el texto, sin repetir y en orden de aparición"""
+    found = []
+    for match in _PATRON_ANIOS.finditer(text):
+        year = int(match.group(1))
+        if year not in found:
+            found.append(year)
+    return found
+
+
+def find_months(text: str) -> List[int]:
+    """Meses (1-12) mencionados en el texto, sin repetir y en orden de aparición"""
+    found = []
+    for match in _PATRON_MESES.finditer(normalize_text(text)):
+        name = match.group(1)
+        month = 9 if name == 'setiembre' else MESES.index(name) + 1
+        if month not in found:
+            found.append(month)
+    return found
@@ -0,0 +1,294 @@
+import hashlib
+import os
+import pickle
+import time
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import FECHA_COLUMNS, atomic_write, iter_typed_csv, looks_like_fecha, source_key
+
+# Filas por bloque al leer en streaming (DATA_STREAM_CHUNKSIZE)
+DEFAULT_CHUNKSIZE = 100_000
+
+# Claves de los conteos de los históricos
+COUNT_KEYS = ['municipio', 'tipo_delito', 'anio', 'mes']
+
+# Conteos parciales que se acumulan antes de compactarlos en uno
+COMPACT_EVERY = 8
+
+# Valores distintos que el perfil guarda por columna de texto; por encima se
+# descartan los menos frecuentes y el top queda aproximado
+PROFILE_MAX_DISTINCT = 50_000
+
+# Versión del formato de StreamSummary (invalida los resúmenes guardados)
+SUMMARY_VERSION = 1
+
+
+def _json_number(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _json_fecha(value) -> Optional[str]:
+    if pd.isna(value):
+        return None
+    return f"{value:%Y-%m-%d}" if value == value.normalize() else str(value)
+
+
+class ProfileAccumulator:
+    """
+    Perfil de columnas que se actualiza por bloques (el formato de
+    DataProcessor._get_basic_stats):
+    - numéricas: mínimo, máximo, total, válidos y nulos, reducidos a la vez
+      sobre una sola matriz por bloque
+    - categóricas: conteo por valor (bincount sobre los códigos), distintos y top 5
+    - fechas: datetime64 o texto con forma de fecha (FECHA HECHO), inicio, fin y nulos
+    El tipo de cada columna se decide con el primer bloque.
+    """
+    
+    def __init__(self, max_distinct: int = PROFILE_MAX_DISTINCT):
+        self.max_distinct = max_distinct
+        self.rows = 0
+        self.kinds = None
+        self._numericas = {}
+        self._fechas = {}
+        self._categoricas = {}
+    
+    def update(self, df: pd.DataFrame) -> 'ProfileAccumulator':
+        if self.kinds is None:
+            self.kinds = {col: self._kind(df[col]) for col in df.columns}
+        self.rows += len(df)
+        
+        numeric_cols = [col for col, kind in self.kinds.items() if kind == 'numerica']
+        if numeric_cols:
+            block = df[numeric_cols]
+            if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in block.dtypes):
+                block = block.apply(pd.to_numeric, errors='coerce')
+            values = block.to_numpy(dtype='float64', na_value=np.nan)
+            with warnings.catch_warnings():
+                # Columnas sin ningún valor en el bloque: nanmin/nanmax avisan y devuelven NaN
+                warnings.simplefilter("ignore", RuntimeWarning)
+                minimos, maximos = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+            totales, conteos = np.nansum(values, axis=0), (~np.isnan(values)).sum(axis=0)
+            for i, col in enumerate(numeric_cols):
+                acc = self._numericas.setdefault(col, [np.nan, np.nan, 0.0, 0])
+                acc[0], acc[1] = np.fmin(acc[0], minimos[i]), np.fmax(acc[1], maximos[i])
+                acc[2] += totales[i]
+                acc[3] += int(conteos[i])
+        
+        for col, kind in self.kinds.items():
+            series = df[col]
+            if kind == 'fecha':
+                if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+                    series = pd.to_datetime(series, format='mixed', dayfirst=True, errors='coerce')
+                acc = self._fechas.setdefault(col, [pd.NaT, pd.NaT, 0])
+                inicio, fin = series.min(), series.max()
+                acc[0] = inicio if pd.isna(acc[0]) or (not pd.isna(inicio) and inicio < acc[0]) else acc[0]
+                acc[1] = fin if pd.isna(acc[1]) or (not pd.isna(fin) and fin > acc[1]) else acc[1]
+                acc[2] += int(series.isna().sum())
+            elif kind == 'categorica':
+                self._update_categorica(col, series)
+        return self
+    
+    def _update_categorica(self, col, series: pd.Series):
+        acc = self._categoricas.setdefault(col, {'conteos': {}, 'nulos': 0, 'aproximado': False})
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            conteos = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+            presentes = np.flatnonzero(conteos)
+            items = zip(series.cat.categories[presentes], conteos[presentes].tolist())
+            acc['nulos'] += int((codes < 0).sum())
+        else:
+            conteos = series.value_counts(dropna=True)
+            items = zip(conteos.index, conteos.tolist())
+            acc['nulos'] += int(series.isna().sum())
+        
+        total = acc['conteos']
+        for value, count in items:
+            total[value] = total.get(value, 0) + count
+        if len(total) > self.max_distinct:
+            # Columnas casi únicas (IDs, texto libre): se conservan los más frecuentes
+            mantener = sorted(total.items(), key=lambda item: -item[1])[:self.max_distinct // 2]
+            acc['conteos'], acc['aproximado'] = dict(mantener), True
+    
+    @staticmethod
+    def _kind(series: pd.Series) -> str:
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            return 'numerica'
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return 'fecha'
+        if not isinstance(series.dtype, pd.CategoricalDtype) and looks_like_fecha(series):
+            return 'fecha'
+        return 'categorica'
+    
+    def result(self) -> Dict[str, Any]:
+        """Perfil JSON: {'numericas', 'categoricas', 'fechas'} con una entrada por columna"""
+        stats = {"numericas": {}, "categoricas": {}, "fechas": {}}
+        for col, (minimo, maximo, total, validos) in self._numericas.items():
+            stats["numericas"][str(col)] = {
+                "min": _json_number(minimo),
+                "max": _json_number(maximo),
+                "promedio": float(total / validos) if validos else None,
+                "total": float(total),
+                "nulos": int(self.rows - validos),
+            }
+        
+        for col, kind in (self.kinds or {}).items():
+            if kind == 'fecha':
+                inicio, fin, nulos = self._fechas[col]
+                stats["fechas"][str(col)] = {"inicio": _json_fecha(inicio), "fin": _json_fecha(fin), "nulos": nulos}
+            elif kind == 'categorica':
+                acc = self._categoricas[col]
+                # sorted es estable: los empates quedan en orden de categoría / aparición
+                top = sorted(acc['conteos'].items(), key=lambda item: -item[1])[:5]
+                entry = {"distintos": len(acc['conteos']), "nulos": acc['nulos'],
+                         "top": {str(k): int(v) for k, v in top}}
+                if acc['aproximado']:
+                    entry["aproximado"] = True
+                stats["categoricas"][str(col)] = entry
+        return stats
+
+
+class CountsAccumulator:
+    """
+    Filas y casos (suma de CANTIDAD, o 1 por fila) por municipio, tipo de delito,
+    año y mes, acumulados por bloques. Es todo lo que necesitan el cubo de
+    agregados y los resúmenes del RAG; las filas con delito o fecha vacíos se
+    conservan (cuentan en los totales por municipio).
+    """
+    
+    def __init__(self, compact_every: int = COMPACT_EVERY):
+        self.compact_every = compact_every
+        self.rows = 0
+        self._parciales = []
+    
+    def update(self, df: pd.DataFrame, fechas: Optional[pd.Series] = None) -> 'CountsAccumulator':
+        """Añade un bloque; `fechas` evita volver a parsear si ya están convertidas"""
+        self.rows += len(df)
+        columns = {str(col).strip().lower(): col for col in df.columns}
+        municipio_col = columns.get('municipio')
+        if municipio_col is None:
+            return self
+        delito_col = columns.get('tipo_delito') or columns.get('tipo delito')
+        cantidad_col = columns.get('cantidad')
+        if fechas is None:
+            fecha_col = next((columns[c] for c in FECHA_COLUMNS if c in columns), None)
+            fechas = df[fecha_col] if fecha_col is not None else pd.Series(pd.NaT, index=df.index)
+            if not pd.api.types.is_datetime64_any_dtype(fechas.dtype):
+                fechas = pd.to_datetime(fechas, format='mixed', dayfirst=True, errors='coerce')
+        
+        claves = pd.DataFrame({
+            'municipio': df[municipio_col],
+            'tipo_delito': df[delito_col] if delito_col is not None else None,
+            'anio': fechas.dt.year.to_numpy(),
+            'mes': fechas.dt.month.to_numpy(),
+            # int64: CANTIDAD llega como int8 desde data_loader y las sumas no deben desbordar
+            'casos': (df[cantidad_col].fillna(1).to_numpy(dtype='int64') if cantidad_col is not None
+                      else np.ones(len(df), dtype='int64')),
+        }).dropna(subset=['municipio'])
+        self._parciales.append(self._group(claves.assign(filas=1)))
+        if len(self._parciales) >= self.compact_every:
+            self._parciales = [self._group(pd.concat(self._parciales, ignore_index=True))]
+        return self
+    
+    @staticmethod
+    def _group(claves: pd.DataFrame) -> pd.DataFrame:
+        return (claves.groupby(COUNT_KEYS, sort=False, observed=True, dropna=False)[['filas', 'casos']]
+                .sum().reset_index())
+    
+    def result(self) -> pd.DataFrame:
+        """Conteos ordenados por municipio, delito, año y mes (columnas COUNT_KEYS + filas, casos)"""
+        if not self._parciales:
+            return pd.DataFrame({**{key: [] for key in COUNT_KEYS}, 'filas': [], 'casos': []})
+        counts = self._group(pd.concat(self._parciales, ignore_index=True))
+        for key in ('municipio', 'tipo_delito'):
+            counts[key] = counts[key].astype(object).where(counts[key].notna(), None)
+            counts[key] = counts[key].astype('category')
+        counts[['filas', 'casos']] = counts[['filas', 'casos']].astype('int64')
+        return (counts.sort_values(COUNT_KEYS, kind='stable', na_position='last')
+                .reset_index(drop=True))
+
+
+class StreamSummary:
+    """
+    Lo que queda de un CSV leído por bloques: número de filas, columnas,
+    conteos (CountsAccumulator) y perfil (ProfileAccumulator). Sustituye al
+    DataFrame completo en DataProcessor y en el RAG.
+    """
+    
+    def __init__(self, path: str, rows: int, columns: List[str], counts: pd.DataFrame,
+                 profile: Dict[str, Any], blocks: int, seconds: float):
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+        self.counts = counts
+        self.profile = profile
+        self.blocks = blocks
+        self.seconds = seconds
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, path: str = "") -> 'StreamSummary':
+        """Resumen de una tabla ya en memoria (el mismo que daría leerla por bloques)"""
+        start = time.perf_counter()
+        counts = CountsAccumulator().update(df).result()
+        profile = ProfileAccumulator().update(df).result()
+        return cls(path, len(df), [str(col) for col in df.columns], counts, profile, 1,
+                   time.perf_counter() - start)
+
+
+def ingest_csv(path: str, chunksize: int = DEFAULT_CHUNKSIZE,
+               cache_dir: Optional[str] = None) -> Optional[StreamSummary]:
+    """
+    Lee `path` por bloques de `chunksize` filas actualizando conteos y perfil,
+    sin tener nunca la tabla completa en memoria. El resumen se guarda en
+    `cache_dir` con la clave del CSV (ruta, tamaño, fecha de modificación), así
+    que al reiniciar no se vuelve a leer. None si el CSV no existe.
+    """
+    if not os.path.exists(path):
+        return None
+    
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha1(f"s{SUMMARY_VERSION}|{source_key(path)}".encode("utf-8")).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"resumen_{name}.{digest}.pkl")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as f:
+                    summary = pickle.load(f)
+                print(f"✅ {os.path.basename(path)}: resumen de {summary.rows:,} registros desde caché")
+                return summary
+            except Exception as e:
+                print(f"⚠️ Resumen de {os.path.basename(path)} inválido, se relee el CSV: {e}")
+    
+    start = time.perf_counter()
+    counts, profile = CountsAccumulator(), ProfileAccumulator()
+    columns, blocks = None, 0
+    for chunk in iter_typed_csv(path, chunksize):
+        if columns is None:
+            columns = [str(col) for col in chunk.columns]
+        counts.update(chunk)
+        profile.update(chunk)
+        blocks += 1
+    if columns is None:
+        columns = [str(col) for col in pd.read_csv(path, nrows=0).columns]
+    
+    summary = StreamSummary(path, counts.rows, columns, counts.result(), profile.result(), blocks,
+                            time.perf_counter() - start)
+    print(f"✅ {os.path.basename(path)}: {summary.rows:,} registros en {blocks} bloques de "
+          f"{chunksize:,} ({summary.seconds:.2f}s)")
+    
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            for old in os.listdir(cache_dir):
+                if old.startswith(f"resumen_{name}.") and old.endswith(".pkl"):
+                    os.remove(os.path.join(cache_dir, old))
+            with atomic_write(cache_path) as tmp_path, open(tmp_path, "wb") as f:
+                pickle.dump(summary, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el resumen de {os.path.basename(path)}: {e}")
+    return summary
@@ -0,0 +1,287 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from .metrics import metrics
+
+
+class AdmissionError(Exception):
+    """La petición no se admitió: cola llena o no hay turno antes del deadline"""
+
+
+class DeadlineExceeded(Exception):
+    """La petición no terminó antes de su deadline (incluidos los reintentos)"""
+
+
+class TokenBucket:
+    """
+    Control de admisión: `rate` peticiones por segundo con ráfagas de hasta `burst`.
+    Las peticiones sin token esperan en orden de llegada (asyncio.Lock es FIFO);
+    si ya hay `max_queue` esperando, se rechazan de inmediato.
+    Se usa siempre desde el event loop de LLMClient (sin hilos concurrentes).
+    """
+    
+    def __init__(self, rate: float, burst: int, max_queue: int = 64):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.tokens = float(burst)
+        self.rejected = 0
+        self._updated = time.monotonic()
+        self._waiting = 0
+        self._turn = asyncio.Lock()
+    
+    @property
+    def queue_depth(self) -> int:
+        """Peticiones esperando turno"""
+        return self._waiting
+    
+    async def acquire(self, deadline: float):
+        """Toma un token o lanza AdmissionError si la cola está llena o vence el deadline"""
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            metrics.inc('chatbot_events_total', event='admission_rejected', reason='cola_llena')
+            raise AdmissionError(f"Cola de admisión llena ({self._waiting} en espera)")
+        
+        self._waiting += 1
+        try:
+            async with self._turn:
+                while True:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                    if time.monotonic() + wait > deadline:
+                        self.rejected += 1
+                        metrics.inc('chatbot_events_total', event='admission_rejected', reason='deadline')
+                        raise AdmissionError("Sin turno antes del deadline")
+                    await asyncio.sleep(wait)
+        finally:
+            self._waiting -= 1
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class LLMClient:
+    """
+    Cliente asíncrono de chat completions de Groq compartido por todas las sesiones.
+    
+    - Un event loop propio en un hilo de fondo y un único pool HTTP (httpx) con
+      `max_connections` conexiones
+    - Deadline por petición (`timeout`) que cubre la espera de admisión, los
+      intentos y las pausas entre ellos
+    - Reintentos en 429/5xx y errores de conexión con backoff exponencial y
+      jitter completo (respeta Retry-After si viene)
+    - Admisión con TokenBucket; queue_depth indica cuántas peticiones esperan
+    
+    complete() y stream() son las versiones síncronas para Streamlit.
+    `base_url` (o GROQ_BASE_URL) permite apuntar a un servidor local de pruebas
+    (ver benchmarks/fake_groq.py).
+    """
+    
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    
+    def __init__(self, api_key: str, model: str, base_url: Optional[str] = None,
+                 max_connections: int = 20, timeout: float = 30.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 rate: float = 5.0, burst: int = 10, max_queue: int = 64):
+        from groq import AsyncGroq
+        import httpx
+        
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.failures = 0
+        self.in_flight = 0
+        
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True).start()
+        
+        async def setup():
+            # El pool y el bucket deben crearse dentro del loop que los usa
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            )
+            client = AsyncGroq(api_key=api_key, base_url=base_url or os.getenv("GROQ_BASE_URL"),
+                               max_retries=0, http_client=http_client)
+            return client, TokenBucket(rate, burst, max_queue)
+        
+        self._client, self.bucket = self._run(setup())
+    
+    @property
+    def queue_depth(self) -> int:
+        """Peticiones esperando admisión"""
+        return self.bucket.queue_depth
+    
+    def stats(self) -> Dict:
+        """Contadores del cliente: cola, peticiones en curso, reintentos y fallos"""
+        return {
+            'queue_depth': self.bucket.queue_depth,
+            'in_flight': self.in_flight,
+            'retries': self.retries,
+            'failures': self.failures,
+            'rejected': self.bucket.rejected,
+        }
+    
+    # ---------- API asíncrona ----------
+    
+    async def acomplete(self, messages: List[Dict], max_tokens: int = 300,
+                        timeout: Optional[float] = None, **params) -> str:
+        """Respuesta completa; reintenta errores transitorios hasta el deadline"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        await self.bucket.acquire(deadline)
+        
+        self.in_flight += 1
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(
+                            model=self.model, messages=messages, max_tokens=max_tokens, **params),
+                        self._remaining(deadline))
+                    return response.choices[0].message.content if response.choices else ""
+                except Exception as e:
+                    await self._backoff(e, attempt, deadline)
+        finally:
+            self.in_flight -= 1
+    
+    async def astream(self, messages: List[Dict], max_tokens: int = 300,
+                      timeout: Optional[float] = None, **params) -> AsyncIterator[str]:
+        """
+        Fragmentos de texto del stream. Solo se reintenta si falla antes del
+        primer fragmento: después ya se mostró parte de la respuesta.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        await self.bucket.acquire(deadline)
+        
+        self.in_flight += 1
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                stream = None
+                try:
+                    stream = await asyncio.wait_for(
+                        self._client.chat.completions.create(
+                            model=self.model, messages=messages, max_tokens=max_tokens, stream=True, **params),
+                        self._remaining(deadline))
+                    chunks = stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), self._remaining(deadline))
+                        except StopAsyncIteration:
+                            return
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            started = True
+                            yield delta
+                except (asyncio.CancelledError, GeneratorExit):
+                    # stream() canceló la tarea o el consumidor dejó de leer: cerrar ya la
+                    # respuesta libera la conexión del pool y el hueco de in_flight
+                    if stream is not None:
+                        await stream.close()
+                    raise
+                except Exception as e:
+                    if stream is not None:
+                        # Liberar la conexión del pool aunque el stream quede a medias
+                        await stream.close()
+                    if started:
+                        self.failures += 1
+                        if isinstance(e, asyncio.TimeoutError):
+                            raise DeadlineExceeded("Stream cortado por el deadline") from e
+                        raise
+                    await self._backoff(e, attempt, deadline)
+        finally:
+            self.in_flight -= 1
+    
+    async def _backoff(self, error: Exception, attempt: int, deadline: float):
+        """Espera antes del siguiente intento, o relanza si el error no es transitorio"""
+        if not self._retryable(error) or attempt >= self.max_retries:
+            self.failures += 1
+            if isinstance(error, asyncio.TimeoutError):
+                raise DeadlineExceeded(f"Sin respuesta antes del deadline ({attempt + 1} intento(s))") from error
+            raise error
+        
+        # Jitter completo: uniforme en [0, min(max, base * 2^intento)]
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        
+        if time.monotonic() + delay >= deadline:
+            self.failures += 1
+            raise DeadlineExceeded(f"Sin tiempo para reintentar tras: {error}") from error
+        
+        self.retries += 1
+        metrics.inc('chatbot_events_total', event='llm_retry', error=type(error).__name__)
+        print(f"🔁 Reintento {attempt + 1}/{self.max_retries} en {delay:.2f}s: {error}")
+        await asyncio.sleep(delay)
+    
+    def _retryable(self, error: Exception) -> bool:
+        import groq
+        if isinstance(error, (asyncio.TimeoutError, groq.APIConnectionError)):
+            return True
+        return isinstance(error, groq.APIStatusError) and error.status_code in self.RETRY_STATUS
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        try:
+            return float(response.headers.get('retry-after'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        return remaining
+    
+    # ---------- API síncrona (Streamlit) ----------
+    
+    def complete(self, messages: List[Dict], max_tokens: int = 300, **params) -> str:
+        """Versión bloqueante de acomplete"""
+        return self._run(self.acomplete(messages, max_tokens, **params))
+    
+    def stream(self, messages: List[Dict], max_tokens: int = 300, **params) -> Iterator[str]:
+        """Versión bloqueante de astream: itera los fragmentos desde el hilo que llama"""
+        items = queue.Queue()
+        done = object()
+        
+        async def pump():
+            try:
+                async for delta in self.astream(messages, max_tokens, **params):
+                    items.put(delta)
+            except BaseException as e:
+                items.put(e)
+            finally:
+                items.put(done)
+        
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Si el que llama deja de iterar (p. ej. la sesión de Streamlit se corta),
+            # se cancela el stream en el loop en vez de dejarlo leyendo hasta el final
+            future.cancel()
+    
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
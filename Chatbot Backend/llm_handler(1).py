@@ -1,26 +1,100 @@
-from groq import Groq
 import os
-from typing import List, Dict
+import threading
+import time
+from typing import List, Dict, Optional, Iterator, Tuple
 from .rag_processor import RAGProcessor
+from .data_processor import DataProcessor
+from .gazetteer import normalize_text, find_municipios, find_provincias
+from .answer_cache import AnswerCache
+from .llm_client import LLMClient, AdmissionError
+from .prompt_builder import PromptBuilder, ConversationMemory
+from .metrics import metrics, start_exporters
+
+SENTENCE_ENDINGS = ('.', '!', '?')
+
+BUSY_MESSAGE = ("⏳ El asistente está atendiendo muchas consultas en este momento. "
+                "Intenta de nuevo en unos segundos.")
+
+
+class ResponseCleaner:
+    """
+    Aplica _clean_response de forma incremental sobre un stream de texto.
+    Solo se libera el texto hasta el último punto: _clean_response recorta como
+    mucho hasta ahí (respuesta cortada por max_tokens), así que todo lo emitido
+    es siempre prefijo de la respuesta limpia.
+    """
+    
+    def __init__(self, clean):
+        self.clean = clean
+        self.text = ""
+        self.response = ""
+        self._sent = 0
+    
+    def feed(self, delta: str) -> str:
+        """Añade un fragmento y devuelve el texto nuevo que ya se puede mostrar"""
+        self.text += delta
+        stripped = self.text.lstrip()
+        end = stripped.rfind('.') + 1
+        if end <= self._sent:
+            return ""
+        released, self._sent = stripped[self._sent:end], end
+        return released
+    
+    def finish(self) -> str:
+        """Cierra el stream: devuelve lo que falta de la respuesta limpia"""
+        self.response = self.clean(self.text)
+        return self.response[self._sent:]
+
 
 class ChatbotHandler:
     """
     Maneja las interacciones con Groq + RAG (100% gratis)
     """
     
-    def __init__(self):
-        # Inicializar RAG
+    def __init__(self, background_warmup: bool = True):
+        # Inicializar RAG: modelo e índice se cargan en segundo plano para no
+        # bloquear el primer render de Streamlit; la primera consulta espera solo si hace falta
         self.rag = RAGProcessor()
-        self.rag.initialize()
-        self.data_loaded = self.rag.load_and_process_data()
+        # Agregados para responder preguntas numéricas sin LLM (vía rápida)
+        self.data = DataProcessor(self.rag.data_dir)
+        self.data_loaded = False
+        # Respuestas reutilizables para preguntas casi iguales (mismos datos y alcance)
+        self.answer_cache = AnswerCache(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_size=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "900")),
+        )
+        # Prompt con presupuesto fijo de tokens: datos del RAG, resumen y últimos turnos
+        self.prompt_builder = PromptBuilder(budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "1500")))
+        self.history_turns = int(os.getenv("PROMPT_HISTORY_TURNS", "4"))
+        self._ready = threading.Event()
+        
+        if background_warmup:
+            threading.Thread(target=self._warm_up, name="rag-warmup", daemon=True).start()
+        else:
+            self._warm_up()
         
         # Configurar Groq
         api_key = os.getenv("GROQ_API_KEY")
         
         if api_key:
-            self.client = Groq(api_key=api_key)
+            # Cliente asíncrono con pool de conexiones, deadline, reintentos
+            # y control de admisión (ver llm_client.LLMClient)
             self.model = "llama-3.3-70b-versatile"
+            self.client = LLMClient(
+                api_key, self.model,
+                max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", "20")),
+                timeout=float(os.getenv("GROQ_TIMEOUT", "30")),
+                max_retries=int(os.getenv("GROQ_MAX_RETRIES", "3")),
+                rate=float(os.getenv("GROQ_RATE_LIMIT", "5")),
+                burst=int(os.getenv("GROQ_BURST", "10")),
+                max_queue=int(os.getenv("GROQ_MAX_QUEUE", "64")),
+            )
             self.api_available = True
+            metrics.gauge('chatbot_llm_queue_depth', lambda: self.client.queue_depth,
+                          "Consultas esperando turno para Groq")
+            metrics.gauge('chatbot_llm_in_flight', lambda: self.client.in_flight,
+                          "Peticiones a Groq en curso")
         else:
             self.api_available = False
             print("⚠️ GROQ_API_KEY no configurada")
@@ -28,6 +102,49 @@ class ChatbotHandler:
         # Sistema de prompts
         self.system_prompt = self._build_system_prompt()
         
+        # Exportación de métricas (METRICS_PORT / METRICS_FILE), una vez por proceso
+        start_exporters()
+        
+    def _warm_up(self):
+        """Carga el modelo de embeddings y el índice RAG"""
+        try:
+            self.rag.initialize()
+            self.data_loaded = self.reload_data()
+        except Exception as e:
+            print(f"❌ Error inicializando RAG: {e}")
+            self.data_loaded = False
+        finally:
+            self._ready.set()
+            print(self.rag.startup_report())
+    
+    def reload_data(self) -> bool:
+        """
+        Carga (o recarga, p. ej. tras la actualización semanal de datos) los CSV:
+        el RAG actualiza su índice y la vía rápida reconstruye contexto, cubo y
+        parser con las mismas tablas. Los dos se instalan juntos bajo el lock de
+        búsqueda del RAG, así que ninguna consulta ve el índice nuevo con el cubo
+        viejo; si la carga falla, se conservan ambos.
+        """
+        def stage(rag: RAGProcessor):
+            # Reutiliza los DataFrames (o el resumen por bloques) que acaba de leer el RAG
+            data, _ = self.data.stage_data(rag.df_historicos, rag.df_predicciones, rag.historicos_summary)
+            return lambda: self.data.swap_state(data)
+        
+        return self.rag.load_and_process_data(stage_with=stage)
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que termine la carga del RAG; False si vence el timeout"""
+        return self._ready.wait(timeout)
+    
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+    
+    @property
+    def queue_depth(self) -> int:
+        """Consultas esperando turno para Groq"""
+        return self.client.queue_depth if self.api_available else 0
+    
     def _build_system_prompt(self) -> str:
         """Construye el prompt del sistema"""
         
@@ -51,71 +168,275 @@ Responde de manera útil, directa y basada en datos.
         
         return base_prompt
     
-    def get_response(self, user_message: str, max_tokens: int = 300) -> str:
+    def get_response(self, user_message: str, max_tokens: int = 300,
+                     history: Optional[List[Dict]] = None,
+                     memory: Optional[ConversationMemory] = None) -> str:
         """
-        Genera respuesta usando RAG + Groq
+        Genera respuesta usando RAG + Groq.
+        `history` son los mensajes anteriores de la sesión (sin la pregunta actual)
+        y `memory` su ConversationMemory, para mantener el resumen entre llamadas.
         """
+        with metrics.span('request'):
+            return self._get_response(user_message, max_tokens, history, memory)
+    
+    def _get_response(self, user_message: str, max_tokens: int,
+                      history: Optional[List[Dict]], memory: Optional[ConversationMemory]) -> str:
+        # ⚡ Vía rápida: conteos, top-N y tendencias salen de los agregados
+        fast = self._fast_answer(user_message, history)
+        if fast is not None:
+            return fast
         
         if not self.api_available:
-            return self._fallback_response(user_message)
+            return self._fallback_response(user_message, 'sin_api')
         
         try:
-            # 🔍 PASO 1: Buscar contexto relevante con RAG
-            context = ""
-            if self.data_loaded:
-                context = self.rag.get_context_for_query(user_message)
+            # ⚡ PASO 0: Respuesta en caché para una pregunta equivalente
+            self.wait_until_ready()
+            cached, cache_args = self._cached_answer(user_message, max_tokens, history)
+            if cached is not None:
+                return cached
             
-            # 📝 PASO 2: Construir mensajes con contexto
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ]
+            # 🔍 PASO 1 y 📝 PASO 2: contexto RAG y mensajes
+            messages = self._build_messages(user_message, history, memory, cache_args)
             
-            # Agregar contexto si existe
-            if context and "No se encontraron" not in context:
-                messages.append({
-                    "role": "system", 
-                    "content": f"CONTEXTO DE DATOS:\n{context}"
-                })
+            # 🤖 PASO 3: Generar respuesta con Groq
+            with metrics.span('llm'):
+                content = self.client.complete(
+                    messages,
+                    max_tokens=max_tokens,
+                    temperature=0.7,
+                    top_p=0.95
+                )
             
-            # Agregar pregunta del usuario
-            messages.append({
-                "role": "user", 
-                "content": user_message
-            })
+            # Obtener texto de respuesta
+            if content:
+                with metrics.span('clean'):
+                    cleaned_response = self._clean_response(content)
+                if cache_args is not None:
+                    embedding, fingerprint, scope = cache_args
+                    self.answer_cache.put(embedding, cleaned_response, fingerprint, scope)
+                metrics.inc('chatbot_requests_total', path='llm')
+                return cleaned_response
+            else:
+                return self._fallback_response(user_message, 'respuesta_vacia')
             
-            # 🤖 PASO 3: Generar respuesta con Groq
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
+        except AdmissionError as e:
+            print(f"⏳ Consulta rechazada: {e}")
+            metrics.inc('chatbot_requests_total', path='ocupado')
+            return BUSY_MESSAGE
+        except Exception as e:
+            print(f"❌ Error con Groq+RAG: {e}")
+            metrics.inc('chatbot_events_total', event='error', error=type(e).__name__)
+            return self._fallback_response(user_message, 'error')
+    
+    def stream_response(self, user_message: str, max_tokens: int = 300,
+                        history: Optional[List[Dict]] = None,
+                        memory: Optional[ConversationMemory] = None) -> Iterator[str]:
+        """
+        Variante en streaming de get_response para st.write_stream: emite el texto
+        del stream de Groq a medida que llega, frase a frase (ver ResponseCleaner),
+        con el mismo recorte final que _clean_response
+        """
+        with metrics.span('request'):
+            yield from self._stream_response(user_message, max_tokens, history, memory)
+    
+    def _stream_response(self, user_message: str, max_tokens: int,
+                         history: Optional[List[Dict]], memory: Optional[ConversationMemory]) -> Iterator[str]:
+        fast = self._fast_answer(user_message, history)
+        if fast is not None:
+            yield fast
+            return
+        
+        if not self.api_available:
+            yield self._fallback_response(user_message, 'sin_api')
+            return
+        
+        emitted = False
+        try:
+            # ⚡ PASO 0: Respuesta en caché para una pregunta equivalente
+            self.wait_until_ready()
+            cached, cache_args = self._cached_answer(user_message, max_tokens, history)
+            if cached is not None:
+                yield cached
+                return
+            
+            # 🔍 PASO 1 y 📝 PASO 2: contexto RAG y mensajes
+            start = time.perf_counter()
+            messages = self._build_messages(user_message, history, memory, cache_args)
+            
+            # 🤖 PASO 3: Generar respuesta con Groq en streaming
+            stream = self.client.stream(
+                messages,
                 max_tokens=max_tokens,
                 temperature=0.7,
                 top_p=0.95
             )
             
-            # Obtener texto de respuesta
-            if response.choices and response.choices[0].message.content:
-                cleaned_response = self._clean_response(response.choices[0].message.content)
-                return cleaned_response
-            else:
-                return self._fallback_response(user_message)
+            # Espera del LLM y limpieza se miden aparte; el tiempo que el
+            # consumidor (Streamlit) tarda en pintar cada fragmento no cuenta
+            cleaner = ResponseCleaner(self._clean_response)
+            llm_start = time.perf_counter()
+            first_token = None
+            llm_wait = clean_time = 0.0
+            chunks = iter(stream)
+            while True:
+                wait_start = time.perf_counter()
+                delta = next(chunks, None)
+                llm_wait += time.perf_counter() - wait_start
+                if delta is None:
+                    break
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    metrics.observe('llm_first_token', time.perf_counter() - llm_start)
+                clean_start = time.perf_counter()
+                text = cleaner.feed(delta)
+                clean_time += time.perf_counter() - clean_start
+                if text:
+                    emitted = True
+                    yield text
+            metrics.observe('llm', llm_wait)
+            
+            clean_start = time.perf_counter()
+            tail = cleaner.finish()
+            metrics.observe('clean', clean_time + time.perf_counter() - clean_start)
+            if tail:
+                emitted = True
+                yield tail
+            
+            if not cleaner.response:
+                yield self._fallback_response(user_message, 'respuesta_vacia')
+                return
+            
+            if cache_args is not None:
+                embedding, fingerprint, scope = cache_args
+                self.answer_cache.put(embedding, cleaner.response, fingerprint, scope)
+            metrics.inc('chatbot_requests_total', path='llm')
+            if first_token is not None:
+                print(f"⏱️ Primer token en {first_token:.2f}s, respuesta completa en "
+                      f"{time.perf_counter() - start:.2f}s")
             
+        except AdmissionError as e:
+            print(f"⏳ Consulta rechazada: {e}")
+            metrics.inc('chatbot_requests_total', path='ocupado')
+            yield BUSY_MESSAGE
         except Exception as e:
-            print(f"❌ Error con Groq+RAG: {e}")
-            return self._fallback_response(user_message)
+            print(f"❌ Error con Groq+RAG (streaming): {e}")
+            metrics.inc('chatbot_events_total', event='error', error=type(e).__name__)
+            # Si ya se mostró parte de la respuesta no se añade el texto de emergencia
+            if not emitted:
+                yield self._fallback_response(user_message, 'error')
+            else:
+                metrics.inc('chatbot_requests_total', path='error')
+    
+    def _fast_answer(self, user_message: str, history: Optional[List[Dict]] = None) -> Optional[str]:
+        """
+        Respuesta directa de DataProcessor.query_data, o None si la pregunta va al LLM.
+        Un seguimiento sin municipio ("¿y cuántos hurtos en 2024?" tras preguntar por
+        Girón) depende del historial: los totales de Santander serían engañosos.
+        """
+        self.wait_until_ready()
+        if not self.data_loaded or self._follows_history(user_message, history):
+            return None
+        try:
+            with metrics.span('fast_path'):
+                result = self.data.query_data(user_message)
+        except Exception as e:
+            print(f"⚠️ Vía rápida no disponible: {e}")
+            metrics.inc('chatbot_events_total', event='error', error=type(e).__name__)
+            return None
+        if not result:
+            return None
+        print(f"⚡ Respuesta directa ({result['intent']}) en {result['ms']:.1f} ms")
+        metrics.inc('chatbot_requests_total', path='rapida')
+        return result['answer']
+    
+    def _cached_answer(self, user_message: str, max_tokens: int,
+                       history: Optional[List[Dict]]) -> Tuple[Optional[str], Optional[tuple]]:
+        """(respuesta en caché o None, argumentos de la caché para guardar la nueva)"""
+        with metrics.span('answer_cache'):
+            cache_args = self._answer_cache_args(user_message, max_tokens, history)
+            if cache_args is None:
+                return None, None
+            cached = self.answer_cache.get(*cache_args)
+        
+        metrics.inc('chatbot_events_total', event='answer_cache_hit' if cached is not None else 'answer_cache_miss')
+        if cached is not None:
+            metrics.inc('chatbot_requests_total', path='cache')
+        return cached, cache_args
+    
+    def _build_messages(self, user_message: str, history: Optional[List[Dict]] = None,
+                        memory: Optional[ConversationMemory] = None,
+                        cache_args: Optional[tuple] = None) -> List[Dict]:
+        """
+        Mensajes para Groq dentro del presupuesto de tokens (ver PromptBuilder):
+        prompt del sistema, datos del RAG comprimidos, resumen y últimos turnos, y pregunta.
+        `cache_args` (de _cached_answer) aporta el embedding ya calculado de la pregunta
+        """
+        # 🔍 Buscar contexto relevante con RAG
+        facts = []
+        if self.data_loaded:
+            embedding = cache_args[0] if cache_args is not None else None
+            with metrics.span('retrieval'):
+                facts = self.rag.get_facts(user_message, embedding=embedding)
+        
+        if memory is None:
+            memory = ConversationMemory(keep_turns=self.history_turns)
+        with metrics.span('context'):
+            messages, stats = self.prompt_builder.build(self.system_prompt, user_message, facts, history, memory)
+        print(f"🧮 Prompt: {stats['tokens']}/{stats['budget']} tokens "
+              f"({stats['facts']} datos, {stats['turns']} mensajes de historial"
+              f"{', con resumen' if stats['summary'] else ''})")
+        
+        return messages
+    
+    def _answer_cache_args(self, user_message: str, max_tokens: int,
+                           history: Optional[List[Dict]] = None) -> Optional[tuple]:
+        """
+        (embedding, huella de datos, alcance) de la pregunta para la caché de respuestas.
+        El alcance (municipios, provincias, tipo, delitos, periodo, calificadores y max_tokens) evita
+        reutilizar la respuesta de "hurtos en Girón en enero" para "homicidios en Girón
+        en febrero", o la de "desde 2020" para "antes de 2020", cuyos embeddings son casi iguales.
+        Una pregunta sin municipio ni provincia a mitad de conversación ("¿y por qué?", "¿y en 2024?")
+        depende del historial y no se cachea; sin catálogo de delitos (datos sin cubo)
+        tampoco, porque no se podría separar por delito.
+        """
+        if not self.data_loaded or self.data.parser is None:
+            return None
+        try:
+            parsed = self.rag.parse_query(user_message)
+            if self._follows_history(user_message, history):
+                return None
+            # None (subcategoría fuera del catálogo) no comparte alcance con "sin delito"
+            delitos = self.data.parser.find_delitos(normalize_text(user_message))
+            delitos = tuple(sorted(delitos)) if delitos is not None else None
+            slots = self.data.parser.parse(user_message)
+            scope = (tuple(parsed['municipios']), tuple(slots['zonas']), parsed['tipo'], delitos, tuple(slots['anios']),
+                     tuple(sorted(slots['meses'])), tuple(slots['calificadores']), max_tokens)
+            return self.rag.embed_query(user_message), self.rag.fingerprint, scope
+        except Exception as e:
+            print(f"⚠️ Caché de respuestas no disponible: {e}")
+            return None
+    
+    @staticmethod
+    def _follows_history(user_message: str, history: Optional[List[Dict]]) -> bool:
+        """True si la pregunta, sin municipio ni provincia propios, continúa una conversación"""
+        return bool(history) and not (find_municipios(user_message) or find_provincias(user_message))
     
     def _clean_response(self, response: str) -> str:
         """Limpia y formatea la respuesta"""
         response = response.strip()
         
-        if response and not response[-1] in ['.', '!', '?']:
+        if response and not response[-1] in SENTENCE_ENDINGS:
             last_period = response.rfind('.')
             if last_period > len(response) * 0.7:
                 response = response[:last_period + 1]
         
         return response
     
-    def _fallback_response(self, user_message: str) -> str:
+    def _fallback_response(self, user_message: str, reason: str = 'error') -> str:
         """Respuesta de emergencia"""
+        metrics.inc('chatbot_requests_total', path='emergencia')
+        metrics.inc('chatbot_events_total', event='fallback', reason=reason)
         
         user_message_lower = user_message.lower()
         
@@ -137,7 +458,37 @@ Puedo ayudarte con:
     
     def get_data_summary(self) -> str:
         """Retorna resumen de datos disponibles"""
+        if not self.is_ready:
+            return "🔄 Cargando datos..."
         if self.data_loaded:
-            return self.rag.get_summary()
+            stats = self.data.fast_path_stats()
+            summary = self.rag.get_summary()
+            if stats['total']:
+                summary += (f"• Respuestas directas (sin LLM): {stats['fraccion_rapida']:.0%} "
+                            f"de {stats['total']} consultas\n")
+            requests = metrics.histogram('request')
+            if requests is not None and requests.count:
+                summary += f"• Latencia p95 (aprox.): ≤ {requests.quantile(0.95):g}s\n"
+            return summary
         else:
             return "⚠️ No hay datos cargados."
+
+
+_shared_handler = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_handler() -> ChatbotHandler:
+    """
+    ChatbotHandler único del proceso, creado en la primera llamada.
+    Streamlit atiende cada sesión en un hilo: todas comparten el modelo de
+    embeddings, el índice, los datos y el cliente Groq; el historial del chat
+    se queda en st.session_state.
+    """
+    global _shared_handler
+    if _shared_handler is None:
+        with _shared_lock:
+            if _shared_handler is None:
+                _shared_handler = ChatbotHandler()
+    return _shared_handler
+
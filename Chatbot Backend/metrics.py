@@ -0,0 +1,259 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Límites (segundos) de los histogramas: de 1 ms (embedding, FAISS) a 30 s (LLM)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+_HELP = {
+    'chatbot_stage_seconds': "Duración de cada etapa de una consulta del chatbot",
+    'chatbot_requests_total': "Consultas atendidas por vía de respuesta",
+    'chatbot_events_total': "Aciertos de caché, respuestas de emergencia, reintentos y errores",
+    'chatbot_process_resident_memory_bytes': "Memoria residente del proceso",
+    'chatbot_process_cpu_seconds': "Tiempo de CPU consumido por el proceso",
+}
+
+
+class Histogram:
+    """Histograma acumulado al estilo Prometheus (buckets fijos, suma y cuenta)"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> float:
+        """Cuantil aproximado (límite superior del bucket), para informes rápidos"""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    Registro de métricas del proceso (compartido por todas las sesiones):
+    - span(etapa): mide un bloque y lo acumula en chatbot_stage_seconds{stage=...}
+    - inc(nombre, **etiquetas): contadores (aciertos de caché, fallbacks, errores...)
+    - gauge(nombre, función): valores que se leen al exportar (cola, en curso, memoria)
+    - collect(): duraciones de los spans del hilo actual, para ver una consulta concreta
+    Se exporta en formato de texto de Prometheus con render(), write() o serve().
+    """
+    
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    # ---------- Registro ----------
+    
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Mide la duración del bloque como etapa `stage` (también si lanza una excepción)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def observe(self, stage: str, seconds: float):
+        """Añade una duración ya medida a la etapa `stage`"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        
+        collected = getattr(self._local, 'collected', None)
+        if collected is not None:
+            collected[stage] = collected.get(stage, 0.0) + seconds
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """Incrementa el contador `name` con esas etiquetas"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def gauge(self, name: str, read: Callable[[], float], help: str = ""):
+        """Registra (o reemplaza) un valor que se calcula al exportar"""
+        with self._lock:
+            self._gauges[name] = (read, help)
+    
+    @contextmanager
+    def collect(self) -> Iterator[Dict[str, float]]:
+        """Segundos por etapa de los spans de este hilo mientras dura el bloque"""
+        previous = getattr(self._local, 'collected', None)
+        self._local.collected = collected = {}
+        try:
+            yield collected
+        finally:
+            self._local.collected = previous
+    
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+    
+    def histogram(self, stage: str) -> Optional[Histogram]:
+        return self._histograms.get(stage)
+    
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+    
+    # ---------- Exportación ----------
+    
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.sum, h.count) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        
+        lines = []
+        if histograms:
+            lines += self._header('chatbot_stage_seconds', 'histogram')
+            for stage in sorted(histograms):
+                counts, total, count = histograms[stage]
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'chatbot_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'chatbot_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'chatbot_stage_seconds_count{{stage="{stage}"}} {count}')
+        
+        for name in sorted({name for name, _ in counters}):
+            lines += self._header(name, 'counter')
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"{name}{self._labels(labels)} {self._number(value)}")
+        
+        for name in sorted(gauges):
+            read, help = gauges[name]
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines += self._header(name, 'gauge', help)
+            lines.append(f"{name} {self._number(value)}")
+        
+        return "\n".join(lines) + "\n"
+    
+    def write(self, path: str):
+        """Escribe render() en un fichero de forma atómica (p. ej. para el textfile collector)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+    
+    def start_file_export(self, path: str, interval: float = 15.0) -> threading.Thread:
+        """Reescribe `path` cada `interval` segundos en un hilo de fondo"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"⚠️ No se pudieron exportar las métricas a {path}: {e}")
+        
+        thread = threading.Thread(target=loop, name="metrics-file", daemon=True)
+        thread.start()
+        return thread
+    
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Sirve GET /metrics en un hilo de fondo"""
+        registry = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+    
+    def _header(self, name: str, kind: str, help: str = "") -> list:
+        help = help or _HELP.get(name, "")
+        return ([f"# HELP {name} {help}"] if help else []) + [f"# TYPE {name} {kind}"]
+    
+    @staticmethod
+    def _number(value: float) -> str:
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+    
+    @staticmethod
+    def _labels(labels: Tuple) -> str:
+        if not labels:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                   for _, value in labels)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _resident_memory_bytes() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# Registro único del proceso
+metrics = Metrics()
+metrics.gauge('chatbot_process_resident_memory_bytes', _resident_memory_bytes)
+metrics.gauge('chatbot_process_cpu_seconds', time.process_time)
+
+_export_lock = threading.Lock()
+_export_started = False
+
+
+def start_exporters():
+    """
+    Arranca la exportación configurada por entorno (una vez por proceso):
+    METRICS_PORT sirve /metrics para Prometheus; METRICS_FILE reescribe ese
+    fichero cada METRICS_INTERVAL segundos (por defecto 15).
+    """
+    global _export_started
+    with _export_lock:
+        if _export_started:
+            return
+        _export_started = True
+    
+    port = os.getenv("METRICS_PORT")
+    if port:
+        try:
+            metrics.serve(int(port))
+            print(f"📈 Métricas en http://0.0.0.0:{port}/metrics")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudo servir /metrics en el puerto {port}: {e}")
+    
+    path = os.getenv("METRICS_FILE")
+    if path:
+        metrics.start_file_export(path, float(os.getenv("METRICS_INTERVAL", "15")))
+        print(f"📈 Métricas en {path}")
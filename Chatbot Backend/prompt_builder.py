@@ -0,0 +1,221 @@
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Palabras, números y signos sueltos, como los separa un BPE tipo Llama 3
+_PATRON_TOKENS = re.compile(r"\d+|[^\W\d_]+|[^\w\s]")
+_PATRON_NUMERO = re.compile(r"\d")
+# "Etiqueta: valor" sin lista (municipio, delito, periodo...): identifica el dato
+_PATRON_CAMPO = re.compile(r"^[^:,]+: [^:,]+\.?$")
+
+# Tokens de formato que añade la plantilla de chat a cada mensaje
+MESSAGE_OVERHEAD = 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimación de tokens sin tokenizador (Groq no expone el de Llama 3):
+    palabras en trozos de 4 letras, números en grupos de 3 cifras y cada signo
+    un token. Se pasa un poco por arriba en español, que es lo seguro para un presupuesto.
+    """
+    tokens = 0
+    for piece in _PATRON_TOKENS.findall(text):
+        if piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+def message_tokens(message: Dict) -> int:
+    return count_tokens(message['content']) + MESSAGE_OVERHEAD
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Recorta el texto por palabras hasta `max_tokens` (con '…' si se corta)"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    kept, used = [], count_tokens("…")
+    for word in words:
+        cost = count_tokens(word)
+        if used + cost > max_tokens:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept).rstrip(".,;:") + "…"
+
+
+def compress_fact(text: str, max_tokens: int) -> str:
+    """
+    Reduce un chunk del RAG a sus cifras clave dentro de `max_tokens`:
+    conserva en orden las frases con números y los campos que identifican el
+    dato ("Delito: HOMICIDIO."), descarta el resto y corta las listas largas
+    ("Evolución mensual: ...") por elementos en lugar de a media palabra.
+    """
+    sentences = [s for s in re.split(r'(?<=\.)\s+', text.strip()) if s]
+    kept, used = [], 0
+    for i, sentence in enumerate(sentences):
+        if i > 0 and not (_PATRON_NUMERO.search(sentence) or _PATRON_CAMPO.match(sentence)):
+            continue
+        cost = count_tokens(sentence)
+        if used + cost <= max_tokens:
+            kept.append(sentence)
+            used += cost
+            continue
+        
+        # Lista "Etiqueta: a, b, c": tantos elementos como quepan
+        label, sep, items = sentence.partition(": ")
+        items = items.rstrip(".").split(", ")
+        if sep and len(items) > 1:
+            partial = label + sep
+            for item in items:
+                candidate = partial + ("" if partial.endswith(sep) else ", ") + item
+                if used + count_tokens(candidate + "…") > max_tokens:
+                    break
+                partial = candidate
+            if not partial.endswith(sep):
+                kept.append(partial + "…")
+        break
+    
+    return " ".join(kept) if kept else truncate_tokens(text, max_tokens)
+
+
+class ConversationMemory:
+    """
+    Memoria de una conversación (una por sesión, en st.session_state; el
+    ChatbotHandler es compartido). Los mensajes que salen de la ventana de los
+    últimos `keep_turns` turnos se pliegan en un resumen acotado a
+    `summary_tokens`: pregunta del usuario y la primera frase con cifras de la
+    respuesta. Cada mensaje se pliega una sola vez.
+    """
+    
+    def __init__(self, keep_turns: int = 4, summary_tokens: int = 200):
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.items = []
+        self.folded = 0
+    
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.items)
+    
+    def update(self, history: List[Dict]) -> List[Dict]:
+        """Pliega en el resumen lo anterior a la ventana y devuelve los mensajes recientes"""
+        start = max(0, len(history) - 2 * self.keep_turns)
+        if start < self.folded:
+            # El historial se vació o se recortó: se vuelve a empezar
+            self.items, self.folded = [], 0
+        
+        for message in history[self.folded:start]:
+            item = self._fold(message)
+            if item:
+                self.items.append(item)
+        self.folded = start
+        
+        while len(self.items) > 1 and count_tokens(self.summary) > self.summary_tokens:
+            self.items.pop(0)
+        if self.items and count_tokens(self.summary) > self.summary_tokens:
+            self.items = [truncate_tokens(self.items[0], self.summary_tokens)]
+        
+        return history[start:]
+    
+    @staticmethod
+    def _fold(message: Dict) -> Optional[str]:
+        content = " ".join(message.get('content', '').split())
+        if not content:
+            return None
+        if message.get('role') == 'user':
+            return "- Usuario: " + truncate_tokens(content, 30)
+        
+        sentences = re.split(r'(?<=[.!?])\s+', content)
+        key = next((s for s in sentences if _PATRON_NUMERO.search(s)), sentences[0])
+        return "  Asistente: " + truncate_tokens(key, 40)
+
+
+class PromptBuilder:
+    """
+    Arma los mensajes para Groq dentro de un presupuesto fijo de tokens de entrada,
+    por prioridad:
+    1. Prompt del sistema y pregunta actual (siempre)
+    2. Datos del RAG en orden de relevancia, comprimidos a sus cifras clave
+       (hasta `fact_tokens` cada uno y `facts_share` del presupuesto)
+    3. Resumen de la conversación y los últimos turnos, del más reciente al más antiguo
+    Así los tokens de entrada (latencia y coste) no crecen con la conversación.
+    """
+    
+    def __init__(self, budget: int = 1500, fact_tokens: int = 90, facts_share: float = 0.5,
+                 turn_tokens: int = 150):
+        self.budget = budget
+        self.fact_tokens = fact_tokens
+        self.facts_share = facts_share
+        self.turn_tokens = turn_tokens
+    
+    def build(self, system_prompt: str, user_message: str, facts: Iterable[str] = (),
+              history: Optional[List[Dict]] = None,
+              memory: Optional[ConversationMemory] = None) -> Tuple[List[Dict], Dict]:
+        """Devuelve (mensajes, estadísticas: tokens usados, datos, turnos y si va el resumen)"""
+        system = {"role": "system", "content": system_prompt}
+        question = {"role": "user", "content": user_message}
+        used = message_tokens(system)
+        # Una pregunta desmesurada no puede dejar fuera el resto del prompt
+        question['content'] = truncate_tokens(user_message, max(1, (self.budget - used) // 2))
+        used += message_tokens(question)
+        
+        # 2. Datos del RAG
+        context_header = "CONTEXTO DE DATOS:\nDATOS RELEVANTES:\n"
+        facts_budget = min(self.budget - used, int(self.budget * self.facts_share))
+        lines = []
+        facts_used = count_tokens(context_header) + MESSAGE_OVERHEAD
+        for fact in facts:
+            line = f"{len(lines) + 1}. {compress_fact(fact, self.fact_tokens)}"
+            cost = count_tokens(line) + 1
+            if facts_used + cost > facts_budget:
+                break
+            lines.append(line)
+            facts_used += cost
+        
+        context = None
+        if lines:
+            context = {"role": "system", "content": context_header + "\n".join(lines)}
+            used += message_tokens(context)
+        
+        # 3. Resumen y últimos turnos
+        if memory is None:
+            memory = ConversationMemory()
+        recent = memory.update(history or [])
+        
+        summary = None
+        if memory.summary:
+            summary = {"role": "system", "content": "RESUMEN DE LA CONVERSACIÓN:\n" + memory.summary}
+            if used + message_tokens(summary) <= self.budget:
+                used += message_tokens(summary)
+            else:
+                summary = None
+        
+        turns = []
+        for message in reversed(recent):
+            turn = {"role": message['role'], "content": truncate_tokens(message['content'], self.turn_tokens)}
+            cost = message_tokens(turn)
+            if used + cost > self.budget:
+                break
+            turns.append(turn)
+            used += cost
+        turns.reverse()
+        # Sin una respuesta del asistente suelta al principio
+        while turns and turns[0]['role'] != 'user':
+            used -= message_tokens(turns.pop(0))
+        
+        messages = [system]
+        messages += [m for m in (context, summary) if m is not None]
+        messages += turns + [question]
+        
+        return messages, {
+            'tokens': used,
+            'budget': self.budget,
+            'facts': len(lines),
+            'turns': len(turns),
+            'summary': summary is not None,
+        }
@@ -1,104 +1,1065 @@
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
 import os
+import importlib
 import pickle
-from typing import List, Dict, Tuple
+import json
+import copy
+import hashlib
+import threading
+import time
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Callable, List, Dict, Tuple, Optional
+from .gazetteer import (normalize_text, canonical_municipio, find_municipios, detect_tipo, find_years,
+                        PROVINCIAS_MUNICIPIOS, ZONA_POR_MUNICIPIO, MESES)
+from .metrics import metrics
+from .data_loader import FECHA_COLUMNS, TableCache, atomic_write, load_tables
+from .ingest import CountsAccumulator, ingest_csv
+
+class _LazyModule:
+    """
+    Importa el módulo la primera vez que se usa uno de sus atributos.
+    sentence_transformers (con torch) y faiss tardan segundos en importarse;
+    así importar este módulo es inmediato y el coste pasa a initialize().
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+    
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+faiss = _LazyModule('faiss')
+sentence_transformers = _LazyModule('sentence_transformers')
+
+# Versión del formato de la caché en disco (subir si cambia la estructura de los chunks)
+CACHE_VERSION = 6
+
+# Tipos de índice soportados por build_index
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'sq', 'pq')
+
+# Índices con vectores comprimidos: se re-ordenan con distancias exactas (ver ExactVectors)
+QUANTIZED_INDEX_TYPES = ('sq', 'pq')
+
+# Ventanas temporales (frecuencias de Period de pandas) de los chunks por delito
+CHUNK_WINDOWS = ('Y', 'Q', 'M')
+
+# Backends de inferencia soportados por load_embedding_model
+EMBEDDING_BACKENDS = ('fp32', 'int8', 'onnx')
+
+
+def load_embedding_model(model_name: str, backend: str = 'fp32'):
+    """
+    Carga el modelo de embeddings para CPU.
+    
+    - fp32: PyTorch sin cuantizar (por defecto)
+    - int8: cuantización dinámica int8 de las capas Linear (torch.quantization)
+    - onnx: grafo ONNX ejecutado con ONNX Runtime (sentence-transformers>=3.2 y onnxruntime)
+    """
+    if backend == 'fp32':
+        return sentence_transformers.SentenceTransformer(model_name, device='cpu')
+    
+    if backend == 'int8':
+        import torch
+        model = sentence_transformers.SentenceTransformer(model_name, device='cpu')
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    
+    if backend == 'onnx':
+        return sentence_transformers.SentenceTransformer(model_name, device='cpu', backend='onnx')
+    
+    raise ValueError(f"Backend de embeddings desconocido: {backend} (opciones: {', '.join(EMBEDDING_BACKENDS)})")
+
+
+class EmbeddingBuffer:
+    """
+    Matriz float32 (n, dim) preasignada donde se escriben los embeddings.
+    Con varios procesos vive en memoria compartida y cada worker escribe su
+    fragmento en sitio; usar como context manager para liberarla.
+    """
+    
+    def __init__(self, n: int, dimension: int, shared: bool = False):
+        self.shape = (n, dimension)
+        self._shm = None
+        if shared:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(1, n * dimension * 4))
+            self.array = np.ndarray(self.shape, dtype='float32', buffer=self._shm.buf)
+        else:
+            self.array = np.empty(self.shape, dtype='float32')
+    
+    @property
+    def shm_name(self) -> Optional[str]:
+        return self._shm.name if self._shm is not None else None
+    
+    def close(self):
+        """Libera la memoria compartida (no debe quedar ninguna vista de `array`)"""
+        self.array = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Estado de cada proceso del pool de embeddings (ver _init_embedding_worker)
+_WORKER = {}
+
+
+def _init_embedding_worker(model_name: str, backend: str, shm_name: str, shape: Tuple[int, int], threads: int):
+    """Carga el modelo una vez por proceso y se conecta a la matriz compartida"""
+    # Un error en el initializer haría que el pool relanzara procesos sin fin:
+    # se guarda y se propaga en la primera tarea
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _WORKER['shm'] = shm
+        _WORKER['out'] = np.ndarray(shape, dtype='float32', buffer=shm.buf)
+        _WORKER['model'] = load_embedding_model(model_name, backend)
+    except Exception as e:
+        _WORKER['error'] = e
+
+
+def _encode_shard(start: int, texts: List[str], batch_size: int) -> int:
+    """Codifica un fragmento y lo escribe en sus filas de la matriz compartida"""
+    if 'error' in _WORKER:
+        raise _WORKER['error']
+    _WORKER['out'][start:start + len(texts)] = _WORKER['model'].encode(texts, batch_size=batch_size)
+    return len(texts)
+
+
+def encode_texts(model, texts: List[str], model_name: str, backend: str = 'fp32',
+                 processes: int = 1, batch_size: int = 64, shard_size: int = 4096) -> EmbeddingBuffer:
+    """
+    Codifica `texts` en un EmbeddingBuffer preasignado.
+    Con processes > 1 reparte fragmentos contiguos entre un pool de procesos
+    (cada uno con su copia del modelo y cores/processes hilos de torch) que
+    escriben directamente en memoria compartida, sin concatenar resultados.
+    """
+    n = len(texts)
+    dimension = model.get_sentence_embedding_dimension()
+    
+    # Con pocos textos no compensa arrancar procesos y cargar el modelo en cada uno
+    if processes <= 1 or n < processes * batch_size * 4:
+        buffer = EmbeddingBuffer(n, dimension)
+        for start in range(0, n, shard_size):
+            buffer.array[start:start + shard_size] = model.encode(texts[start:start + shard_size], batch_size=batch_size)
+        return buffer
+    
+    buffer = EmbeddingBuffer(n, dimension, shared=True)
+    # Fragmentos múltiplo del batch y ~4 por proceso para repartir bien la carga
+    shard = max(batch_size, min(shard_size, -(-n // (processes * 4)) // batch_size * batch_size or batch_size))
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    try:
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes, initializer=_init_embedding_worker,
+                          initargs=(model_name, backend, buffer.shm_name, buffer.shape, threads)) as pool:
+            tasks = [(start, texts[start:start + shard], batch_size) for start in range(0, n, shard)]
+            pool.starmap(_encode_shard, tasks)
+    except Exception:
+        buffer.close()
+        raise
+    return buffer
+
+
+def build_index(embeddings: np.ndarray, ids: np.ndarray, index_type: str = 'flat', **params) -> 'faiss.Index':
+    """
+    Crea un índice FAISS con IDs propios y añade los vectores.
+    
+    - flat: búsqueda exacta (IndexFlatL2)
+    - ivf:  IndexIVFFlat; params nlist (por defecto ~4*sqrt(n)) y nprobe (8)
+    - hnsw: IndexHNSWFlat; params M (32), ef_construction (40) y ef_search (64)
+    - sq:   IndexScalarQuantizer; param sq_bits (4, 6 u 8 bits por dimensión, por defecto 8)
+    - pq:   IndexPQ; param pq_m (bytes por vector, divisor de la dimensión, por defecto 48)
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    n, dimension = embeddings.shape
+    
+    if index_type == 'flat':
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        
+    elif index_type == 'ivf':
+        # FAISS recomienda >= 39 puntos de entrenamiento por lista
+        nlist = params.get('nlist') or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        index.train(embeddings)
+        enable_reconstruct(index)
+        
+    elif index_type == 'hnsw':
+        hnsw = faiss.IndexHNSWFlat(dimension, params.get('M', 32))
+        hnsw.hnsw.efConstruction = params.get('ef_construction', 40)
+        index = faiss.IndexIDMap2(hnsw)
+        
+    elif index_type == 'sq':
+        bits = params.get('sq_bits', 8)
+        qtypes = {4: faiss.ScalarQuantizer.QT_4bit, 6: faiss.ScalarQuantizer.QT_6bit, 8: faiss.ScalarQuantizer.QT_8bit}
+        if bits not in qtypes:
+            raise ValueError(f"sq_bits debe ser 4, 6 u 8 (recibido {bits})")
+        sq = faiss.IndexScalarQuantizer(dimension, qtypes[bits], faiss.METRIC_L2)
+        sq.train(embeddings)
+        index = faiss.IndexIDMap2(sq)
+        
+    elif index_type == 'pq':
+        m = params.get('pq_m', 48)
+        if dimension % m:
+            raise ValueError(f"pq_m={m} debe dividir la dimensión {dimension}")
+        # 2**nbits centroides por subvector; FAISS pide >= 39 puntos por centroide
+        nbits = int(max(1, min(8, np.floor(np.log2(max(n // 39, 2))))))
+        pq = faiss.IndexPQ(dimension, m, nbits)
+        pq.train(embeddings)
+        index = faiss.IndexIDMap2(pq)
+        
+    else:
+        raise ValueError(f"Tipo de índice desconocido: {index_type} (opciones: {', '.join(INDEX_TYPES)})")
+    
+    set_search_params(index, **params)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+    return index
+
+
+def set_search_params(index: 'faiss.Index', nprobe: int = 8, ef_search: int = 64, **_):
+    """Ajusta nprobe (IVF) o efSearch (HNSW) de un índice creado con build_index"""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = min(nprobe, inner.nlist)
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+
+def enable_reconstruct(index: 'faiss.Index'):
+    """
+    Permite reconstruct/reconstruct_batch por ID en un índice IVF (mapa directo
+    con tabla hash, admite remove_ids); el resto de índices de build_index ya lo permiten
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexIVF) and inner.direct_map.type == faiss.DirectMap.NoMap:
+        inner.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def index_bytes_per_vector(index: 'faiss.Index') -> float:
+    """Tamaño serializado del índice (códigos, IDs y estructuras) dividido entre sus vectores"""
+    if index.ntotal == 0:
+        return 0.0
+    return faiss.serialize_index(index).nbytes / index.ntotal
+
+
+def rerank_exact(queries: np.ndarray, candidate_ids: np.ndarray, candidate_vectors: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-ordena candidatos por distancia L2 exacta y devuelve (distancias, ids) de los k mejores.
+    candidate_ids es (nq, c) con -1 para huecos; candidate_vectors es (nq, c, d).
+    """
+    distances = ((candidate_vectors - queries[:, np.newaxis, :]) ** 2).sum(axis=2)
+    distances[candidate_ids < 0] = np.inf
+    order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(candidate_ids, order, axis=1)
+
+
+def exact_top_k(queries: np.ndarray, ids: np.ndarray, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (distancias, ids) de los k vecinos exactos (L2 al cuadrado) entre `vectors` (n, d).
+    Las distancias salen de un producto (nq, d) @ (d, n), sin materializar (nq, n, d);
+    con menos de k vectores se rellena con inf / -1 como FAISS.
+    """
+    nq = len(queries)
+    distances = np.full((nq, k), np.inf, dtype='float32')
+    labels = np.full((nq, k), -1, dtype='int64')
+    if len(ids) == 0:
+        return distances, labels
+    
+    all_d = ((queries ** 2).sum(axis=1)[:, np.newaxis] - 2 * (queries @ vectors.T)
+             + (vectors ** 2).sum(axis=1)[np.newaxis, :])
+    np.maximum(all_d, 0, out=all_d)
+    kk = min(k, len(ids))
+    part = np.argpartition(all_d, kk - 1, axis=1)[:, :kk] if kk < len(ids) else np.tile(np.arange(len(ids)), (nq, 1))
+    part_d = np.take_along_axis(all_d, part, axis=1)
+    order = np.argsort(part_d, axis=1, kind='stable')
+    distances[:, :kk] = np.take_along_axis(part_d, order, axis=1)
+    labels[:, :kk] = np.asarray(ids, dtype='int64')[np.take_along_axis(part, order, axis=1)]
+    return distances, labels
+
+
+class ExactVectors:
+    """
+    Vectores float32 originales para re-ordenar los candidatos de un índice cuantizado.
+    Se guardan en un .npy que se abre mapeado en memoria: solo se leen las filas
+    de los candidatos y las páginas se comparten entre procesos vía la caché del SO.
+    Las filas van ordenadas por ID: cada ID se resuelve con np.searchsorted, sin
+    un diccionario Python por vector.
+    """
+    
+    def __init__(self, ids: np.ndarray, array: np.ndarray):
+        ids = np.asarray(ids, dtype='int64')
+        if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():
+            # Vectores en memoria o caché de una versión anterior: se ordenan una vez
+            order = np.argsort(ids, kind='stable')
+            ids, array = ids[order], np.asarray(array[order], dtype='float32')
+        self.ids = ids
+        self.array = array
+    
+    @classmethod
+    def save(cls, vectors_path: str, ids_path: str, ids: np.ndarray, vectors: np.ndarray) -> 'ExactVectors':
+        """Escribe ids y vectores ordenados por ID (a temporales únicos y renombrando) y los abre con mmap"""
+        ids = np.asarray(ids, dtype='int64')
+        order = np.argsort(ids, kind='stable')
+        for path, data in ((vectors_path, np.asarray(vectors, dtype='float32')[order]),
+                           (ids_path, ids[order])):
+            # Con un archivo abierto np.save no añade ".npy" al nombre temporal
+            with atomic_write(path) as tmp_path, open(tmp_path, "wb") as f:
+                np.save(f, data)
+        return cls.load(vectors_path, ids_path)
+    
+    @classmethod
+    def load(cls, vectors_path: str, ids_path: str) -> 'ExactVectors':
+        return cls(np.load(ids_path), np.load(vectors_path, mmap_mode='r'))
+    
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """Fila de cada ID (-1 si no está)"""
+        ids = np.asarray(ids, dtype='int64')
+        pos = np.searchsorted(self.ids, ids)
+        pos[pos == len(self.ids)] = 0
+        found = (self.ids[pos] == ids) if len(self.ids) else np.zeros(ids.shape, dtype=bool)
+        return np.where(found, pos, -1)
+    
+    def get(self, ids) -> np.ndarray:
+        """Vectores de los IDs dados, en ese orden"""
+        ids = np.asarray(ids, dtype='int64')
+        rows = self.rows(ids)
+        if (rows < 0).any():
+            raise KeyError(f"IDs sin vector exacto: {ids[rows < 0][:5].tolist()}")
+        return np.asarray(self.array[rows], dtype='float32')
+    
+    def gather(self, candidate_ids: np.ndarray) -> np.ndarray:
+        """Vectores (nq, c, d) de una matriz de candidatos; ceros para los -1"""
+        flat = candidate_ids.ravel()
+        rows = self.rows(flat)
+        out = np.zeros((len(flat), self.array.shape[1]), dtype='float32')
+        valid = rows >= 0
+        if valid.any():
+            out[valid] = self.array[rows[valid]]
+        return out.reshape(candidate_ids.shape + (self.array.shape[1],))
+
+
+class QueryCache:
+    """
+    Caché LRU con TTL de embeddings de consultas y de sus resultados top-k.
+    Las claves son consultas ya normalizadas con normalize_text.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str, count: bool = True) -> Optional[Dict]:
+        """
+        Entrada {'embedding', 'results'} vigente para la clave, o None.
+        count=False no suma acierto/fallo (segunda consulta de la misma petición)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry['time'] > self.ttl:
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += count
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += count
+            return entry
+    
+    def put(self, key: str, embedding: np.ndarray) -> Dict:
+        """Guarda el embedding de una consulta, expulsando la entrada menos usada"""
+        entry = {'embedding': embedding, 'results': {}, 'time': time.monotonic()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+    
+    def clear_results(self):
+        """Descarta los top-k guardados (el índice cambió); los embeddings siguen válidos"""
+        with self._lock:
+            for entry in self._entries.values():
+                entry['results'] = {}
+    
+    def stats(self) -> Dict:
+        """Contadores de aciertos/fallos y tamaño actual"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+            }
+
+
+class RowStore:
+    """
+    Almacén columnar (arrays NumPy/Arrow de pandas) de una tabla ordenada por municipio.
+    Los chunks guardan solo un rango [start, stop) de filas; los registros
+    se materializan bajo demanda para los resultados que se devuelven.
+    """
+    
+    def __init__(self, df: pd.DataFrame, key: str = 'municipio'):
+        # df ya viene ordenado por `key` (ver RAGProcessor._build_row_stores);
+        # Series.array es el array que respalda la columna, sin copiarlo
+        self.columns = list(df.columns)
+        self.arrays = {col: df[col].array for col in self.columns}
+        self.ranges = {}
+        
+        values = df[key].to_numpy()
+        if len(values) == 0:
+            return
+        starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+        stops = np.r_[starts[1:], len(values)]
+        for start, stop in zip(starts, stops):
+            if not pd.isna(values[start]):
+                self.ranges[values[start]] = (int(start), int(stop))
+    
+    def records(self, start: int, stop: int, limit: Optional[int] = None) -> List[Dict]:
+        """Materializa las filas [start, stop) como diccionarios (máximo `limit`)"""
+        if limit is not None:
+            stop = min(stop, start + limit)
+        # Series.tolist convierte a escalares Python igual que to_dict('records')
+        columns = {col: pd.Series(self.arrays[col][start:stop], copy=False).tolist() for col in self.columns}
+        return [dict(zip(self.columns, values)) for values in zip(*columns.values())]
+
 
 class RAGProcessor:
     """
     Procesa datos con RAG 100% gratis (FAISS + Sentence Transformers)
     """
     
-    def __init__(self, data_dir: str = "data"):
+    # Modelo gratis optimizado para español
+    MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+    
+    def __init__(self, data_dir: str = "data", cache_dir: Optional[str] = None,
+                 index_type: Optional[str] = None, index_params: Optional[Dict] = None,
+                 query_cache_size: int = 1024, query_cache_ttl: float = 3600.0,
+                 embedding_backend: Optional[str] = None,
+                 embedding_processes: Optional[int] = None, embedding_batch_size: int = 64,
+                 chunk_window: Optional[str] = None, coarse_partitions: int = 3, recent_years: int = 3,
+                 stream_chunksize: Optional[int] = None):
         self.data_dir = data_dir
+        self.cache_dir = cache_dir or os.path.join(data_dir, ".rag_cache")
+        # flat (exacto), ivf, hnsw, sq o pq; ver build_index para los parámetros.
+        # Con sq/pq, index_params['rerank'] (4 por defecto) es cuántos candidatos
+        # por resultado se re-ordenan con distancia exacta.
+        # Solo aplica a la búsqueda en un nivel: con chunks por ventana temporal la
+        # búsqueda en dos niveles es exacta y el índice es siempre flat (active_index_type)
+        self.index_type = index_type or os.getenv("RAG_INDEX_TYPE", "flat")
+        self.index_params = dict(index_params or {})
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Tipo de índice desconocido: {self.index_type}")
+        # fp32, int8 u onnx; ver load_embedding_model
+        self.embedding_backend = embedding_backend or os.getenv("RAG_EMBEDDING_BACKEND", "fp32")
+        if self.embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Backend de embeddings desconocido: {self.embedding_backend}")
+        # Procesos para codificar los chunks al construir el índice (1 = en este proceso)
+        self.embedding_processes = embedding_processes or int(os.getenv("RAG_EMBEDDING_PROCESSES", "1"))
+        self.embedding_batch_size = embedding_batch_size
+        # Índice en dos niveles: resúmenes por provincia/municipio y, dentro de las
+        # `coarse_partitions` mejores particiones, chunks por delito y ventana
+        # temporal (Y = año, Q = trimestre, M = mes). Sin año en la consulta, la
+        # búsqueda fina cubre los últimos `recent_years` años
+        self.chunk_window = chunk_window or os.getenv("RAG_CHUNK_WINDOW", "Y")
+        if self.chunk_window not in CHUNK_WINDOWS:
+            raise ValueError(f"Ventana temporal desconocida: {self.chunk_window}")
+        self.coarse_partitions = coarse_partitions
+        self.recent_years = recent_years
         self.embedding_model = None
         self.index = None
+        # Tipo del índice construido: index_type, o flat en la búsqueda en dos niveles
+        self.active_index_type = self.index_type
+        # Vectores float32 en disco para re-ordenar (solo índices sq/pq)
+        self.exact_vectors = None
         self.chunks = []
+        self.chunk_by_id = {}
+        # Particiones de IDs para el prefiltrado por metadatos
+        self.ids_by_municipio = {}
+        self.ids_by_tipo = {}
+        self.ids_by_anio = {}
+        self.coarse_ids = np.empty(0, dtype='int64')
+        self.ventanas_by_municipio = {}
         self.df_historicos = None
+        self.fechas_historicos = None
+        # Con stream_chunksize (DATA_STREAM_CHUNKSIZE) historicos.csv se lee por bloques:
+        # solo quedan sus conteos y su perfil (ingest.StreamSummary), sin filas para get_records
+        self.stream_chunksize = stream_chunksize or int(os.getenv("DATA_STREAM_CHUNKSIZE", "0")) or None
+        self.historicos_summary = None
         self.df_predicciones = None
+        self.row_stores = {}
+        self.fingerprint = None
+        self.query_cache = QueryCache(query_cache_size, query_cache_ttl)
+        # Segundos por etapa de arranque (ver startup_report)
+        self.timings = {}
+        # Un procesador se comparte entre sesiones: las cargas no se solapan
+        self._load_lock = threading.Lock()
+        # Las búsquedas y el cambio de estado de una recarga no se solapan (ver _swap_state)
+        self._search_lock = threading.Lock()
         
     def initialize(self):
         """Inicializa el modelo de embeddings (gratis, local)"""
         print("🔄 Cargando modelo de embeddings...")
-        # Modelo gratis optimizado para español
-        self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        print("✅ Modelo cargado")
+        with self._timed('import'):
+            sentence_transformers.load()
+            faiss.load()
+        
+        with self._timed('modelo'):
+            try:
+                self.embedding_model = load_embedding_model(self.MODEL_NAME, self.embedding_backend)
+            except (TypeError, ImportError) as e:
+                # sentence-transformers < 3.2 no tiene backend ONNX, o falta onnxruntime
+                print(f"⚠️ Backend {self.embedding_backend} no disponible ({e}), se usa fp32")
+                self.embedding_backend = 'fp32'
+                self.embedding_model = load_embedding_model(self.MODEL_NAME, self.embedding_backend)
+        print(f"✅ Modelo cargado ({self.embedding_backend})")
+    
+    @contextmanager
+    def _timed(self, stage: str):
+        """Acumula en self.timings la duración de una etapa de arranque"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+    
+    def startup_report(self) -> str:
+        """Desglose del arranque: imports, carga del modelo, lectura de CSV e índice"""
+        labels = [('import', 'imports'), ('modelo', 'modelo'), ('csv', 'CSV'), ('indice', 'índice')]
+        parts = [f"{label} {self.timings[stage]:.2f}s" for stage, label in labels if stage in self.timings]
+        return f"⏱️ Arranque RAG: {' | '.join(parts)} | total {sum(self.timings.values()):.2f}s"
+    
+    @property
+    def model_id(self) -> str:
+        """Modelo y backend: los vectores de distintos backends no se mezclan en la caché"""
+        return f"{self.MODEL_NAME}:{self.embedding_backend}"
+        
+    def load_and_process_data(self, stage_with: Optional[Callable[['RAGProcessor'], Callable[[], None]]] = None):
+        """
+        Carga CSVs y crea embeddings.
+        Si ya hay un índice (en memoria o en la caché de disco) solo se
+        re-codifican los chunks cuyo contenido cambió.
         
-    def load_and_process_data(self):
-        """Carga CSVs y crea embeddings"""
+        La carga se hace sobre una copia del procesador: las búsquedas siguen
+        usando las tablas, chunks e índice actuales hasta que _swap_state los
+        reemplaza todos a la vez. Si la carga falla, el estado anterior se conserva.
+        
+        `stage_with(staged)` prepara con las tablas recién cargadas el estado que
+        depende de ellas (p. ej. el cubo de DataProcessor) y devuelve la función
+        que lo instala, que se llama en el mismo cambio de estado.
+        """
+        with self._load_lock:
+            staged = copy.copy(self)
+            if not staged._load_and_process_data():
+                return False
+            install = stage_with(staged) if stage_with is not None else None
+            self._swap_state(staged, install)
+            return True
+    
+    def _swap_state(self, staged: 'RAGProcessor', install: Optional[Callable[[], None]] = None):
+        """
+        Instala el estado cargado en `staged` (y el que dependa de él, con `install`)
+        y descarta los top-k cacheados, bajo el lock de búsqueda
+        """
+        with self._search_lock:
+            vars(self).update(vars(staged))
+            if install is not None:
+                install()
+            self.query_cache.clear_results()
+    
+    def _load_and_process_data(self) -> bool:
         try:
             # Cargar CSVs
             historicos_path = os.path.join(self.data_dir, "historicos.csv")
             predicciones_path = os.path.join(self.data_dir, "predicciones.csv")
             
-            if os.path.exists(historicos_path):
-                self.df_historicos = pd.read_csv(historicos_path)
-                print(f"✅ Históricos: {len(self.df_historicos)} registros")
+            with self._timed('csv'):
+                if self.stream_chunksize:
+                    # Históricos por bloques (memoria acotada); las predicciones son pequeñas
+                    cache_dir = os.path.join(self.data_dir, ".table_cache")
+                    self.historicos_summary = ingest_csv(historicos_path, self.stream_chunksize, cache_dir)
+                    self.df_historicos = None
+                    self.df_predicciones = TableCache(cache_dir).load(predicciones_path)
+                else:
+                    # CSV tipados (categóricas, fechas, enteros compactos) con caché Feather
+                    tables = load_tables(self.data_dir)
+                    self.historicos_summary = None
+                    self.df_historicos = tables['historicos']
+                    self.df_predicciones = tables['predicciones']
                 
-            if os.path.exists(predicciones_path):
-                self.df_predicciones = pd.read_csv(predicciones_path)
-                print(f"✅ Predicciones: {len(self.df_predicciones)} registros")
-            
-            # Crear chunks de texto de los datos
-            self._create_chunks()
-            
-            # Crear índice FAISS
-            self._create_faiss_index()
+                self._build_row_stores()
             
+            with self._timed('indice'):
+                self._load_or_build_index([historicos_path, predicciones_path])
             return True
             
         except Exception as e:
             print(f"❌ Error: {e}")
             return False
     
+    def _load_or_build_index(self, paths: List[str]):
+        """Usa la caché si la huella coincide; si no, crea o actualiza el índice"""
+        # Si los CSV no cambiaron, reutilizar índice y chunks guardados
+        self.fingerprint = self._data_fingerprint(paths)
+        cached = self._read_cache()
+        if cached is not None and cached['fingerprint'] == self.fingerprint:
+            self.index = cached['index']
+            self.exact_vectors = cached['exact']
+            self._set_chunks(cached['chunks'])
+            self.active_index_type = cached['type']
+            print(f"✅ Índice cargado desde caché ({len(self.chunks)} vectores, "
+                  f"{index_bytes_per_vector(self.index):.0f} bytes/vector)")
+            return
+        
+        # Índice previo para actualización incremental: el de memoria
+        # (recarga en caliente) o el de una caché con datos anteriores
+        previous_index, previous_chunks, previous_exact = self.index, self.chunks, self.exact_vectors
+        previous_type = self.active_index_type
+        if previous_index is None and cached is not None:
+            previous_index, previous_chunks, previous_exact = cached['index'], cached['chunks'], cached['exact']
+            previous_type = cached['type']
+        
+        # Crear chunks de texto de los datos
+        self._create_chunks()
+        self.active_index_type = self._index_type_for(self.chunks)
+        if self.active_index_type != self.index_type:
+            print(f"ℹ️ Búsqueda en dos niveles (exacta): índice flat en lugar de {self.index_type}")
+        
+        # Crear o actualizar índice FAISS (un índice del mismo tipo; uno cuantizado
+        # necesita también sus vectores exactos anteriores)
+        quantized = self.active_index_type in QUANTIZED_INDEX_TYPES
+        if (previous_index is not None and previous_type == self.active_index_type
+                and (not quantized or previous_exact is not None)):
+            self._update_faiss_index(previous_index, previous_chunks, previous_exact)
+        else:
+            self._create_faiss_index()
+        
+        self._save_cache()
+    
+    def _data_fingerprint(self, paths: List[str]) -> str:
+        """Huella SHA-256 del contenido de los CSV, del modelo de embeddings y de la ventana"""
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}|{self.model_id}|{self.chunk_window}".encode("utf-8"))
+        
+        for path in paths:
+            digest.update(os.path.basename(path).encode("utf-8"))
+            if not os.path.exists(path):
+                digest.update(b"<ausente>")
+                continue
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        
+        return digest.hexdigest()
+    
+    def _cache_paths(self) -> Dict[str, str]:
+        """Rutas de los archivos de la caché"""
+        return {
+            'meta': os.path.join(self.cache_dir, "meta.json"),
+            'index': os.path.join(self.cache_dir, "index.faiss"),
+            'chunks': os.path.join(self.cache_dir, "chunks.pkl"),
+            'vectors': os.path.join(self.cache_dir, "vectors.npy"),
+            'vector_ids': os.path.join(self.cache_dir, "vector_ids.npy"),
+        }
+    
+    def _read_cache(self) -> Optional[Dict]:
+        """Lee índice, chunks y huella de la caché si son del mismo modelo y formato"""
+        paths = self._cache_paths()
+        if not all(os.path.exists(paths[name]) for name in ('meta', 'index', 'chunks')):
+            return None
+        
+        try:
+            with open(paths['meta'], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            
+            if meta.get('version') != CACHE_VERSION or meta.get('model') != self.model_id:
+                return None
+            
+            # El tipo esperado depende de los chunks (flat si hay búsqueda en dos niveles)
+            with open(paths['chunks'], "rb") as f:
+                chunks = pickle.load(f)
+            index_type = self._index_type_for(chunks)
+            if meta.get('index') != self._index_config(index_type):
+                print("🔄 Configuración de índice distinta, reconstruyendo...")
+                return None
+            
+            quantized = index_type in QUANTIZED_INDEX_TYPES
+            if quantized and not all(os.path.exists(paths[name]) for name in ('vectors', 'vector_ids')):
+                return None
+            
+            index = faiss.read_index(paths['index'])
+            set_search_params(index, **self._index_params(index_type))
+            enable_reconstruct(index)
+            
+            if index.ntotal != len(chunks):
+                return None
+            
+            exact = ExactVectors.load(paths['vectors'], paths['vector_ids']) if quantized else None
+            if exact is not None and len(exact.ids) != index.ntotal:
+                return None
+            
+            return {'fingerprint': meta.get('fingerprint'), 'index': index, 'chunks': chunks, 'exact': exact,
+                    'type': index_type}
+            
+        except Exception as e:
+            print(f"⚠️ Caché inválida, se reconstruye: {e}")
+            return None
+    
+    def _save_cache(self):
+        """Guarda índice, chunks y modelo usado, indexados por la huella de los datos"""
+        if self.index is None or not self.chunks:
+            return
+        
+        paths = self._cache_paths()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            
+            # Escribir a temporales únicos y renombrar (ver atomic_write; varios procesos
+            # comparten la caché): meta.json se borra primero y se escribe al final
+            # para que una escritura interrumpida nunca parezca válida
+            try:
+                os.remove(paths['meta'])
+            except FileNotFoundError:
+                pass
+            
+            with atomic_write(paths['index']) as tmp_index:
+                faiss.write_index(self.index, tmp_index)
+            
+            with atomic_write(paths['chunks']) as tmp_chunks, open(tmp_chunks, "wb") as f:
+                pickle.dump(self.chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
+            
+            meta = {
+                'version': CACHE_VERSION,
+                'fingerprint': self.fingerprint,
+                'model': self.model_id,
+                'index': self._index_config(),
+                'n_chunks': len(self.chunks),
+            }
+            with atomic_write(paths['meta']) as tmp_meta, open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            
+            print(f"💾 Caché guardada en {self.cache_dir}")
+            
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la caché: {e}")
+    
+    def _index_config(self, index_type: Optional[str] = None) -> Dict:
+        """Tipo y parámetros de índice (el activo por defecto), guardados en la caché para invalidarla si cambian"""
+        index_type = index_type or self.active_index_type
+        params = self._index_params(index_type)
+        return {'type': index_type, **{k: params[k] for k in sorted(params)}}
+    
+    def _index_params(self, index_type: Optional[str] = None) -> Dict:
+        """index_params si se construye el tipo configurado; ninguno para el flat de la búsqueda en dos niveles"""
+        return self.index_params if (index_type or self.active_index_type) == self.index_type else {}
+    
+    def _index_type_for(self, chunks: List[Dict]) -> str:
+        """
+        Tipo de índice para estos chunks: con chunks por ventana la búsqueda en dos
+        niveles es exacta (ver _search_levels) y solo necesita un índice flat;
+        sin ellos, el index_type configurado
+        """
+        return 'flat' if any(chunk['nivel'] == 'ventana' for chunk in chunks) else self.index_type
+    
+    def _build_row_stores(self):
+        """
+        Ordena las tablas por municipio y crea sus almacenes columnares.
+        Los históricos se ordenan además por delito y fecha para que cada
+        chunk (municipio, delito, ventana) sea también un rango de filas.
+        """
+        self.row_stores = {}
+        self.fechas_historicos = None
+        
+        for tipo, attr in (('historico', 'df_historicos'), ('prediccion', 'df_predicciones')):
+            df = getattr(self, attr)
+            if df is None or 'municipio' not in df.columns:
+                continue
+            
+            fechas = self._parse_fechas(df) if tipo == 'historico' else None
+            if fechas is not None and 'tipo_delito' in df.columns:
+                order = (pd.DataFrame({'m': df['municipio'], 'd': df['tipo_delito'], 'f': fechas})
+                         .sort_values(['m', 'd', 'f'], kind='stable', na_position='last').index)
+                if not order.is_monotonic_increasing:
+                    df = df.take(order).reset_index(drop=True)
+                    fechas = fechas.take(order).reset_index(drop=True)
+                    setattr(self, attr, df)
+                self.fechas_historicos = fechas
+            elif not df['municipio'].is_monotonic_increasing:
+                df = df.sort_values('municipio', kind='stable', na_position='last').reset_index(drop=True)
+                setattr(self, attr, df)
+            self.row_stores[tipo] = RowStore(df)
+    
+    @staticmethod
+    def _parse_fechas(df: pd.DataFrame) -> Optional[pd.Series]:
+        """Fechas de los históricos (dd/mm/aaaa o ISO); None si no hay columna de fecha"""
+        columns = {str(col).strip().lower(): col for col in df.columns}
+        for name in FECHA_COLUMNS:
+            if name in columns:
+                return pd.to_datetime(df[columns[name]], format='mixed', dayfirst=True, errors='coerce')
+        return None
+    
+    def get_records(self, chunk: Dict, limit: Optional[int] = 100) -> List[Dict]:
+        """Registros de un chunk (max 100 por defecto), leídos del almacén columnar"""
+        rows = chunk.get('rows')
+        store = self.row_stores.get(chunk['tipo'])
+        if rows is None or store is None:
+            return []
+        return store.records(rows[0], rows[1], limit)
+    
     def _create_chunks(self):
-        """Convierte filas de CSV en chunks de texto"""
+        """
+        Convierte filas de CSV en chunks de texto en dos niveles:
+        - grueso: un chunk por provincia, y por municipio y tabla
+        - fino ('ventana'): un chunk por municipio, delito y ventana temporal
+        """
         self.chunks = []
         
-        # Procesar históricos
-        if self.df_historicos is not None:
-            # Agrupar por municipio para crear chunks
-            for municipio in self.df_historicos['municipio'].unique()[:10]:  # Primeros 10 para demo
-                df_mun = self.df_historicos[self.df_historicos['municipio'] == municipio]
-                
-                # Crear resumen del municipio
-                total = len(df_mun)
-                chunk_text = f"Municipio: {municipio}. Total de registros: {total}."
-                
-                # Agregar info por tipo de delito si existe
-                if 'tipo_delito' in df_mun.columns:
-                    delitos = df_mun['tipo_delito'].value_counts().head(5)
-                    chunk_text += f" Principales delitos: {', '.join([f'{d}: {c}' for d, c in delitos.items()])}."
-                
-                self.chunks.append({
-                    'text': chunk_text,
-                    'municipio': municipio,
-                    'tipo': 'historico',
-                    'data': df_mun.to_dict('records')[:100]  # Max 100 registros por chunk
-                })
+        # Procesar históricos: los resúmenes salen de los conteos (municipio, delito, año, mes),
+        # los mismos tanto si la tabla está en memoria como si se leyó por bloques
+        store = self.row_stores.get('historico')
+        counts = None
+        if store is not None:
+            counts = CountsAccumulator().update(self.df_historicos, self.fechas_historicos).result()
+        elif self.historicos_summary is not None:
+            counts = self.historicos_summary.counts
+        if counts is not None and len(counts):
+            self.chunks.extend(self._historico_chunks(counts, store))
+            self.chunks.extend(self._provincia_chunks(counts))
+            self.chunks.extend(self._ventana_chunks(counts, store))
         
         # Procesar predicciones
-        if self.df_predicciones is not None:
-            for municipio in self.df_predicciones['municipio'].unique()[:10]:
-                df_mun = self.df_predicciones[self.df_predicciones['municipio'] == municipio]
-                
-                chunk_text = f"Predicciones para {municipio}. Total: {len(df_mun)} predicciones."
-                
-                if 'riesgo' in df_mun.columns:
-                    riesgo_alto = len(df_mun[df_mun['riesgo'] == 'alto'])
-                    chunk_text += f" Zonas de alto riesgo: {riesgo_alto}."
-                
-                self.chunks.append({
-                    'text': chunk_text,
-                    'municipio': municipio,
-                    'tipo': 'prediccion',
-                    'data': df_mun.to_dict('records')[:100]
-                })
+        if 'prediccion' in self.row_stores:
+            self.chunks.extend(self._prediccion_chunks(self.df_predicciones, self.row_stores['prediccion']))
+        
+        # ID estable por clave del chunk y hash del texto que se codifica
+        for chunk in self.chunks:
+            if chunk['nivel'] == 'municipio':
+                key = (chunk['tipo'], chunk['municipio'])
+            else:
+                key = (chunk['tipo'], chunk['nivel'], chunk['provincia'], chunk['municipio'],
+                       chunk.get('delito'), chunk.get('periodo'))
+            chunk['id'] = self._chunk_id(*key)
+            chunk['hash'] = hashlib.sha1(chunk['text'].encode("utf-8")).hexdigest()
+        self._set_chunks(self.chunks)
         
         print(f"✅ {len(self.chunks)} chunks creados")
     
+    @staticmethod
+    def _chunk_id(*key) -> int:
+        """ID int64 positivo y estable entre cargas para la clave del chunk"""
+        digest = hashlib.sha1("|".join(str(k) for k in key).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") >> 1
+    
+    def _set_chunks(self, chunks: List[Dict]):
+        """Reemplaza los chunks y el mapa ID FAISS -> chunk"""
+        self.chunks = chunks
+        self.chunk_by_id = {chunk['id']: chunk for chunk in chunks}
+        
+        ids_by_municipio, ids_by_tipo, ids_by_anio = {}, {}, {}
+        coarse_ids, ventanas_by_municipio = [], {}
+        for chunk in chunks:
+            ids_by_tipo.setdefault(chunk['tipo'], []).append(chunk['id'])
+            municipio = None
+            if chunk['municipio'] is not None:
+                municipio = canonical_municipio(chunk['municipio']) or chunk['municipio']
+                ids_by_municipio.setdefault(municipio, []).append(chunk['id'])
+            
+            if chunk['nivel'] == 'ventana':
+                ventanas_by_municipio.setdefault(municipio, []).append(chunk['id'])
+                ids_by_anio.setdefault(chunk['anio'], []).append(chunk['id'])
+            else:
+                coarse_ids.append(chunk['id'])
+        
+        self.ids_by_municipio = ids_by_municipio
+        self.ids_by_tipo = ids_by_tipo
+        self.ids_by_anio = ids_by_anio
+        self.coarse_ids = np.array(sorted(coarse_ids), dtype='int64')
+        self.ventanas_by_municipio = ventanas_by_municipio
+    
+    def _historico_chunks(self, counts: pd.DataFrame, store: Optional[RowStore]) -> List[Dict]:
+        """Resúmenes por municipio de los históricos a partir de los conteos"""
+        totales = counts.groupby('municipio', sort=True, observed=True)['filas'].sum()
+        
+        # Top 5 de delitos por municipio: un único conteo (municipio, tipo_delito)
+        top_delitos = {}
+        conteos = counts.groupby(['municipio', 'tipo_delito'], sort=True, observed=True)['filas'].sum()
+        conteos = conteos[conteos > 0].sort_values(ascending=False, kind='stable')
+        for (municipio, delito), count in conteos.groupby(level=0, sort=False, observed=True).head(5).items():
+            top_delitos.setdefault(municipio, []).append((delito, count))
+        
+        chunks = []
+        for municipio, total in totales.items():
+            chunk_text = f"Municipio: {municipio}. Total de registros: {total}."
+            
+            if municipio in top_delitos:
+                chunk_text += f" Principales delitos: {', '.join([f'{d}: {c}' for d, c in top_delitos[municipio]])}."
+            
+            chunks.append({
+                'text': chunk_text,
+                'municipio': municipio,
+                'provincia': self._provincia(municipio),
+                'nivel': 'municipio',
+                'tipo': 'historico',
+                'rows': store.ranges.get(municipio) if store is not None else None
+            })
+        
+        return chunks
+    
+    @staticmethod
+    def _provincia(municipio) -> Optional[str]:
+        """Provincia (ZONA) del municipio, o None si no está en el catálogo"""
+        return ZONA_POR_MUNICIPIO.get(canonical_municipio(municipio))
+    
+    def _provincia_chunks(self, counts: pd.DataFrame) -> List[Dict]:
+        """Resúmenes por provincia (ZONA del notebook): totales, municipios y delitos principales"""
+        zonas = counts['municipio'].map({m: self._provincia(m) for m in counts['municipio'].dropna().unique()})
+        
+        chunks = []
+        for zona, grupo in counts.groupby(zonas, sort=True, observed=True):
+            por_municipio = grupo.groupby('municipio', sort=True, observed=True)['filas'].sum()
+            por_municipio = por_municipio[por_municipio > 0].sort_values(ascending=False, kind='stable')
+            chunk_text = (f"Provincia: {zona}. Municipios con datos: {len(por_municipio)}. "
+                          f"Total de registros: {grupo['filas'].sum()}. Municipios con más registros: "
+                          f"{', '.join(f'{m}: {c}' for m, c in por_municipio.head(5).items())}.")
+            
+            top = grupo.groupby('tipo_delito', sort=True, observed=True)['filas'].sum()
+            top = top[top > 0].sort_values(ascending=False, kind='stable').head(5)
+            if len(top):
+                chunk_text += f" Principales delitos: {', '.join(f'{d}: {c}' for d, c in top.items())}."
+            
+            chunks.append({
+                'text': chunk_text,
+                'municipio': None,
+                'provincia': zona,
+                'nivel': 'provincia',
+                'tipo': 'historico',
+                'rows': None
+            })
+        
+        return chunks
+    
+    def _ventana_chunks(self, counts: pd.DataFrame, store: Optional[RowStore]) -> List[Dict]:
+        """
+        Chunks finos por (municipio, delito, ventana temporal) con su evolución mensual.
+        Con la tabla en memoria, las filas están ordenadas por municipio, delito y fecha
+        (_build_row_stores), así que cada grupo es un rango contiguo del almacén columnar.
+        """
+        counts = counts.dropna(subset=['tipo_delito', 'anio'])
+        if counts.empty:
+            return []
+        
+        meses = pd.to_datetime(pd.DataFrame({'year': counts['anio'], 'month': counts['mes'], 'day': 1}))
+        claves = pd.DataFrame({
+            'municipio': counts['municipio'],
+            'delito': counts['tipo_delito'],
+            'periodo': meses.dt.to_period(self.chunk_window),
+            'mes': meses.dt.to_period('M'),
+            'filas': counts['filas'],
+        })
+        grupos = claves.groupby(['municipio', 'delito', 'periodo'], sort=True, observed=True)['filas'].sum()
+        
+        mensual = {}
+        if self.chunk_window != 'M':
+            conteos = claves.groupby(['municipio', 'delito', 'periodo', 'mes'], sort=True, observed=True)['filas'].sum()
+            for (municipio, delito, periodo, mes), count in conteos[conteos > 0].items():
+                mensual.setdefault((municipio, delito, periodo), []).append(f"{MESES[mes.month - 1]} {mes.year}: {count}")
+        
+        rangos = self._ventana_rangos() if store is not None else {}
+        provincias = {m: self._provincia(m) for m in claves['municipio'].unique()}
+        chunks = []
+        for (municipio, delito, periodo), registros in grupos[grupos > 0].items():
+            provincia = provincias[municipio]
+            chunk_text = (f"Municipio: {municipio}" + (f" (provincia {provincia})" if provincia else "") +
+                          f". Delito: {delito}. Periodo: {periodo}. Registros: {registros}.")
+            if (municipio, delito, periodo) in mensual:
+                chunk_text += f" Evolución mensual: {', '.join(mensual[(municipio, delito, periodo)])}."
+            
+            chunks.append({
+                'text': chunk_text,
+                'municipio': municipio,
+                'provincia': provincia,
+                'nivel': 'ventana',
+                'tipo': 'historico',
+                'delito': delito,
+                'periodo': str(periodo),
+                'anio': periodo.year,
+                'rows': rangos.get((municipio, delito, periodo))
+            })
+        
+        return chunks
+    
+    def _ventana_rangos(self) -> Dict[Tuple, Tuple[int, int]]:
+        """Rango de filas [start, stop) de cada (municipio, delito, ventana) en la tabla ordenada"""
+        df, fechas = self.df_historicos, self.fechas_historicos
+        if fechas is None or 'tipo_delito' not in df.columns:
+            return {}
+        municipios, delitos = df['municipio'].to_numpy(), df['tipo_delito'].to_numpy()
+        periodos = fechas.dt.to_period(self.chunk_window)
+        # Tabla ordenada: cada grupo es una racha de filas con la misma clave
+        codigos = [pd.factorize(municipios)[0], pd.factorize(delitos)[0], periodos.array.asi8]
+        cambios = np.zeros(len(df), dtype=bool)
+        cambios[:1] = True
+        for codigo in codigos:
+            cambios[1:] |= codigo[1:] != codigo[:-1]
+        starts = np.flatnonzero(cambios)
+        stops = np.r_[starts[1:], len(df)]
+        validos = (codigos[0][starts] >= 0) & (codigos[1][starts] >= 0) & periodos.iloc[starts].notna().to_numpy()
+        starts, stops = starts[validos], stops[validos]
+        claves = zip(municipios[starts], delitos[starts], periodos.iloc[starts].tolist())
+        return {clave: (int(start), int(stop)) for clave, start, stop in zip(claves, starts, stops)}
+    
+    def _prediccion_chunks(self, df: pd.DataFrame, store: RowStore) -> List[Dict]:
+        """Resúmenes por municipio de las predicciones en una sola pasada groupby"""
+        totales = df.groupby('municipio', sort=False, observed=True).size()
+        
+        riesgo_alto = None
+        if 'riesgo' in df.columns:
+            riesgo_alto = (df['riesgo'] == 'alto').groupby(df['municipio'], sort=False, observed=True).sum()
+        
+        chunks = []
+        for municipio, total in totales.items():
+            chunk_text = f"Predicciones para {municipio}. Total: {total} predicciones."
+            
+            if riesgo_alto is not None:
+                chunk_text += f" Zonas de alto riesgo: {int(riesgo_alto.get(municipio, 0))}."
+            
+            chunks.append({
+                'text': chunk_text,
+                'municipio': municipio,
+                'provincia': self._provincia(municipio),
+                'nivel': 'municipio',
+                'tipo': 'prediccion',
+                'rows': store.ranges.get(municipio)
+            })
+        
+        return chunks
+    
     def _create_faiss_index(self):
         """Crea índice FAISS con los embeddings"""
         if not self.chunks:
@@ -106,36 +1067,346 @@ class RAGProcessor:
         
         print("🔄 Creando embeddings...")
         
-        # Generar embeddings de los textos
-        texts = [chunk['text'] for chunk in self.chunks]
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=True)
+        # Generar embeddings de los textos y crear índice FAISS con IDs
+        # propios para poder quitar/añadir chunks
+        ids = np.array([chunk['id'] for chunk in self.chunks], dtype='int64')
+        with self._encode_chunks(self.chunks) as buffer:
+            self.index = build_index(buffer.array, ids, self.active_index_type, **self._index_params())
+            self.exact_vectors = None
+            if self.active_index_type in QUANTIZED_INDEX_TYPES:
+                self.exact_vectors = self._save_exact_vectors(ids, buffer.array)
+        
+        print(f"✅ Índice {self.active_index_type} creado con {len(self.chunks)} vectores "
+              f"({index_bytes_per_vector(self.index):.0f} bytes/vector)")
+    
+    def _save_exact_vectors(self, ids: np.ndarray, vectors: np.ndarray) -> ExactVectors:
+        """Guarda los vectores exactos en la caché y los abre con mmap (en memoria si falla)"""
+        paths = self._cache_paths()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # La caché deja de ser coherente hasta que _save_cache escriba meta.json
+            if os.path.exists(paths['meta']):
+                os.remove(paths['meta'])
+            return ExactVectors.save(paths['vectors'], paths['vector_ids'], ids, vectors)
+        except Exception as e:
+            print(f"⚠️ Vectores exactos en memoria, no se pudieron guardar: {e}")
+            return ExactVectors(ids, np.array(vectors, dtype='float32'))
+    
+    def _encode_chunks(self, chunks: List[Dict]) -> EmbeddingBuffer:
+        """Codifica los textos de los chunks e informa del rendimiento (chunks/s)"""
+        start = time.perf_counter()
+        buffer = encode_texts(self.embedding_model, [chunk['text'] for chunk in chunks], self.MODEL_NAME,
+                              self.embedding_backend, self.embedding_processes, self.embedding_batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"⏱️ {len(chunks)} embeddings en {elapsed:.1f}s "
+              f"({len(chunks) / max(elapsed, 1e-9):.0f} chunks/s, {self.embedding_processes} proceso(s))")
+        return buffer
+    
+    def _update_faiss_index(self, index, previous_chunks: List[Dict], previous_exact: Optional[ExactVectors] = None):
+        """Actualiza una copia del índice: quita chunks cambiados/eliminados y codifica solo los nuevos"""
+        previous_hashes = {chunk['id']: chunk['hash'] for chunk in previous_chunks}
+        current_hashes = {chunk['id']: chunk['hash'] for chunk in self.chunks}
+        
+        stale_ids = [cid for cid, h in previous_hashes.items() if current_hashes.get(cid) != h]
+        changed = [chunk for chunk in self.chunks if previous_hashes.get(chunk['id']) != chunk['hash']]
         
-        # Crear índice FAISS
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings.astype('float32'))
+        new_embeddings = None
+        if changed:
+            print(f"🔄 Re-codificando {len(changed)} de {len(self.chunks)} chunks...")
+            with self._encode_chunks(changed) as buffer:
+                new_embeddings = buffer.array.copy()
         
-        print(f"✅ Índice creado con {len(self.chunks)} vectores")
+        if self.active_index_type == 'hnsw':
+            # HNSW no admite borrado: se rehace con los vectores ya guardados
+            # de los chunks sin cambios (sin volver a codificarlos)
+            index = self._rebuild_from_index(index, changed, new_embeddings)
+        else:
+            # Sobre una copia: el índice anterior puede estar atendiendo búsquedas
+            index = faiss.clone_index(index)
+            enable_reconstruct(index)
+            if stale_ids:
+                index.remove_ids(np.array(stale_ids, dtype='int64'))
+            if changed:
+                ids = np.array([chunk['id'] for chunk in changed], dtype='int64')
+                index.add_with_ids(new_embeddings, ids)
+        
+        if self.active_index_type in QUANTIZED_INDEX_TYPES:
+            self.exact_vectors = self._update_exact_vectors(previous_exact, changed, new_embeddings)
+        
+        removed = set(previous_hashes) - set(current_hashes)
+        self.index = index
+        print(f"✅ Índice actualizado: {len(changed)} re-codificados, {len(removed)} eliminados, "
+              f"{len(self.chunks)} vectores")
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Busca chunks relevantes para una consulta"""
+    def _rebuild_from_index(self, index, changed: List[Dict], new_embeddings: Optional[np.ndarray]):
+        """Reconstruye el índice reutilizando los vectores de los chunks no modificados"""
+        changed_ids = {chunk['id'] for chunk in changed}
+        kept = [chunk['id'] for chunk in self.chunks if chunk['id'] not in changed_ids]
+        
+        ids = kept + [chunk['id'] for chunk in changed]
+        if not ids:
+            return None
+        
+        vectors = [index.reconstruct(int(cid)) for cid in kept]
+        if new_embeddings is not None:
+            vectors.extend(new_embeddings)
+        
+        return build_index(np.vstack(vectors), np.array(ids, dtype='int64'), self.active_index_type,
+                           **self._index_params())
+    
+    def _update_exact_vectors(self, previous_exact: ExactVectors, changed: List[Dict],
+                              new_embeddings: Optional[np.ndarray]) -> ExactVectors:
+        """Vectores exactos de los chunks sin cambios más los re-codificados"""
+        changed_ids = {chunk['id'] for chunk in changed}
+        kept = [chunk['id'] for chunk in self.chunks if chunk['id'] not in changed_ids]
+        
+        vectors = previous_exact.get(kept)
+        if new_embeddings is not None:
+            vectors = np.vstack([vectors, new_embeddings])
+        ids = np.array(kept + [chunk['id'] for chunk in changed], dtype='int64')
+        return self._save_exact_vectors(ids, vectors)
+    
+    def search(self, query: str, top_k: int = 3, use_filters: bool = True,
+               embedding: Optional[np.ndarray] = None) -> List[Dict]:
+        """Busca chunks relevantes para una consulta (`embedding`: el de embed_query, si ya se calculó)"""
+        embeddings = None if embedding is None else np.asarray(embedding, dtype='float32').reshape(1, -1)
+        return self.search_many([query], top_k, use_filters, embeddings)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 3, use_filters: bool = True,
+                    embeddings: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """
+        Busca varias consultas a la vez: un solo encode por lotes para las que no
+        están en caché y un index.search por filtro distinto. Resultados en el orden de entrada.
+        Con use_filters, la búsqueda se limita a los chunks de los municipios y del
+        tipo (histórico/predicción) mencionados en la consulta.
+        Si hay chunks por ventana temporal, la búsqueda es en dos niveles (ver _search_levels).
+        `embeddings` (una fila por consulta) son los ya obtenidos con embed_query: esa
+        consulta a la caché ya se contó y aquí no se vuelve a contar.
+        """
         if self.index is None or not self.chunks:
-            return []
+            return [[] for _ in queries]
+        
+        # Embeddings cacheados por consulta normalizada (las repetidas se agrupan)
+        keys = [normalize_text(query) for query in queries]
+        counted = embeddings is None
+        entries = {}
+        missing = {}
+        for row, (key, query) in enumerate(zip(keys, queries)):
+            if key in entries or key in missing:
+                continue
+            entry = self.query_cache.get(key, count=counted)
+            if entry is None and not counted:
+                entry = self.query_cache.put(key, embeddings[row:row + 1])
+            if entry is None:
+                missing[key] = query
+            else:
+                entries[key] = entry
+        
+        if counted:
+            metrics.inc('chatbot_events_total', len(entries), event='query_cache_hit')
+            metrics.inc('chatbot_events_total', len(missing), event='query_cache_miss')
+        if missing:
+            with metrics.span('embedding'):
+                embeddings = np.asarray(self.embedding_model.encode(list(missing.values())), dtype='float32')
+            for key, embedding in zip(missing, embeddings):
+                entries[key] = self.query_cache.put(key, embedding[np.newaxis, :])
+        
+        # Filtros, búsqueda y chunks con el mismo estado: una recarga en caliente
+        # (_swap_state) no puede cambiarlo a mitad; el encode queda fuera del lock
+        with self._search_lock:
+            if self.index is None or not self.chunks:
+                return [[] for _ in queries]
+            
+            # Top-k cacheados; el resto en una búsqueda FAISS por cada filtro distinto
+            # (el filtro depende solo del texto normalizado, así que también se cachea)
+            result_key = (top_k, use_filters)
+            ids_by_key = {}
+            pending = {}
+            for key, entry in entries.items():
+                ids = entry['results'].get(result_key)
+                if ids is not None:
+                    ids_by_key[key] = ids
+                    continue
+                allowed = self._filter_ids(key) if use_filters else None
+                pending.setdefault(None if allowed is None else tuple(allowed), []).append(key)
+            
+            for allowed, group in pending.items():
+                matrix = np.vstack([entries[key]['embedding'] for key in group])
+                allowed = None if allowed is None else np.array(allowed, dtype='int64')
+                with metrics.span('faiss'):
+                    if self.ventanas_by_municipio:
+                        distances, indices = self._search_levels(matrix, group, top_k, allowed)
+                    else:
+                        distances, indices = self._index_search(matrix, top_k, allowed)
+                for key, ids in zip(group, indices):
+                    ids_by_key[key] = entries[key]['results'][result_key] = ids
+            
+            return [self._chunks_for_ids(ids_by_key[key]) for key in keys]
+    
+    def _index_search(self, matrix: np.ndarray, top_k: int,
+                      allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        index.search restringido a los IDs `allowed`. Con un índice cuantizado se piden
+        top_k * rerank candidatos y se re-ordenan con los vectores exactos
+        """
+        if self.exact_vectors is None:
+            params = None if allowed is None else self._selector_params(allowed)
+            return self.index.search(matrix, top_k, params=params)
+        
+        if allowed is not None and self.active_index_type == 'pq':
+            # IndexPQ no acepta selectores de IDs: distancia exacta sobre los
+            # vectores del subconjunto con un producto de matrices
+            return exact_top_k(matrix, allowed, self.exact_vectors.get(allowed), top_k)
+        
+        # sq: el índice cuantizado (con selector si hay filtro) propone
+        # top_k * rerank candidatos y solo esos se re-ordenan
+        params = None if allowed is None else self._selector_params(allowed)
+        rerank = self.index_params.get('rerank', 4)
+        if rerank <= 1:
+            return self.index.search(matrix, top_k, params=params)
+        _, candidates = self.index.search(matrix, top_k * rerank, params=params)
+        return rerank_exact(matrix, candidates, self.exact_vectors.gather(candidates), top_k)
+    
+    def _search_levels(self, matrix: np.ndarray, keys: List[str], top_k: int,
+                       allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Búsqueda gruesa a fina: primero entre los resúmenes de provincia/municipio,
+        luego entre los chunks por ventana de las particiones ganadoras (filtrados
+        por los años de la consulta). Los resultados de ambos niveles se mezclan por distancia.
+        
+        La búsqueda es exacta: cada nivel es un conjunto pequeño (cientos de vectores:
+        los resúmenes y las ventanas de unos pocos municipios y años) y se recorre
+        completo sobre sus vectores (ver _vectors), sin pasar por el índice: el coste
+        por consulta no crece con los años del histórico. Por eso en este modo el
+        índice es siempre flat (_index_type_for) y RAG_INDEX_TYPE, nprobe y efSearch
+        solo aplican a la búsqueda en un nivel (_index_search).
+        """
+        coarse = self.coarse_ids if allowed is None else np.intersect1d(self.coarse_ids, allowed)
+        coarse_d, coarse_i = exact_top_k(matrix, coarse, self._vectors(coarse), top_k)
+        
+        # Consultas con las mismas particiones/años comparten una búsqueda fina
+        fine_groups = {}
+        for row, key in enumerate(keys):
+            fine = self._fine_ids(key, coarse_i[row], allowed)
+            if fine:
+                fine_groups.setdefault(tuple(fine), []).append(row)
         
-        # Generar embedding de la consulta
-        query_embedding = self.embedding_model.encode([query])
+        fine_d = np.full((len(matrix), top_k), np.inf, dtype='float32')
+        fine_i = np.full((len(matrix), top_k), -1, dtype='int64')
+        for fine, rows in fine_groups.items():
+            fine = np.array(fine, dtype='int64')
+            fine_d[rows], fine_i[rows] = exact_top_k(matrix[rows], fine, self._vectors(fine), top_k)
         
-        # Buscar en FAISS
-        distances, indices = self.index.search(query_embedding.astype('float32'), top_k)
+        distances = np.hstack([coarse_d, fine_d])
+        ids = np.hstack([coarse_i, fine_i])
+        distances[ids < 0] = np.inf
+        order = np.argsort(distances, axis=1, kind='stable')[:, :top_k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+    
+    def _vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Vectores float32 de los IDs: los exactos (sq/pq) o reconstruidos del índice"""
+        if self.exact_vectors is not None:
+            return self.exact_vectors.get(ids)
+        ids = np.asarray(ids, dtype='int64')
+        if len(ids) == 0:
+            return np.empty((0, self.index.d), dtype='float32')
+        return self.index.reconstruct_batch(ids)
+    
+    def _fine_ids(self, query: str, coarse_hits: np.ndarray, allowed: Optional[np.ndarray]) -> List[int]:
+        """IDs de chunks por ventana dentro de las mejores particiones gruesas"""
+        municipios = []
+        for cid in coarse_hits[:self.coarse_partitions]:
+            chunk = self.chunk_by_id.get(int(cid))
+            if chunk is None:
+                continue
+            if chunk['municipio'] is not None:
+                candidates = [canonical_municipio(chunk['municipio']) or chunk['municipio']]
+            else:
+                candidates = PROVINCIAS_MUNICIPIOS.get(chunk['provincia'], [])
+            municipios.extend(m for m in candidates if m not in municipios)
+        
+        fine = {cid for m in municipios for cid in self.ventanas_by_municipio.get(m, [])}
+        if allowed is not None:
+            fine &= set(allowed.tolist())
+        
+        # Años de la consulta o, si no menciona ninguno, los más recientes
+        years = [y for y in find_years(query) if y in self.ids_by_anio]
+        if not years and self.ids_by_anio:
+            latest = max(self.ids_by_anio)
+            years = [y for y in self.ids_by_anio if y > latest - self.recent_years]
+        fine &= {cid for y in years for cid in self.ids_by_anio[y]}
+        return sorted(fine)
+    
+    def parse_query(self, query: str) -> Dict:
+        """Municipios (nombres oficiales), tipo de registro y años que menciona la consulta"""
+        return {'municipios': find_municipios(query), 'tipo': detect_tipo(query), 'anios': find_years(query)}
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embedding (1-D) de una consulta, compartido con la caché de search_many"""
+        key = normalize_text(query)
+        entry = self.query_cache.get(key)
+        metrics.inc('chatbot_events_total', event='query_cache_hit' if entry is not None else 'query_cache_miss')
+        if entry is None:
+            with metrics.span('embedding'):
+                embedding = np.asarray(self.embedding_model.encode([query]), dtype='float32')
+            entry = self.query_cache.put(key, embedding)
+        return entry['embedding'][0]
+    
+    def _filter_ids(self, query: str) -> Optional[List[int]]:
+        """IDs de chunks permitidos para la consulta, o None si no hay que filtrar"""
+        parsed = self.parse_query(query)
+        
+        municipio_ids = None
+        if parsed['municipios']:
+            municipio_ids = {cid for m in parsed['municipios'] for cid in self.ids_by_municipio.get(m, [])}
+            # Municipio sin datos indexados: se busca en todo el índice
+            if not municipio_ids:
+                municipio_ids = None
         
-        # Retornar chunks relevantes
+        tipo_ids = set(self.ids_by_tipo.get(parsed['tipo'], [])) if parsed['tipo'] else None
+        
+        if municipio_ids is not None and tipo_ids is not None:
+            # Si la combinación queda vacía, prima el municipio
+            allowed = (municipio_ids & tipo_ids) or municipio_ids
+        else:
+            allowed = municipio_ids if municipio_ids is not None else tipo_ids
+        
+        if not allowed or len(allowed) == len(self.chunks):
+            return None
+        return sorted(allowed)
+    
+    def _selector_params(self, ids: np.ndarray):
+        """Parámetros de búsqueda FAISS que restringen el recorrido a los IDs dados"""
+        selector = faiss.IDSelectorBatch(ids)
+        inner = faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap) else self.index
+        
+        if isinstance(inner, faiss.IndexIVF):
+            # Con pocos IDs permitidos se recorren todas las listas: solo se
+            # calculan distancias para los IDs del selector
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=inner.nlist)
+        elif isinstance(inner, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(inner.hnsw.efSearch, len(ids)))
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        
+        # El selector debe vivir mientras se usen los parámetros
+        params.selector_ref = selector
+        return params
+    
+    def _chunks_for_ids(self, ids) -> List[Dict]:
+        """Chunks para los IDs FAISS (FAISS devuelve -1 si hay menos de top_k)"""
         results = []
-        for idx in indices[0]:
-            if idx < len(self.chunks):
-                results.append(self.chunks[idx])
+        for idx in ids:
+            chunk = self.chunk_by_id.get(int(idx))
+            if chunk is not None:
+                results.append(chunk)
         
         return results
     
+    def get_facts(self, query: str, top_k: int = 5, embedding: Optional[np.ndarray] = None) -> List[str]:
+        """Textos de los chunks más relevantes, en orden (para PromptBuilder)"""
+        return [result['text'] for result in self.search(query, top_k=top_k, embedding=embedding)]
+    
     def get_context_for_query(self, query: str) -> str:
         """Obtiene contexto relevante para una consulta"""
         results = self.search(query, top_k=3)
@@ -148,8 +1419,9 @@ class RAGProcessor:
             context += f"{i}. {result['text']}\n"
             
             # Agregar algunos datos específicos
-            if result['data'] and len(result['data']) > 0:
-                context += f"   Datos disponibles: {len(result['data'])} registros\n"
+            if result.get('rows'):
+                start, stop = result['rows']
+                context += f"   Datos disponibles: {stop - start} registros\n"
         
         return context
     
@@ -161,6 +1433,11 @@ class RAGProcessor:
             summary += f"• Datos históricos: {len(self.df_historicos):,} registros\n"
             if 'municipio' in self.df_historicos.columns:
                 summary += f"• Municipios con datos: {self.df_historicos['municipio'].nunique()}\n"
+        elif self.historicos_summary is not None:
+            counts = self.historicos_summary.counts
+            summary += (f"• Datos históricos: {self.historicos_summary.rows:,} registros "
+                        f"(leídos en {self.historicos_summary.blocks} bloques)\n")
+            summary += f"• Municipios con datos: {counts['municipio'].nunique()}\n"
         
         if self.df_predicciones is not None:
             summary += f"• Predicciones: {len(self.df_predicciones):,} registros\n"